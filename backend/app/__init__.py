@@ -6,6 +6,21 @@ from app.routes.sms_log import sms_log_bp
 from app.routes.message import message_bp
 from app.routes.match_routes import match_bp
 from app.routes.user_routes import user_bp
+from app.services.sms_log_writer import sms_log_writer, load_sms_log_spill_command
+from app.services.sms_traffic import sms_traffic
+from app.services.sms_log_archive import sms_log_archive, archive_sms_log_command, scan_sms_archive_command
+from app.services.sms_log_replay import replay_sms_log_command
+from app.services.sms_dedup import sms_dedup
+from app.services.rate_limiter import sms_rate_limiter
+from app.services.sms_dispatcher import sms_dispatcher, dispatch_sms_command
+from app.services.user_stats_service import rebuild_user_stats_command
+from app.services.user_bulk_service import import_users_command, export_users_command
+from app.services.candidate_index import candidate_index
+from app.services.match_scorer import match_scorer
+from app.services.exclusion_store import exclusion_store
+from app.services.match_session import match_sessions
+from app.services.user_cache import user_cache
+from app.migrations import migrate_command, init_db_command, ensure_schema
 
 def create_app():
     app = Flask(__name__)
@@ -15,6 +30,17 @@ def create_app():
 
     app.config.from_object(Config)
     db.init_app(app)
+    sms_log_writer.init_app(app)
+    sms_log_archive.init_app(app)
+    sms_traffic.init_app(app)
+    sms_dedup.init_app(app)
+    sms_rate_limiter.init_app(app)
+    sms_dispatcher.init_app(app)
+    candidate_index.init_app(app)
+    match_scorer.init_app(app)
+    exclusion_store.init_app(app)
+    match_sessions.init_app(app)
+    user_cache.init_app(app)
 
     
     app.register_blueprint(user_bp, url_prefix="/users")
@@ -22,14 +48,20 @@ def create_app():
     app.register_blueprint(message_bp, url_prefix="/messages")
     app.register_blueprint(match_bp, url_prefix="/matches")
 
-    with app.app_context():
-        from app.models.message import Message
-        db.create_all()
-
-    return app
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(dispatch_sms_command)
+    app.cli.add_command(rebuild_user_stats_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(export_users_command)
+    app.cli.add_command(archive_sms_log_command)
+    app.cli.add_command(scan_sms_archive_command)
+    app.cli.add_command(replay_sms_log_command)
+    app.cli.add_command(load_sms_log_spill_command)
 
+    # Schema setup is normally `flask init-db`; this is an opt-in guarded check
+    if app.config['SCHEMA_AUTO_CREATE']:
+        with app.app_context():
+            ensure_schema()
 
-app = create_app()
-
-if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    return app
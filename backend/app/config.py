@@ -5,3 +5,107 @@ import os
 class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'postgresql://penzi_user:penzi123@db/penzi_project'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Create the schema at startup if it is missing (otherwise run `flask init-db`)
+    SCHEMA_AUTO_CREATE = os.environ.get('SCHEMA_AUTO_CREATE', 'false').lower() == 'true'
+
+    # Upper bound on messages accepted by POST /sms_log/batch
+    SMS_BATCH_MAX_SIZE = int(os.environ.get('SMS_BATCH_MAX_SIZE', 1000))
+
+    # Write-behind buffering of SMSLog rows (see SMSLogWriter)
+    SMS_LOG_WRITE_BEHIND = os.environ.get('SMS_LOG_WRITE_BEHIND', 'true').lower() == 'true'
+    SMS_LOG_FLUSH_ROWS = int(os.environ.get('SMS_LOG_FLUSH_ROWS', 200))
+    SMS_LOG_FLUSH_INTERVAL_MS = int(os.environ.get('SMS_LOG_FLUSH_INTERVAL_MS', 50))
+    SMS_LOG_QUEUE_SIZE = int(os.environ.get('SMS_LOG_QUEUE_SIZE', 10000))
+    SMS_LOG_PUT_TIMEOUT_MS = int(os.environ.get('SMS_LOG_PUT_TIMEOUT_MS', 100))
+    # Failed flushes are retried with backoff, then spilled to disk and reloaded later
+    SMS_LOG_RETRY_ATTEMPTS = int(os.environ.get('SMS_LOG_RETRY_ATTEMPTS', 4))
+    SMS_LOG_RETRY_BACKOFF_MS = int(os.environ.get('SMS_LOG_RETRY_BACKOFF_MS', 200))
+    SMS_LOG_SPILL_DIR = os.environ.get('SMS_LOG_SPILL_DIR', 'spill/sms_log')
+    SMS_LOG_SPILL_RELOAD_SECONDS = int(os.environ.get('SMS_LOG_SPILL_RELOAD_SECONDS', 60))
+
+    # Per-minute command traffic rollups behind GET /sms_log/traffic (see SMSTrafficStats)
+    SMS_TRAFFIC_ENABLED = os.environ.get('SMS_TRAFFIC_ENABLED', 'true').lower() == 'true'
+    SMS_TRAFFIC_FLUSH_SECONDS = int(os.environ.get('SMS_TRAFFIC_FLUSH_SECONDS', 10))
+    SMS_TRAFFIC_MAX_RANGE_HOURS = int(os.environ.get('SMS_TRAFFIC_MAX_RANGE_HOURS', 168))
+
+    # Monthly sms_log partitions; `flask archive-sms-log` moves those older than
+    # SMS_LOG_HOT_MONTHS into compressed segment files (see SMSLogArchive)
+    SMS_LOG_ARCHIVE_DIR = os.environ.get('SMS_LOG_ARCHIVE_DIR', 'archive/sms_log')
+    SMS_LOG_HOT_MONTHS = int(os.environ.get('SMS_LOG_HOT_MONTHS', 3))
+    SMS_LOG_PARTITION_PREMAKE_MONTHS = int(os.environ.get('SMS_LOG_PARTITION_PREMAKE_MONTHS', 2))
+    SMS_LOG_SEGMENT_BLOCK_ROWS = int(os.environ.get('SMS_LOG_SEGMENT_BLOCK_ROWS', 4096))
+
+    # Idempotent SMS receipt: retries within the window replay the first response
+    SMS_DEDUP_ENABLED = os.environ.get('SMS_DEDUP_ENABLED', 'true').lower() == 'true'
+    SMS_DEDUP_WINDOW_SECONDS = int(os.environ.get('SMS_DEDUP_WINDOW_SECONDS', 300))
+    SMS_DEDUP_SIZE = int(os.environ.get('SMS_DEDUP_SIZE', 10000))
+    # Key SMS without a provider message id on (sender, content, time bucket)
+    SMS_DEDUP_CONTENT_FALLBACK = os.environ.get('SMS_DEDUP_CONTENT_FALLBACK', 'true').lower() == 'true'
+    # An unfinished claim older than this is taken over by the next delivery
+    SMS_DEDUP_LEASE_SECONDS = int(os.environ.get('SMS_DEDUP_LEASE_SECONDS', 30))
+
+    # SMS ingress admission control: per-sender token buckets and a
+    # per-process cap on requests handled at once (0 disables the cap)
+    SMS_RATE_LIMIT_ENABLED = os.environ.get('SMS_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    SMS_RATE_PER_MINUTE = float(os.environ.get('SMS_RATE_PER_MINUTE', 20))
+    SMS_RATE_BURST = int(os.environ.get('SMS_RATE_BURST', 10))
+    SMS_RATE_MAX_SENDERS = int(os.environ.get('SMS_RATE_MAX_SENDERS', 100000))
+    SMS_MAX_CONCURRENCY = int(os.environ.get('SMS_MAX_CONCURRENCY', 32))
+
+    # Outbound SMS: replies are queued in outbound_sms and sent in batches by
+    # background workers (or `flask dispatch-sms` with IN_PROCESS off)
+    SMS_DISPATCH_ENABLED = os.environ.get('SMS_DISPATCH_ENABLED', 'false').lower() == 'true'
+    SMS_DISPATCH_IN_PROCESS = os.environ.get('SMS_DISPATCH_IN_PROCESS', 'true').lower() == 'true'
+    SMS_DISPATCH_WORKERS = int(os.environ.get('SMS_DISPATCH_WORKERS', 4))
+    SMS_DISPATCH_BATCH_SIZE = int(os.environ.get('SMS_DISPATCH_BATCH_SIZE', 100))
+    SMS_DISPATCH_POLL_MS = int(os.environ.get('SMS_DISPATCH_POLL_MS', 500))
+    SMS_DISPATCH_MAX_ATTEMPTS = int(os.environ.get('SMS_DISPATCH_MAX_ATTEMPTS', 5))
+    SMS_DISPATCH_BACKOFF_SECONDS = float(os.environ.get('SMS_DISPATCH_BACKOFF_SECONDS', 2))
+    SMS_DISPATCH_STATS_TTL_SECONDS = int(os.environ.get('SMS_DISPATCH_STATS_TTL_SECONDS', 10))
+    SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL', 'http://localhost:9090')
+    SMS_GATEWAY_API_KEY = os.environ.get('SMS_GATEWAY_API_KEY')
+    SMS_GATEWAY_TIMEOUT_SECONDS = float(os.environ.get('SMS_GATEWAY_TIMEOUT_SECONDS', 10))
+    SMS_SENDER_ID = os.environ.get('SMS_SENDER_ID', 'PENZI')
+
+    # In-memory (gender, town, age) index used by match search
+    CANDIDATE_INDEX_ENABLED = os.environ.get('CANDIDATE_INDEX_ENABLED', 'true').lower() == 'true'
+    CANDIDATE_INDEX_REFRESH_SECONDS = int(os.environ.get('CANDIDATE_INDEX_REFRESH_SECONDS', 30))
+    # Above this many candidates, search uses its indexed SQL predicate instead of an id list
+    CANDIDATE_INDEX_MAX_IDS = int(os.environ.get('CANDIDATE_INDEX_MAX_IDS', 500))
+
+    # Read-through user cache by id and phone (see UserCache); USER_CACHE_SHARED
+    # keeps prefork workers consistent through shared-memory invalidation
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'true').lower() == 'true'
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+    USER_CACHE_SHARED = os.environ.get('USER_CACHE_SHARED', 'false').lower() == 'true'
+
+    # Vectorized match ranking (see MatchScorer); weights are name=value
+    # pairs over county, town, religion, education, marital and age
+    MATCH_SCORING_ENABLED = os.environ.get('MATCH_SCORING_ENABLED', 'true').lower() == 'true'
+    MATCH_SCORE_WEIGHTS = os.environ.get('MATCH_SCORE_WEIGHTS', 'town=4,county=2,religion=2,education=1,marital=1,age=3')
+    MATCH_SCORE_AGE_SPAN = int(os.environ.get('MATCH_SCORE_AGE_SPAN', 10))
+    MATCH_SCORE_REFRESH_SECONDS = int(os.environ.get('MATCH_SCORE_REFRESH_SECONDS', 30))
+    MATCH_TOP_K = int(os.environ.get('MATCH_TOP_K', 3))
+
+    # Per-user sets of already decided / notified profiles left out of match results
+    EXCLUSION_STORE_ENABLED = os.environ.get('EXCLUSION_STORE_ENABLED', 'true').lower() == 'true'
+    EXCLUSION_REFRESH_SECONDS = int(os.environ.get('EXCLUSION_REFRESH_SECONDS', 30))
+
+    # Rows each user_stats_rollup counter is split over, so concurrent
+    # registrations rarely update the same row (see UserStatsService)
+    USER_STATS_SHARDS = int(os.environ.get('USER_STATS_SHARDS', 16))
+
+    # Upper bound on notifications accepted by POST /users/notify/batch
+    NOTIFY_BATCH_MAX_SIZE = int(os.environ.get('NOTIFY_BATCH_MAX_SIZE', 1000))
+
+    # Records merged per transaction by `flask import-users` / fetched per batch by export-users
+    USER_IMPORT_CHUNK_SIZE = int(os.environ.get('USER_IMPORT_CHUNK_SIZE', 5000))
+
+    # `flask replay-sms-log`: sms_log ids re-parsed per chunk and worker processes
+    SMS_REPLAY_CHUNK_SIZE = int(os.environ.get('SMS_REPLAY_CHUNK_SIZE', 10000))
+    SMS_REPLAY_WORKERS = int(os.environ.get('SMS_REPLAY_WORKERS', os.cpu_count() or 1))
+
+    # Server-side match search cursors
+    MATCH_SESSION_TTL_SECONDS = int(os.environ.get('MATCH_SESSION_TTL_SECONDS', 900))
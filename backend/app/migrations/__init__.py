@@ -0,0 +1,125 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module in this package named m<NNNN>_<name>.py that
+defines VERSION, DESCRIPTION and upgrade(connection). Applied versions are
+recorded in the schema_migrations table. Migrations run on an autocommit
+connection so that Postgres indexes can be built CONCURRENTLY, without
+locking writes on live tables.
+
+Create a fresh schema with `flask init-db`. Run pending migrations with
+`flask migrate`; `flask migrate --status` lists them without applying
+anything.
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+from app.extensions import db
+
+
+def load_migrations():
+    """All migration modules in this package, ordered by VERSION"""
+    modules = [
+        importlib.import_module(f'{__name__}.{info.name}')
+        for info in pkgutil.iter_modules(__path__)
+        if info.name.startswith('m') and info.name[1:5].isdigit()
+    ]
+    return sorted(modules, key=lambda module: module.VERSION)
+
+
+def create_index(connection, name, table, expression, unique=False):
+    """
+    Create an index if it does not exist yet.
+
+    On Postgres the build is CONCURRENTLY; an invalid index left behind by
+    an interrupted concurrent build is dropped and rebuilt.
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    if connection.dialect.name == 'postgresql':
+        invalid = connection.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {'name': name}).first()
+        if invalid:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        connection.execute(text(
+            f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({expression})'
+        ))
+    else:
+        connection.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({expression})'))
+
+
+def _ensure_version_table(connection):
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, '
+        'description VARCHAR(200) NOT NULL, '
+        'applied_at TIMESTAMP NOT NULL)'
+    ))
+
+
+def applied_versions(connection):
+    _ensure_version_table(connection)
+    return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def upgrade(engine=None, echo=print):
+    """Apply every pending migration in order; returns the versions applied"""
+    engine = engine or db.engine
+    applied = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        done = applied_versions(connection)
+        for migration in load_migrations():
+            if migration.VERSION in done:
+                continue
+            echo(f'Applying {migration.VERSION:04d}: {migration.DESCRIPTION}')
+            migration.upgrade(connection)
+            connection.execute(
+                text('INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': migration.VERSION, 'd': migration.DESCRIPTION, 't': datetime.utcnow()}
+            )
+            applied.append(migration.VERSION)
+    return applied
+
+
+@click.command('migrate')
+@click.option('--status', is_flag=True, help='List migrations without applying them.')
+@with_appcontext
+def migrate_command(status):
+    """Apply pending schema migrations."""
+    if status:
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            done = applied_versions(connection)
+        for migration in load_migrations():
+            state = 'applied' if migration.VERSION in done else 'pending'
+            click.echo(f'{migration.VERSION:04d} [{state}] {migration.DESCRIPTION}')
+        return
+
+    applied = upgrade(echo=click.echo)
+    click.echo(f'Applied {len(applied)} migration(s).' if applied else 'Schema is up to date.')
+
+
+def init_db(echo=print):
+    """Create all tables and indexes, then apply pending migrations"""
+    import app.models  # noqa: F401 - register every model with the metadata
+    db.create_all()
+    return upgrade(echo=echo)
+
+
+def ensure_schema(echo=print):
+    """Run init_db only if the schema has never been created"""
+    if not inspect(db.engine).has_table('schema_migrations'):
+        init_db(echo=echo)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database schema and apply migrations."""
+    applied = init_db(echo=click.echo)
+    click.echo(f'Schema ready, applied {len(applied)} migration(s).')
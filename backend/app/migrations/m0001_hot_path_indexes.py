@@ -0,0 +1,23 @@
+"""Indexes for the hot read paths: message/match listings, match search,
+notification lookups and sms_log time ranges."""
+from app.migrations import create_index
+
+VERSION = 1
+DESCRIPTION = 'Add hot-path indexes'
+
+INDEXES = [
+    # Each side of the sender OR receiver filter gets its own index so the
+    # OR becomes a BitmapOr; trailing columns serve the keyset ordering
+    ('ix_incoming_messages_sender_phone', 'incoming_messages', 'sender_phone, sent_at, message_id'),
+    ('ix_incoming_messages_receiver_phone', 'incoming_messages', 'receiver_phone, sent_at, message_id'),
+    # matches.user_id is already covered by the (user_id, matched_user_id) unique constraint
+    ('ix_matches_matched_user_id', 'matches', 'matched_user_id'),
+    ('ix_notification_requested_phone', 'notification', 'requested_phone, created_at'),
+    ('ix_sms_log_sent_date', 'sms_log', 'sent_date'),
+    ('ix_users_match_search', 'users', 'registration_status, lower(gender), town, age'),
+]
+
+
+def upgrade(connection):
+    for name, table, expression in INDEXES:
+        create_index(connection, name, table, expression)
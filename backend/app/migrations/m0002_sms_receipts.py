@@ -0,0 +1,10 @@
+"""Idempotency records for received SMS webhooks."""
+from app.models.sms_receipt import SMSReceipt
+
+VERSION = 2
+DESCRIPTION = 'Add sms_receipts table'
+
+
+def upgrade(connection):
+    # Creates the unique idempotency_key index and the received_at index too
+    SMSReceipt.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,10 @@
+"""Persistent queue for outbound SMS."""
+from app.models.outbound_sms import OutboundSMS
+
+VERSION = 3
+DESCRIPTION = 'Add outbound_sms queue table'
+
+
+def upgrade(connection):
+    # Creates ix_outbound_sms_due along with the table
+    OutboundSMS.__table__.create(connection, checkfirst=True)
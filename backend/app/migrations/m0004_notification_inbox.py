@@ -0,0 +1,20 @@
+"""Read state and unread counters for the notification inbox."""
+from sqlalchemy import inspect, text
+
+from app.models.notifications import NotificationCounter
+
+VERSION = 4
+DESCRIPTION = 'Add notification read_at and unread counters'
+
+
+def upgrade(connection):
+    if 'read_at' not in {column['name'] for column in inspect(connection).get_columns('notification')}:
+        connection.execute(text('ALTER TABLE notification ADD COLUMN read_at TIMESTAMP'))
+
+    if not inspect(connection).has_table(NotificationCounter.__tablename__):
+        NotificationCounter.__table__.create(connection)
+        # Existing notifications have never been read
+        connection.execute(text(
+            'INSERT INTO notification_counters (phone_number, unread) '
+            'SELECT requested_phone, COUNT(*) FROM notification WHERE read_at IS NULL GROUP BY requested_phone'
+        ))
@@ -0,0 +1,15 @@
+"""Incrementally maintained user statistics rollup."""
+from sqlalchemy.orm import Session
+
+from app.models.user_stats import UserStatsRollup
+
+VERSION = 5
+DESCRIPTION = 'Add user_stats_rollup table'
+
+
+def upgrade(connection):
+    from app.services.user_stats_service import UserStatsService
+
+    UserStatsRollup.__table__.create(connection, checkfirst=True)
+    with Session(bind=connection) as session:
+        UserStatsService.rebuild(session)
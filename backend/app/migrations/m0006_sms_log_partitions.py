@@ -0,0 +1,48 @@
+"""Partition sms_log by month on Postgres.
+
+The existing table becomes the sms_log_legacy partition, covering
+everything up to the end of its newest month; a DEFAULT partition catches
+rows no monthly partition covers yet, and the next monthly partitions are
+created. Other databases keep the single table (see SMSLogArchive)."""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.services.sms_log_archive import SMSLogArchive, add_months, month_start, sms_log_archive
+
+VERSION = 6
+DESCRIPTION = 'Partition sms_log by month'
+
+
+def upgrade(connection):
+    if connection.dialect.name != 'postgresql' or SMSLogArchive.native(connection):
+        return
+
+    # One transaction: writers wait on the lock instead of seeing no table
+    with connection.engine.begin() as transaction:
+        transaction.execute(text('LOCK TABLE sms_log IN ACCESS EXCLUSIVE MODE'))
+        # The partition key cannot be NULL; such rows predate the column default
+        transaction.execute(text("UPDATE sms_log SET sent_date = '1970-01-01' WHERE sent_date IS NULL"))
+        newest = transaction.execute(text('SELECT MAX(sent_date) FROM sms_log')).scalar()
+        legacy_end = add_months(month_start(max(newest or datetime.utcnow(), datetime.utcnow())), 1)
+
+        transaction.execute(text('ALTER TABLE sms_log RENAME TO sms_log_legacy'))
+        transaction.execute(text('ALTER INDEX sms_log_pkey RENAME TO sms_log_legacy_pkey'))
+        transaction.execute(text('ALTER INDEX IF EXISTS ix_sms_log_sent_date RENAME TO sms_log_legacy_sent_date_idx'))
+        transaction.execute(text('ALTER TABLE sms_log_legacy ALTER COLUMN sent_date SET NOT NULL'))
+
+        # Same columns, defaults (including the id sequence) and NOT NULLs as the old table
+        transaction.execute(text(
+            'CREATE TABLE sms_log (LIKE sms_log_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (sent_date)'
+        ))
+        # A partitioned table's primary key must include the partition key
+        transaction.execute(text('ALTER TABLE sms_log ADD PRIMARY KEY (id, sent_date)'))
+        transaction.execute(text('ALTER TABLE sms_log_legacy ALTER COLUMN id DROP DEFAULT'))
+        transaction.execute(text('ALTER SEQUENCE sms_log_id_seq OWNED BY sms_log.id'))
+        transaction.execute(text('CREATE INDEX ix_sms_log_sent_date ON sms_log (sent_date)'))
+        transaction.execute(text(
+            f"ALTER TABLE sms_log ATTACH PARTITION sms_log_legacy "
+            f"FOR VALUES FROM (MINVALUE) TO ('{legacy_end.isoformat(' ')}')"
+        ))
+        transaction.execute(text('CREATE TABLE sms_log_default PARTITION OF sms_log DEFAULT'))
+        sms_log_archive.ensure_partitions(transaction)
@@ -0,0 +1,17 @@
+"""Command and outcome on sms_log rows, and per-minute traffic rollups."""
+from sqlalchemy import inspect, text
+
+from app.models.sms_traffic import SMSTrafficRollup
+
+VERSION = 7
+DESCRIPTION = 'Add sms_log command/outcome and sms_traffic_rollup'
+
+
+def upgrade(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('sms_log')}
+    # On a partitioned sms_log the columns are added to every partition
+    for name in ('command', 'outcome'):
+        if name not in columns:
+            connection.execute(text(f'ALTER TABLE sms_log ADD COLUMN {name} VARCHAR(20)'))
+
+    SMSTrafficRollup.__table__.create(connection, checkfirst=True)
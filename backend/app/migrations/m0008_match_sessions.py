@@ -0,0 +1,9 @@
+"""Match search sessions shared by all workers."""
+from app.models.match_session import MatchSession
+
+VERSION = 8
+DESCRIPTION = 'Add match_sessions'
+
+
+def upgrade(connection):
+    MatchSession.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,28 @@
+"""Split each user stats counter over several rows."""
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app.models.user_stats import UserStatsRollup
+
+VERSION = 9
+DESCRIPTION = 'Shard user_stats_rollup counters'
+
+
+def upgrade(connection):
+    from app.services.user_stats_service import UserStatsService
+
+    columns = {column['name'] for column in inspect(connection).get_columns('user_stats_rollup')}
+    if 'shard' in columns:
+        return
+    if connection.dialect.name == 'postgresql':
+        # One statement, so the live counters keep their values
+        connection.execute(text(
+            'ALTER TABLE user_stats_rollup ADD COLUMN shard SMALLINT NOT NULL DEFAULT 0, '
+            'DROP CONSTRAINT user_stats_rollup_pkey, ADD PRIMARY KEY (dimension, segment, shard)'
+        ))
+        return
+    # SQLite cannot change a primary key; the rollup is derived, so rebuild it
+    UserStatsRollup.__table__.drop(connection)
+    UserStatsRollup.__table__.create(connection)
+    with Session(bind=connection) as session:
+        UserStatsService.rebuild(session)
@@ -2,4 +2,9 @@ from .user import User
 from .match import Match
 from .message import Message
 from .sms_log import SMSLog
-from .notifications import Notification
\ No newline at end of file
+from .notifications import Notification, NotificationCounter
+from .sms_receipt import SMSReceipt
+from .outbound_sms import OutboundSMS
+from .user_stats import UserStatsRollup
+from .sms_traffic import SMSTrafficRollup
+from .match_session import MatchSession
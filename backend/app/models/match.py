@@ -13,7 +13,10 @@ class Match(db.Model):
     user = db.relationship('User', foreign_keys=[user_id])
     matched_user = db.relationship('User', foreign_keys=[matched_user_id])
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'matched_user_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'matched_user_id'),
+        db.Index('ix_matches_matched_user_id', 'matched_user_id'),
+    )
 
     def __repr__(self):
         return f'<Match {self.id}>'
\ No newline at end of file
@@ -0,0 +1,19 @@
+from app.extensions import db
+
+
+class MatchSession(db.Model):
+    """
+    A paged match search (see MatchSessionStore): the ordered candidate ids,
+    packed as 32-bit ints, and how far the client has read. Kept in the
+    database so any worker can serve the next page.
+    """
+    __tablename__ = 'match_sessions'
+
+    session_id = db.Column(db.String(32), primary_key=True)
+    candidate_ids = db.Column(db.LargeBinary, nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<MatchSession {self.session_id}: {self.position}/{self.total}>'
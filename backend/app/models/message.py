@@ -10,5 +10,10 @@ class Message(db.Model):
     sent_at = db.Column(db.DateTime, default=db.func.now())
     status = db.Column(db.String(20), nullable=False, default='sent')
 
+    __table_args__ = (
+        db.Index('ix_incoming_messages_sender_phone', 'sender_phone', 'sent_at', 'message_id'),
+        db.Index('ix_incoming_messages_receiver_phone', 'receiver_phone', 'sent_at', 'message_id'),
+    )
+
     def __repr__(self):
         return f"<Message {self.sender_phone} → {self.receiver_phone}>"
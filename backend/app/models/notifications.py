@@ -5,4 +5,15 @@ class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     requester_phone = db.Column(db.String(10), db.ForeignKey('users.phone_number'), nullable=False)
     requested_phone = db.Column(db.String(10), db.ForeignKey('users.phone_number'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_notification_requested_phone', 'requested_phone', 'created_at'),)
+
+
+class NotificationCounter(db.Model):
+    """Unread notifications per recipient, kept up to date on notify and read"""
+    __tablename__ = 'notification_counters'
+
+    phone_number = db.Column(db.String(15), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)
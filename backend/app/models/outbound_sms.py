@@ -0,0 +1,31 @@
+from app.extensions import db
+
+
+class OutboundSMS(db.Model):
+    """
+    Persistent queue of SMS waiting to be sent through the gateway.
+
+    status moves pending -> sending -> sent, or back to pending with a later
+    next_attempt_at after a failed attempt, and to failed once attempts are
+    used up. A claimed row's next_attempt_at is pushed out by a lease, so a
+    row left in sending by a crashed worker is picked up again later.
+    """
+    __tablename__ = 'outbound_sms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    from_number = db.Column(db.String(15), nullable=False)
+    to_number = db.Column(db.String(15), nullable=False)
+    message_content = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    last_error = db.Column(db.Text)
+    provider_message_id = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime)
+
+    # Workers claim due rows in id order
+    __table_args__ = (db.Index('ix_outbound_sms_due', 'status', 'next_attempt_at', 'id'),)
+
+    def __repr__(self):
+        return f'<OutboundSMS {self.id} -> {self.to_number}: {self.status}>'
@@ -9,7 +9,10 @@ class SMSLog(db.Model):
     to_number = db.Column(db.String(15), nullable=False)
     message_type = db.Column(db.String(50), nullable=False)
     message_content = db.Column(db.Text, nullable=False)
-    sent_date = db.Column(db.DateTime, default=db.func.now())
+    sent_date = db.Column(db.DateTime, default=db.func.now(), index=True)
+    # Parsed command and how handling it went (see SMSTrafficStats.outcome)
+    command = db.Column(db.String(20))
+    outcome = db.Column(db.String(20))
     
     def __repr__(self):
         return f'<SMSLog {self.id}: {self.from_number} -> {self.to_number}>'
@@ -21,5 +24,7 @@ class SMSLog(db.Model):
             'to_number': self.to_number,
             'message_type': self.message_type,
             'message_content': self.message_content,
-            'sent_date': self.sent_date.isoformat() if self.sent_date else None
+            'sent_date': self.sent_date.isoformat() if self.sent_date else None,
+            'command': self.command,
+            'outcome': self.outcome
         }
\ No newline at end of file
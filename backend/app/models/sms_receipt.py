@@ -0,0 +1,21 @@
+from app.extensions import db
+
+
+class SMSReceipt(db.Model):
+    """
+    Idempotency record for one received SMS webhook (see SMSDedup).
+
+    The unique idempotency_key makes concurrent deliveries of the same SMS
+    race on the index instead of both running the command. Rows are pruned
+    once they fall outside the dedup window.
+    """
+    __tablename__ = 'sms_receipts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), nullable=False, unique=True)
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<SMSReceipt {self.idempotency_key}: {self.status_code}>'
@@ -0,0 +1,23 @@
+from app.extensions import db
+
+
+class SMSTrafficRollup(db.Model):
+    """
+    Per-minute SMS command traffic, maintained incrementally (see SMSTrafficStats).
+
+    One row per (minute, command, latency bucket); latency_le_ms is the
+    bucket's inclusive upper bound. Every column besides the key is a sum,
+    so flushes from any number of processes simply add to it.
+    """
+    __tablename__ = 'sms_traffic_rollup'
+
+    minute = db.Column(db.DateTime, primary_key=True)
+    command = db.Column(db.String(20), primary_key=True)
+    latency_le_ms = db.Column(db.Integer, primary_key=True)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<SMSTrafficRollup {self.minute} {self.command} <={self.latency_le_ms}ms: {self.messages}>'
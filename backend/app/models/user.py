@@ -23,4 +23,8 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<User {self.username}>'
+
+
+# Match search filters on status, gender (case-insensitively), town and an age range
+db.Index('ix_users_match_search', User.registration_status, db.func.lower(User.gender), User.town, User.age)
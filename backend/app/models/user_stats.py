@@ -0,0 +1,22 @@
+from app.extensions import db
+
+
+class UserStatsRollup(db.Model):
+    """
+    User counts per demographic segment, maintained incrementally.
+
+    dimension is 'all' (a single '' segment holding the totals), 'gender',
+    'county', 'town' or 'age_band'; segment is the normalized value. Each
+    counter is split over up to USER_STATS_SHARDS rows that are summed on
+    read, so concurrent writers rarely contend for one row.
+    """
+    __tablename__ = 'user_stats_rollup'
+
+    dimension = db.Column(db.String(20), primary_key=True)
+    segment = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0, autoincrement=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    complete = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserStatsRollup {self.dimension}={self.segment}: {self.total}>'
@@ -1,104 +1,284 @@
-from flask import Blueprint, request, jsonify
-from app.models import Match, User
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
+from app.models import User
 from app.extensions import db
-from sqlalchemy import and_
+from app.services.candidate_index import candidate_index
+from app.services.exclusion_store import exclusion_store
+from app.services.match_session import match_sessions
+from app.services import MatchService, UserService
+from app.utils import encode_cursor, decode_cursor, stream_json_array, with_weak_etag, validate_match_data
+from app.utils.serializers import MATCH_FIELDS, parse_fields, user_load_options, serialize_user, json_response
+from sqlalchemy import and_, func
+from werkzeug.exceptions import BadRequest
 
 match_bp = Blueprint('matches', __name__)
 
+
+def _search_criteria(args):
+    """Read the match search query params shared by the search endpoints"""
+    return (
+        int(args.get('age_min', 18)),
+        int(args.get('age_max', 80)),
+        args.get('town', '').strip(),
+        args.get('gender', '').strip().lower(),
+    )
+
+
+def _requester_id(args):
+    """Id of the user searching (?requester=<phone>), or None if not given"""
+    phone_number = args.get('requester', '').strip()
+    if not phone_number:
+        return None
+    requester = UserService.find_user(phone_number=phone_number)
+    if requester is None:
+        raise ValueError('Requester not found')
+    return requester.id
+
+
+def _search_query(age_min, age_max, town, gender, *columns, requester_id=None):
+    """
+    Filtered query for complete profiles matching the search criteria.
+
+    With requester_id, profiles that user already decided on or asked about
+    are left out. Returns None when the candidate index already knows there
+    are no matches. The index's ids narrow the query only while there are
+    few of them; larger sets are left to the SQL predicate.
+    """
+    query = db.session.query(*columns) if columns else User.query
+    query = query.filter(
+        and_(
+            User.age >= age_min,
+            User.age <= age_max,
+            func.lower(User.gender) == gender,
+            User.town == town,
+            User.registration_status == 'complete'
+        )
+    )
+
+    # Narrow to indexed candidates; the filters above still apply exactly
+    if candidate_index.enabled:
+        candidate_ids = candidate_index.candidate_ids(gender, town, age_min, age_max)
+        if requester_id is not None:
+            candidate_ids = exclusion_store.filter(requester_id, candidate_ids)
+        if not candidate_ids:
+            return None
+        if len(candidate_ids) <= candidate_index.max_ids:
+            return query.filter(User.id.in_(candidate_ids))
+
+    if requester_id is not None:
+        excluded = exclusion_store.excluded(requester_id)
+        if excluded:
+            query = query.filter(User.id.notin_(excluded.tolist()))
+    return query
+
 # ✅ Create a new match
 @match_bp.route('/', methods=['POST'])
 def create_match():
-    data = request.get_json()
-    new_match = Match(
-        user_id=data['user_id'],
-        matched_user_id=data['matched_user_id']
-    )
-    db.session.add(new_match)
-    db.session.commit()
+    data = request.get_json(silent=True) or {}
+    try:
+        validate_match_data(data)
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+    MatchService.create_match(data['user_id'], data['matched_user_id'])
     return jsonify({'message': 'Match created successfully!'}), 201
 
-# ✅ Get matches by user ID
-@match_bp.route('/<int:user_id>', methods=['GET'])
-def get_matches(user_id):
-    matches = Match.query.filter(
-        (Match.user_id == user_id) | (Match.matched_user_id == user_id)
-    ).all()
-    return jsonify([{
+def _match_dict(match):
+    return {
         'id': match.id,
         'matched_user_id': match.matched_user_id,
         'status': match.status
-    } for match in matches]), 200
+    }
+
+# ✅ Get matches by user ID
+@match_bp.route('/<int:user_id>', methods=['GET'])
+def get_matches(user_id):
+    """
+    Matches involving a user, oldest first.
+
+    Supports the same limit/after/stream params as GET /messages/<phone>;
+    the next page's cursor is returned in X-Next-Cursor.
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+        after = decode_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        rows = (_match_dict(match) for match in MatchService.iter_matches(user_id, after))
+        return Response(stream_with_context(stream_json_array(rows)), mimetype='application/json')
+
+    matches = MatchService.get_matches(user_id, limit=limit, after=after)
+    response = jsonify([_match_dict(match) for match in matches])
+    if matches and len(matches) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(matches[-1].match_date, matches[-1].id)
+    return with_weak_etag(response)
 
 # ✅ Search for matches using query params
 @match_bp.route('/', methods=['GET'])
 def search_matches():
+    """
+    Complete profiles matching the criteria.
+
+    ?fields= picks the profile fields returned (and loaded from the database),
+    e.g. fields=username,age,phone_number for a slim listing. ?requester=<phone>
+    leaves out profiles that user already decided on or asked about.
+    """
     try:
-        age_min = int(request.args.get('age_min', 18))
-        age_max = int(request.args.get('age_max', 80))
-        town = request.args.get('town', '').strip()
-        gender = request.args.get('gender', '').strip().lower()
-
-        query = User.query.filter(
-            and_(
-                User.age >= age_min,
-                User.age <= age_max,
-                User.gender.ilike(gender),
-                User.town == town,
-                User.registration_status == 'complete'
-            )
-        )
+        query = _search_query(*_search_criteria(request.args), requester_id=_requester_id(request.args))
+        if query is None:
+            return jsonify([]), 200
 
-        results = query.all()
-        return jsonify([
-            {
-                'username': u.username,
-                'age': u.age,
-                'town': u.town,
-                'phone_number': u.phone_number,
-                'education_level': u.education_level,
-                'profession': u.profession,
-                'marital_status': u.marital_status,
-                'religion': u.religion,
-                'ethnicity': u.ethnicity,
-                'self_description': u.self_description
-            } for u in results
-        ]), 200
+        fields = parse_fields(request.args.get('fields'), default=MATCH_FIELDS)
+        results = query.options(user_load_options(fields)).all()
+        return with_weak_etag(json_response([serialize_user(u, fields) for u in results]))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-# ✅ Confirm a match (YES command)
-@match_bp.route('/confirm', methods=['POST'])
-def confirm_match():
+SLIM_MATCH_FIELDS = ('username', 'age', 'phone_number')
+
+
+def _slim_matches(user_ids):
+    """Load username/age/phone for the given ids, keeping their order"""
+    if not user_ids:
+        return []
+    users = User.query.options(user_load_options(SLIM_MATCH_FIELDS)).filter(User.id.in_(user_ids)).all()
+    by_id = {user.id: user for user in users}
+    return [
+        serialize_user(u, SLIM_MATCH_FIELDS)
+        for u in (by_id.get(user_id) for user_id in user_ids) if u is not None
+    ]
+
+
+def _page_size(args):
+    return max(1, min(int(args.get('page_size', 3)), 50))
+
+
+# ✅ Start a paged match search session
+@match_bp.route('/session', methods=['GET'])
+def start_match_session():
+    """
+    Run a match search and keep the result ids server-side.
+
+    Takes the same query params as GET /matches/ plus page_size (default 3).
+    Returns the total, a session id for GET /matches/session/<id>/next and
+    the first page of slim records.
+    """
+    try:
+        page_size = _page_size(request.args)
+        query = _search_query(*_search_criteria(request.args), User.id, requester_id=_requester_id(request.args))
+        candidate_ids = [] if query is None else [user_id for (user_id,) in query.order_by(User.age, User.id)]
+
+        session_id = match_sessions.create(candidate_ids)
+        page_ids, total, remaining = match_sessions.next_page(session_id, page_size)
+        return jsonify({
+            'session_id': session_id,
+            'total': total,
+            'remaining': remaining,
+            'matches': _slim_matches(page_ids)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+# ✅ Next page of a match search session (NEXT command)
+@match_bp.route('/session/<session_id>/next', methods=['GET'])
+def next_match_page(session_id):
+    try:
+        page = match_sessions.next_page(session_id, _page_size(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if page is None:
+        return jsonify({'error': 'Match session not found or expired'}), 404
+
+    page_ids, total, remaining = page
+    return jsonify({
+        'session_id': session_id,
+        'total': total,
+        'remaining': remaining,
+        'matches': _slim_matches(page_ids)
+    }), 200
+
+# ✅ Ranked matches for a user
+@match_bp.route('/top/<phone_number>', methods=['GET'])
+def top_matches(phone_number):
+    """
+    The k (default MATCH_TOP_K, at most 50) best-scoring profiles for a user,
+    best first, optionally within age_min/age_max.
+    """
+    requester = UserService.find_user(phone_number=phone_number)
+    if not requester:
+        return jsonify({'error': 'User not found'}), 404
+    try:
+        k = max(1, min(request.args.get('k', current_app.config['MATCH_TOP_K'], type=int), 50))
+        age_min = request.args.get('age_min', type=int)
+        age_max = request.args.get('age_max', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    matches = []
+    for user_id, score in MatchService.top_matches(requester, k=k, age_min=age_min, age_max=age_max):
+        user = UserService.find_user(user_id=user_id)
+        if user:
+            matches.append(dict(serialize_user(user, SLIM_MATCH_FIELDS), score=score))
+    return jsonify({'matches': matches}), 200
+
+DECISION_STATUSES = {'confirm': 'confirmed', 'decline': 'declined'}
+
+
+def _decide(status, message):
     data = request.get_json()
-    user = User.query.filter_by(phone_number=data['from_user']).first()
-    match = User.query.filter_by(phone_number=data['to_user']).first()
+    user = UserService.find_user(phone_number=data['from_user'])
+    match = UserService.find_user(phone_number=data['to_user'])
 
     if user and match:
-        existing = Match.query.filter_by(user_id=user.id, matched_user_id=match.id).first()
-        if existing:
-            existing.status = 'confirmed'
-        else:
-            new = Match(user_id=user.id, matched_user_id=match.id, status='confirmed')
-            db.session.add(new)
-        db.session.commit()
-        return jsonify({'message': 'Match confirmed!'}), 200
+        MatchService.set_status(user.id, match.id, status)
+        return jsonify({'message': message}), 200
     return jsonify({'message': 'User(s) not found'}), 404
 
+# ✅ Confirm a match (YES command)
+@match_bp.route('/confirm', methods=['POST'])
+def confirm_match():
+    return _decide('confirmed', 'Match confirmed!')
+
 # ✅ Decline a match (NO command)
 @match_bp.route('/decline', methods=['POST'])
 def decline_match():
-    data = request.get_json()
-    user = User.query.filter_by(phone_number=data['from_user']).first()
-    match = User.query.filter_by(phone_number=data['to_user']).first()
+    return _decide('declined', 'Match declined!')
 
-    if user and match:
-        existing = Match.query.filter_by(user_id=user.id, matched_user_id=match.id).first()
-        if existing:
-            existing.status = 'declined'
+# ✅ Apply many confirm/decline decisions in one statement
+@match_bp.route('/bulk', methods=['POST'])
+def bulk_decide():
+    decisions = (request.get_json(silent=True) or {}).get('decisions')
+    if not isinstance(decisions, list) or not decisions:
+        return jsonify({'error': 'decisions must be a non-empty list'}), 400
+
+    ids = UserService.ids_by_phone(
+        {d.get('from_user') for d in decisions if isinstance(d, dict)}
+        | {d.get('to_user') for d in decisions if isinstance(d, dict)}
+    )
+
+    results, pairs = [], []
+    for index, decision in enumerate(decisions):
+        decision = decision if isinstance(decision, dict) else {}
+        status = DECISION_STATUSES.get(str(decision.get('decision', '')).lower())
+        user_id, matched_id = ids.get(decision.get('from_user')), ids.get(decision.get('to_user'))
+        if status is None:
+            results.append({'index': index, 'status': 400, 'error': "decision must be 'confirm' or 'decline'"})
+        elif not (user_id and matched_id):
+            results.append({'index': index, 'status': 404, 'error': 'User(s) not found'})
         else:
-            new = Match(user_id=user.id, matched_user_id=match.id, status='declined')
-            db.session.add(new)
-        db.session.commit()
-        return jsonify({'message': 'Match declined!'}), 200
-    return jsonify({'message': 'User(s) not found'}), 404
+            pairs.append((index, (user_id, matched_id), status))
+            results.append(None)
+
+    match_ids = MatchService.set_statuses((user_id, matched_id, status) for _, (user_id, matched_id), status in pairs)
+    for index, pair, status in pairs:
+        results[index] = {'index': index, 'status': 200, 'match_id': match_ids[pair], 'match_status': status}
+
+    return jsonify({'count': len(results), 'results': results}), 200
+
+
+@match_bp.route('/exclusions/stats', methods=['GET'])
+def exclusion_stats():
+    """Size of the already-seen / already-decided pair store"""
+    return jsonify(exclusion_store.stats()), 200
@@ -1,9 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.models.message import Message
 from app.extensions import db
+from app.services import MessageService
+from app.utils import encode_cursor, decode_cursor, stream_json_array
 
 message_bp = Blueprint('messages', __name__)
 
+
+def _message_dict(m):
+    return {
+        'message_id': m.message_id,
+        'sender_phone': m.sender_phone,
+        'receiver_phone': m.receiver_phone,
+        'message_text': m.message_text,
+        'sent_at': m.sent_at.isoformat() if m.sent_at else None,
+        'status': m.status
+    }
+
 @message_bp.route('/', methods=['POST'])
 def send_message():
     data = request.get_json()
@@ -27,18 +40,27 @@ def send_message():
 
 @message_bp.route('/<string:phone_number>', methods=['GET'])
 def get_messages(phone_number):
-    messages = Message.query.filter(
-        (Message.sender_phone == phone_number) |
-        (Message.receiver_phone == phone_number)
-    ).all()
-
-    return jsonify([
-        {
-            'message_id': m.message_id,
-            'sender_phone': m.sender_phone,
-            'receiver_phone': m.receiver_phone,
-            'message_text': m.message_text,
-            'sent_at': m.sent_at.isoformat(),
-            'status': m.status
-        } for m in messages
-    ]), 200
+    """
+    Messages sent or received by a phone number, oldest first.
+
+    Query params:
+        limit: page size (default 100, at most 500); the next page's cursor
+            is returned in X-Next-Cursor
+        after: cursor from a previous page's X-Next-Cursor header
+        stream: if true, stream the whole (remaining) history instead
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+        after = decode_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        rows = (_message_dict(m) for m in MessageService.iter_messages(phone_number, after))
+        return Response(stream_with_context(stream_json_array(rows)), mimetype='application/json')
+
+    messages = MessageService.get_messages(phone_number, limit=limit, after=after)
+    response = jsonify([_message_dict(m) for m in messages])
+    if messages and len(messages) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(messages[-1].sent_at, messages[-1].message_id)
+    return response, 200
@@ -1,11 +1,67 @@
-from flask import Blueprint, request, jsonify
-from app.models.sms_log import SMSLog
+import time
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, make_response, current_app
 from app.extensions import db
 from app.utils.sms_parser import SMSParser
-from app.services.sms_handlers import handle_match_request, handle_message, handle_register
+from app.services.sms_log_writer import sms_log_writer
+from app.services.sms_log_archive import sms_log_archive
+from app.services.sms_traffic import sms_traffic
+from app.services.sms_dedup import sms_dedup
+from app.services.rate_limiter import sms_rate_limiter
+from app.services.sms_dispatcher import sms_dispatcher
+from app.services.sms_handlers import handle_match_request, handle_message, handle_register, handle_register_batch
 
 sms_log_bp = Blueprint('sms_log', __name__)
 
+# Commands with a batched handler: one call per command type per batch
+BATCH_HANDLERS = {
+    "REGISTER": handle_register_batch,
+}
+
+
+def _handle_command(parsed):
+    """Dispatch a parsed SMS command to its handler"""
+    if parsed.command == "REGISTER":
+        return handle_register(parsed)
+    elif parsed.command == "MATCH":
+        return handle_match_request(parsed)
+    elif parsed.command == "MESSAGE":
+        return handle_message(parsed)
+    elif parsed.command == "HELP":
+        return jsonify({"message": SMSParser.get_help_text()})
+    else:
+        return jsonify({
+            "message": "SMS received and parsed successfully",
+            "parsed_command": parsed.command,
+            "parameters": parsed.parameters
+        })
+
+
+# Commands whose reply is also sent back to the sender as an SMS
+REPLY_COMMANDS = {"REGISTER", "MATCH", "MESSAGE", "HELP"}
+
+
+def _reply_sms(parsed, body, status):
+    """(to_number, text) of the SMS reply for a handled command, or None"""
+    if parsed.command not in REPLY_COMMANDS or status >= 500 or not isinstance(body, dict):
+        return None
+    text = body.get("message") or body.get("error")
+    if not text:
+        return None
+    lines = [text.strip()]
+    lines.extend(f"{m['username']} aged {m['age']}, {m['phone_number']}." for m in body.get("matches", ()))
+    return parsed.sender_phone, "\n".join(lines)
+
+
+def _command_error(parsed, e):
+    return {
+        "error": "Error processing SMS command",
+        "details": str(e),
+        "parsed_command": parsed.command,
+        "parameters": parsed.parameters
+    }
+
 
 
 @sms_log_bp.route('/', methods=['POST'])
@@ -19,47 +75,245 @@ def receive_sms():
     if not sender_phone or not message:
         return jsonify({'error': 'Missing sender phone number or message content'}), 400
 
-    # Parse the SMS command
-    parsed = SMSParser.parse_sms(message, sender_phone)
+    # Gateway retries of an SMS we already handled get the recorded response,
+    # without using up the sender's tokens
+    key = sms_dedup.key(data, sender_phone, message)
+    replay = sms_dedup.claim(key)
+    if replay is not None:
+        return replay
 
-    # Log the SMS
-    new_sms_log = SMSLog(
-        from_number=sender_phone,
-        to_number=data.get('to_number', 'PENZI'),
-        message_type=data.get('message_type', 'INCOMING'),
-        message_content=message
-    )
+    # Throttle noisy senders and shed load; a turned away SMS gives up its claim
+    wait = sms_rate_limiter.take(sender_phone)
+    if wait:
+        sms_dedup.release(key)
+        return sms_rate_limiter.sender_limited_reply(wait)
+    if not sms_rate_limiter.acquire():
+        sms_dedup.release(key)
+        return sms_rate_limiter.busy_reply()
+    try:
+        return _receive(data, sender_phone, message, key)
+    finally:
+        sms_rate_limiter.release()
 
-    db.session.add(new_sms_log)
-    db.session.commit()
 
-    # Handle the parsed command
+def _receive(data, sender_phone, message, key):
+    started = time.perf_counter()
+    response = None
     try:
-        if parsed.command == "REGISTER":
-            response = handle_register(parsed)
-        elif parsed.command == "MATCH":
-            response = handle_match_request(parsed)
-        elif parsed.command == "MESSAGE":
-            response = handle_message(parsed)
-        elif parsed.command == "HELP":
-            response = jsonify({"message": SMSParser.get_help_text()})
-        else:
-            response = jsonify({
-                "message": "SMS received and parsed successfully",
-                "parsed_command": parsed.command,
-                "parameters": parsed.parameters
-            })
-        
-        return response
-    except Exception as e:
-        return jsonify({
-            "error": "Error processing SMS command",
-            "details": str(e),
-            "parsed_command": parsed.command,
-            "parameters": parsed.parameters
-        }), 500
+        # Parse the SMS command
+        parsed = SMSParser.parse_sms(message, sender_phone)
+        log_row = sms_log_writer.row(
+            from_number=sender_phone,
+            to_number=data.get('to_number', 'PENZI'),
+            message_type=data.get('message_type', 'INCOMING'),
+            message_content=message,
+            command=parsed.command
+        )
+
+        # Handle the parsed command
+        try:
+            response = make_response(_handle_command(parsed))
+        except Exception as e:
+            response = make_response(jsonify(_command_error(parsed, e)), 500)
+    finally:
+        # Without a response the claim is released, so a retry is handled afresh
+        sms_dedup.record(key, response)
+
+    # Log the SMS with its outcome (queued and written by the next write-behind flush)
+    log_row['outcome'] = sms_traffic.outcome(response.status_code)
+    sms_log_writer.write([log_row])
+    sms_traffic.record(parsed.command, log_row['outcome'], (time.perf_counter() - started) * 1000)
+
+    # Sent by the dispatcher's workers, never from this request thread
+    reply = _reply_sms(parsed, response.get_json(silent=True), response.status_code)
+    if reply:
+        sms_dispatcher.enqueue(*reply)
+    return response
 
 @sms_log_bp.route('/receive', methods=['POST'])
 def receive_sms_alt():
     """Alternative endpoint for SMS reception"""
     return receive_sms()
+
+
+@sms_log_bp.route('/batch', methods=['POST'])
+def receive_sms_batch():
+    """
+    Receive many SMS messages in one request.
+
+    Accepts {"messages": [...]} (or a bare list) where each item uses the same
+    fields as POST /sms_log/. All SMSLog rows are handed to the log writer
+    together and written as multi-row inserts, commands with a batched
+    handler are processed once per command type, and one result per message
+    is returned in request order. Each message is deduplicated as on
+    POST /sms_log/.
+    """
+    data = request.get_json()
+    items = data.get('messages') if isinstance(data, dict) else data
+
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected a list of messages'}), 400
+
+    max_size = current_app.config['SMS_BATCH_MAX_SIZE']
+    if len(items) > max_size:
+        return jsonify({'error': f'Batch too large, at most {max_size} messages allowed'}), 413
+
+    # A batch occupies one concurrency slot; senders are throttled per message
+    if not sms_rate_limiter.acquire():
+        return sms_rate_limiter.busy_reply()
+    try:
+        return _receive_batch(items)
+    finally:
+        sms_rate_limiter.release()
+
+
+def _receive_batch(items):
+    claims = {}
+    try:
+        return _handle_batch(items, claims)
+    finally:
+        # Claims of messages that got no result (an exception) are released
+        for key in claims.values():
+            sms_dedup.release(key)
+
+
+def _handle_batch(items, claims):
+    """Handle a batch; claims collects the dedup key of each accepted message by index"""
+    started = time.perf_counter()
+    results = [None] * len(items)
+    log_rows = []
+    accepted = []
+
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        sender_phone = item.get('sender') or item.get('from_number')
+        message = item.get('message') or item.get('message_content')
+
+        if not sender_phone or not message:
+            results[index] = ({'error': 'Missing sender phone number or message content'}, 400)
+            continue
+
+        # Retried messages get their recorded result, as on POST /sms_log/
+        key = sms_dedup.key(item, sender_phone, message)
+        replay = sms_dedup.claim(key)
+        if replay is not None:
+            results[index] = (replay.get_json(silent=True), replay.status_code)
+            continue
+
+        if sms_rate_limiter.take(sender_phone):
+            sms_dedup.release(key)
+            results[index] = ({'error': 'Rate limit exceeded', 'message': sms_rate_limiter.SENDER_REPLY}, 429)
+            continue
+
+        if key is not None:
+            claims[index] = key
+        parsed = SMSParser.parse_sms(message, sender_phone)
+        accepted.append((index, parsed))
+        log_rows.append(sms_log_writer.row(
+            from_number=sender_phone,
+            to_number=item.get('to_number', 'PENZI'),
+            message_type=item.get('message_type', 'INCOMING'),
+            message_content=message,
+            command=parsed.command
+        ))
+
+    # Group commands by type so batched handlers see all of theirs at once
+    grouped = {}
+    for index, parsed in accepted:
+        if parsed.command in BATCH_HANDLERS:
+            grouped.setdefault(parsed.command, []).append((index, parsed))
+            continue
+        try:
+            response = make_response(_handle_command(parsed))
+            results[index] = (response.get_json(), response.status_code)
+        except Exception as e:
+            results[index] = (_command_error(parsed, e), 500)
+
+    for command, entries in grouped.items():
+        commands = [parsed for _, parsed in entries]
+        try:
+            outcomes = BATCH_HANDLERS[command](commands)
+        except Exception as e:
+            db.session.rollback()
+            outcomes = [(_command_error(parsed, e), 500) for parsed in commands]
+        for (index, _), outcome in zip(entries, outcomes):
+            results[index] = outcome
+
+    for index, key in list(claims.items()):
+        body, status = results[index]
+        sms_dedup.record(key, make_response(jsonify(body), status))
+        del claims[index]
+
+    # Log every SMS with its outcome through the writer, which inserts them as multi-row batches
+    latency_ms = (time.perf_counter() - started) * 1000
+    for (index, parsed), log_row in zip(accepted, log_rows):
+        log_row['outcome'] = sms_traffic.outcome(results[index][1])
+        sms_traffic.record(parsed.command, log_row['outcome'], latency_ms)
+    sms_log_writer.write(log_rows)
+
+    replies = [_reply_sms(parsed, *results[index]) for index, parsed in accepted]
+    sms_dispatcher.enqueue_many([reply for reply in replies if reply])
+
+    return jsonify({
+        'count': len(results),
+        'results': [
+            {'index': index, 'status': status, 'response': body}
+            for index, (body, status) in enumerate(results)
+        ]
+    }), 200
+
+
+@sms_log_bp.route('/writer/stats', methods=['GET'])
+def writer_stats():
+    """Queue depth and flush latency counters of the SMS log writer"""
+    return jsonify(sms_log_writer.stats()), 200
+
+
+@sms_log_bp.route('/dedup/stats', methods=['GET'])
+def dedup_stats():
+    """Hit counters of the SMS receipt dedup"""
+    return jsonify(sms_dedup.stats()), 200
+
+
+@sms_log_bp.route('/limits/stats', methods=['GET'])
+def limits_stats():
+    """Rate limit and load shedding counters of the SMS ingress"""
+    return jsonify(sms_rate_limiter.stats()), 200
+
+
+@sms_log_bp.route('/outbound/stats', methods=['GET'])
+def outbound_stats():
+    """Outbound SMS queue and delivery counters"""
+    return jsonify(sms_dispatcher.stats()), 200
+
+
+@sms_log_bp.route('/traffic', methods=['GET'])
+def traffic():
+    """
+    Command traffic from the per-minute rollups.
+
+    ?from=&to= are ISO timestamps (default: the last hour), ?step= groups
+    that many minutes per point and ?command= keeps one command.
+    """
+    try:
+        # The default end includes the current, still filling minute
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else datetime.utcnow() + timedelta(minutes=1)
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(hours=1)
+        step = request.args.get('step', 1, type=int)
+        if not 1 <= step <= 1440:
+            raise ValueError('step must be between 1 and 1440 minutes')
+        return jsonify(sms_traffic.query(start, end, step, request.args.get('command'))), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@sms_log_bp.route('/traffic/stats', methods=['GET'])
+def traffic_stats():
+    """Recording and flush counters of the traffic rollups"""
+    return jsonify(sms_traffic.stats()), 200
+
+
+@sms_log_bp.route('/archive/stats', methods=['GET'])
+def archive_stats():
+    """Hot sms_log partitions and archived segment files"""
+    return jsonify(sms_log_archive.stats()), 200
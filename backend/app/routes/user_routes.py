@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
-from app.services import UserService
-from app.utils import validate_user_data, format_response
+from flask import Blueprint, request, jsonify, current_app
+from app.services import UserService, NotificationService
+from app.services.user_cache import user_cache
+from app.utils import validate_user_data, format_response, parse_fields, serialize_user, json_response
+from app.utils import encode_cursor, decode_cursor, user_load_options
+from app.utils import version_etag, is_not_modified, set_validators, not_modified, with_weak_etag
 from werkzeug.exceptions import BadRequest
 from flask_cors import cross_origin
 from app.extensions import db
@@ -24,49 +27,52 @@ def register_user():
     except Exception as e:
         return jsonify(format_response(str(e))), 500
 
+def _conditional_user(user, fields):
+    """
+    Profile response with a strong ETag and Last-Modified from updated_at.
+
+    user is a cached snapshot, or a row loaded with just the requested
+    fields; when the client's validators still match it a bodiless 304 is
+    returned.
+    """
+    if user is None:
+        return jsonify(format_response('User not found')), 404
+    etag = version_etag(user.id, user.updated_at, ','.join(fields))
+    if is_not_modified(etag, user.updated_at):
+        return not_modified(etag, user.updated_at)
+    response = json_response(format_response('User found', serialize_user(user, fields)))
+    return set_validators(response, etag, user.updated_at)
+
+def _projection(fields):
+    """Columns to load on a cache miss: only the requested ones, if ?fields= was given"""
+    return fields if request.args.get('fields') else None
+
 @user_bp.route('/<int:id>', methods=['GET'])
 def get_user(id):
-    user = UserService.get_user(id)
-    if user:
-        return jsonify(format_response('User found', {
-            'id': user.id,
-            'phone_number': user.phone_number,
-            'username': user.username,
-            'age': user.age,
-            'gender': user.gender,
-            'county': user.county,
-            'town': user.town,
-            'education_level': user.education_level,
-            'profession': user.profession,
-            'marital_status': user.marital_status,
-            'religion': user.religion,
-            'ethnicity': user.ethnicity,
-            'self_description': user.self_description,
-            'registration_status': user.registration_status
-        })), 200
-    return jsonify(format_response('User not found')), 404
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except BadRequest as e:
+        return jsonify(format_response(e.description)), 400
+    return _conditional_user(UserService.find_user(user_id=id, fields=_projection(fields)), fields)
 
 @user_bp.route('/phone/<phone_number>', methods=['GET'])
 def get_user_by_phone(phone_number):
-    user = UserService.get_user_by_phone(phone_number)
-    if user:
-        return jsonify(format_response('User found', {
-            'id': user.id,
-            'phone_number': user.phone_number,
-            'username': user.username,
-            'age': user.age,
-            'gender': user.gender,
-            'county': user.county,
-            'town': user.town,
-            'education_level': user.education_level,
-            'profession': user.profession,
-            'marital_status': user.marital_status,
-            'religion': user.religion,
-            'ethnicity': user.ethnicity,
-            'self_description': user.self_description,
-            'registration_status': user.registration_status
-        })), 200
-    return jsonify(format_response('User not found')), 404
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except BadRequest as e:
+        return jsonify(format_response(e.description)), 400
+    return _conditional_user(
+        UserService.find_user(phone_number=phone_number, fields=_projection(fields)), fields
+    )
+
+@user_bp.route('/stats', methods=['GET'])
+def get_user_stats():
+    """Totals, completion rate and gender/county/town/age band histograms"""
+    return with_weak_etag(jsonify(UserService.get_user_stats()))
+
+@user_bp.route('/cache/stats', methods=['GET'])
+def user_cache_stats():
+    return jsonify(user_cache.stats()), 200
 
 @user_bp.route('/<int:id>', methods=['PUT'])
 def update_user(id):
@@ -91,25 +97,11 @@ def search_matches():
             'town': request.args.get('town'),
             'gender': request.args.get('gender')
         }
-        matches = UserService.search_users(criteria)
-        return jsonify(format_response('Matches found', [
-            {
-                'id': user.id,
-                'phone_number': user.phone_number,
-                'username': user.username,
-                'age': user.age,
-                'gender': user.gender,
-                'county': user.county,
-                'town': user.town,
-                'education_level': user.education_level,
-                'profession': user.profession,
-                'marital_status': user.marital_status,
-                'religion': user.religion,
-                'ethnicity': user.ethnicity,
-                'self_description': user.self_description,
-                'registration_status': user.registration_status
-            } for user in matches
-        ])), 200
+        fields = parse_fields(request.args.get('fields'))
+        matches = UserService.search_users(criteria, fields)
+        return with_weak_etag(json_response(format_response('Matches found', [serialize_user(user, fields) for user in matches])))
+    except BadRequest as e:
+        return jsonify(format_response(e.description)), 400
     except Exception as e:
         return jsonify(format_response(str(e))), 500
 
@@ -129,13 +121,7 @@ def notify_user():
         requester = data.get('requester')
         requested = data.get('requested')
 
-        from app.models.notifications import Notification
-        notification = Notification(
-            requester_phone=requester['phone_number'],
-            requested_phone=requested['phone_number']
-        )
-        db.session.add(notification)
-        db.session.commit()
+        NotificationService.notify(requester['phone_number'], requested['phone_number'])
 
         return jsonify(format_response('Notification sent')), 201
 
@@ -144,32 +130,103 @@ def notify_user():
         return jsonify(format_response(str(e))), 500
 
 
+@user_bp.route('/notify/batch', methods=['POST'])
+def notify_users_batch():
+    """
+    Fan out many notifications in one transaction.
+
+    Body: {"notifications": [{"requester_phone": ..., "requested_phone": ...}]}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('notifications')
+    if not isinstance(items, list) or not items:
+        return jsonify(format_response('notifications must be a non-empty list')), 400
+    max_size = current_app.config['NOTIFY_BATCH_MAX_SIZE']
+    if len(items) > max_size:
+        return jsonify(format_response(f'Batch too large, at most {max_size} notifications allowed')), 413
+
+    pairs = [(item.get('requester_phone'), item.get('requested_phone')) for item in items if isinstance(item, dict)]
+    if len(pairs) != len(items) or not all(requester and requested for requester, requested in pairs):
+        return jsonify(format_response('Every notification needs requester_phone and requested_phone')), 400
+
+    try:
+        created = NotificationService.notify_many(pairs)
+        return jsonify(format_response('Notifications sent', {'count': created})), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify(format_response(str(e))), 500
+
+
+# Requester profile fields shown in the inbox unless ?fields= asks for others
+INBOX_FIELDS = ('username', 'age', 'gender', 'town', 'phone_number')
+
+
+@user_bp.route('/<phone_number>/notifications', methods=['GET'])
+def get_notifications(phone_number):
+    """
+    Notification inbox of a user, newest first, with the requester's profile.
+
+    Query params:
+        limit: page size (default 20, at most 100); the next page's cursor is
+            returned in X-Next-Cursor
+        after: cursor from a previous page's X-Next-Cursor header
+        unread: if true, only unread notifications
+        fields: requester profile fields to include
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        after = decode_cursor(request.args['after']) if request.args.get('after') else None
+        fields = parse_fields(request.args.get('fields'), default=INBOX_FIELDS)
+    except ValueError as e:
+        return jsonify(format_response(str(e))), 400
+    except BadRequest as e:
+        return jsonify(format_response(e.description)), 400
+
+    rows = NotificationService.get_inbox(
+        phone_number, limit=limit, after=after,
+        unread_only=request.args.get('unread', '').lower() in ('1', 'true'),
+        user_options=user_load_options(fields),
+    )
+    response = json_response({
+        'unread': NotificationService.unread_count(phone_number),
+        'notifications': [{
+            'id': notification.id,
+            'created_at': notification.created_at.isoformat() if notification.created_at else None,
+            'read': notification.read_at is not None,
+            'requester': serialize_user(requester, fields),
+        } for notification, requester in rows],
+    })
+    if len(rows) == limit:
+        last = rows[-1][0]
+        response.headers['X-Next-Cursor'] = encode_cursor(last.created_at, last.id)
+    return response
+
+
+@user_bp.route('/<phone_number>/notifications/unread', methods=['GET'])
+def get_unread_count(phone_number):
+    """Unread notification count: a single primary key read, cheap to poll"""
+    return with_weak_etag(jsonify({'unread': NotificationService.unread_count(phone_number)}))
+
+
+@user_bp.route('/<phone_number>/notifications/read', methods=['POST'])
+def mark_notifications_read(phone_number):
+    """Mark notifications read: all of them, or only {"ids": [...]}"""
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return jsonify(format_response('ids must be a list of notification ids')), 400
+    marked, unread = NotificationService.mark_read(phone_number, ids)
+    return jsonify({'marked': marked, 'unread': unread}), 200
 
 
 @user_bp.route('/requester/<phone_number>', methods=['GET'])
 def get_requester(phone_number):
     try:
-        from app.models import Notification, User
-        notification = Notification.query.filter_by(requested_phone=phone_number).order_by(Notification.created_at.desc()).first()
-        if notification:
-            user = User.query.filter_by(phone_number=notification.requester_phone).first()
-            if user:
-                return jsonify(format_response('Requester found', {
-                    'id': user.id,
-                    'phone_number': user.phone_number,
-                    'username': user.username,
-                    'age': user.age,
-                    'gender': user.gender,
-                    'county': user.county,
-                    'town': user.town,
-                    'education_level': user.education_level,
-                    'profession': user.profession,
-                    'marital_status': user.marital_status,
-                    'religion': user.religion,
-                    'ethnicity': user.ethnicity,
-                    'self_description': user.self_description,
-                    'registration_status': user.registration_status
-                })), 200
+        fields = parse_fields(request.args.get('fields'))
+        user = NotificationService.latest_requester(phone_number, user_options=user_load_options(fields))
+        if user:
+            return json_response(format_response('Requester found', serialize_user(user, fields)))
         return jsonify(format_response('No requester found')), 404
+    except BadRequest as e:
+        return jsonify(format_response(e.description)), 400
     except Exception as e:
-        return jsonify(format_response(str(e))), 500
\ No newline at end of file
+        return jsonify(format_response(str(e))), 500
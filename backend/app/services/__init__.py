@@ -1,4 +1,6 @@
 from .user_service import UserService
+from .notification_service import NotificationService
 from .match_service import MatchService
 from .message_service import MessageService
-from .sms_log_service import SMSLogService
\ No newline at end of file
+from .sms_log_service import SMSLogService
+from .sms_log_writer import SMSLogWriter, sms_log_writer
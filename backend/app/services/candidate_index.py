@@ -0,0 +1,159 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.user import User
+
+
+class CandidateIndex:
+    """
+    Process-local index of complete profiles for match search.
+
+    Profiles are bucketed by (gender, town); each bucket keeps parallel
+    age-sorted arrays of ages and user ids, so an age range is answered with
+    two binary searches. The index only narrows the candidate set: callers
+    still apply their exact filters to the returned ids, so a slightly stale
+    index can never return a wrong profile. Callers only send the ids to
+    the database while there are at most max_ids of them
+    (CANDIDATE_INDEX_MAX_IDS); a larger set is cheaper to find with the
+    ix_users_match_search index than to pass as bind parameters.
+
+    It is built when the app starts, updated through upsert() whenever a
+    profile is written in this process, and catches up with writes from
+    other processes every CANDIDATE_INDEX_REFRESH_SECONDS by re-reading
+    users whose updated_at moved past the last refresh.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.max_ids = 500
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._entries = {}
+        self._synced_at = None
+        self._checked_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('CANDIDATE_INDEX_ENABLED', True)
+        self.refresh_interval = app.config.get('CANDIDATE_INDEX_REFRESH_SECONDS', 30)
+        self.max_ids = app.config.get('CANDIDATE_INDEX_MAX_IDS', 500)
+        app.extensions['candidate_index'] = self
+
+    @staticmethod
+    def _key(gender, town):
+        return ((gender or '').lower(), town or '')
+
+    @staticmethod
+    def _is_complete(status):
+        return (status or '').lower() == 'complete'
+
+    def build(self):
+        """(Re)load every complete profile from the database"""
+        started = datetime.utcnow()
+        rows = db.session.query(
+            User.id, User.age, User.gender, User.town
+        ).filter(func.lower(User.registration_status) == 'complete').order_by(User.age, User.id)
+
+        buckets = {}
+        entries = {}
+        for user_id, age, gender, town in rows:
+            key = self._key(gender, town)
+            ages, ids = buckets.setdefault(key, (array('i'), array('i')))
+            ages.append(age)
+            ids.append(user_id)
+            entries[user_id] = (key, age)
+
+        with self._lock:
+            self._buckets = buckets
+            self._entries = entries
+            self._synced_at = started
+            self._checked_at = time.monotonic()
+
+    def upsert(self, user):
+        """Reflect a created or updated user in the index"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remove(user.id)
+            if self._is_complete(user.registration_status) and user.age is not None:
+                self._insert(user.id, user.age, self._key(user.gender, user.town))
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def _insert(self, user_id, age, key):
+        ages, ids = self._buckets.setdefault(key, (array('i'), array('i')))
+        position = bisect_right(ages, age)
+        ages.insert(position, age)
+        ids.insert(position, user_id)
+        self._entries[user_id] = (key, age)
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        key, age = entry
+        ages, ids = self._buckets[key]
+        for position in range(bisect_left(ages, age), bisect_right(ages, age)):
+            if ids[position] == user_id:
+                del ages[position]
+                del ids[position]
+                break
+        if not ages:
+            del self._buckets[key]
+
+    def refresh(self):
+        """Pick up profiles changed by other processes since the last sync"""
+        if self._synced_at is None:
+            self.build()
+            return
+        started = datetime.utcnow()
+        # Look back a little to cover clock skew between app and database
+        since = self._synced_at - timedelta(seconds=self.refresh_interval)
+        changed = db.session.query(
+            User.id, User.age, User.gender, User.town, User.registration_status
+        ).filter(User.updated_at >= since)
+        with self._lock:
+            for user_id, age, gender, town, status in changed:
+                self._remove(user_id)
+                if self._is_complete(status) and age is not None:
+                    self._insert(user_id, age, self._key(gender, town))
+            self._synced_at = started
+            self._checked_at = time.monotonic()
+
+    def candidate_ids(self, gender, town, age_min=None, age_max=None):
+        """
+        Ids of complete profiles with this gender and town whose age falls in
+        [age_min, age_max], in ascending age order.
+        """
+        if self._synced_at is None or time.monotonic() - self._checked_at > self.refresh_interval:
+            self.refresh()
+        with self._lock:
+            bucket = self._buckets.get(self._key(gender, town))
+            if bucket is None:
+                return []
+            ages, ids = bucket
+            start = bisect_left(ages, age_min) if age_min is not None else 0
+            end = bisect_right(ages, age_max) if age_max is not None else len(ages)
+            return ids[start:end].tolist()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'profiles': len(self._entries),
+                'buckets': len(self._buckets),
+                'synced_at': self._synced_at.isoformat() if self._synced_at else None,
+            }
+
+
+candidate_index = CandidateIndex()
@@ -0,0 +1,135 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import aliased
+
+from app.extensions import db
+from app.models import Match, Notification, User
+
+
+class ExclusionStore:
+    """
+    Per-user sets of profiles that match search should no longer offer.
+
+    A user's set holds everyone they already decided on (any row in matches
+    with them as user_id) or asked about (a notification they sent). Each
+    set is a sorted array('i') of user ids, 4 bytes per pair, so candidates
+    are filtered with a binary search each instead of an anti-join in SQL.
+
+    The store is built from the database on first use, updated through
+    add() when this process records a decision or notification, and picks
+    up pairs written by other processes every EXCLUSION_REFRESH_SECONDS.
+    Pairs are never removed, so the refresh only has to read new rows.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.refresh_interval = 30
+        self._lock = threading.Lock()
+        self._sets = {}
+        self._synced_at = None
+        self._checked_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EXCLUSION_STORE_ENABLED', True)
+        self.refresh_interval = app.config.get('EXCLUSION_REFRESH_SECONDS', 30)
+        app.extensions['exclusion_store'] = self
+
+    @staticmethod
+    def _pairs(since=None):
+        matches = db.session.query(Match.user_id, Match.matched_user_id)
+        requester, requested = aliased(User), aliased(User)
+        notifications = db.session.query(requester.id, requested.id).select_from(Notification).join(
+            requester, requester.phone_number == Notification.requester_phone
+        ).join(requested, requested.phone_number == Notification.requested_phone)
+        if since is not None:
+            matches = matches.filter(Match.match_date >= since)
+            notifications = notifications.filter(Notification.created_at >= since)
+        yield from matches
+        yield from notifications
+
+    def build(self):
+        """(Re)load every decided or notified pair from the database"""
+        started = datetime.utcnow()
+        grouped = {}
+        for user_id, other_id in self._pairs():
+            grouped.setdefault(user_id, set()).add(other_id)
+        sets = {user_id: array('i', sorted(others)) for user_id, others in grouped.items()}
+        with self._lock:
+            self._sets = sets
+            self._synced_at = started
+            self._checked_at = time.monotonic()
+
+    def refresh(self):
+        """Pick up pairs recorded by other processes since the last sync"""
+        if self._synced_at is None:
+            self.build()
+            return
+        started = datetime.utcnow()
+        # Look back a little to cover clock skew between app and database
+        since = self._synced_at - timedelta(seconds=self.refresh_interval)
+        self.add_many(list(self._pairs(since)))
+        with self._lock:
+            self._synced_at = started
+            self._checked_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._synced_at is None or time.monotonic() - self._checked_at > self.refresh_interval:
+            self.refresh()
+
+    def add(self, user_id, other_id):
+        self.add_many([(user_id, other_id)])
+
+    def add_many(self, pairs):
+        """Exclude other_id from user_id's results for every (user_id, other_id)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for user_id, other_id in pairs:
+                excluded = self._sets.get(user_id)
+                if excluded is None:
+                    self._sets[user_id] = array('i', [other_id])
+                    continue
+                position = bisect_left(excluded, other_id)
+                if position == len(excluded) or excluded[position] != other_id:
+                    excluded.insert(position, other_id)
+
+    def excluded(self, user_id):
+        """Sorted copy of the ids excluded for user_id"""
+        if not self.enabled:
+            return array('i')
+        self._ensure_fresh()
+        with self._lock:
+            return array('i', self._sets.get(user_id, ()))
+
+    def filter(self, user_id, candidate_ids):
+        """candidate_ids without the ones excluded for user_id, order kept"""
+        if not self.enabled:
+            return list(candidate_ids)
+        self._ensure_fresh()
+        with self._lock:
+            excluded = self._sets.get(user_id)
+            if not excluded:
+                return list(candidate_ids)
+            kept = []
+            for candidate_id in candidate_ids:
+                position = bisect_left(excluded, candidate_id)
+                if position == len(excluded) or excluded[position] != candidate_id:
+                    kept.append(candidate_id)
+            return kept
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._sets),
+                'pairs': sum(len(excluded) for excluded in self._sets.values()),
+                'synced_at': self._synced_at.isoformat() if self._synced_at else None,
+            }
+
+
+exclusion_store = ExclusionStore()
@@ -0,0 +1,284 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.user import User
+
+# Categorical profile fields scored by equality with the requester's value
+CATEGORICAL_FIELDS = ('county', 'town', 'religion', 'education_level', 'marital_status')
+
+# Weight names accepted in MATCH_SCORE_WEIGHTS
+WEIGHT_NAMES = ('county', 'town', 'religion', 'education', 'marital', 'age')
+_WEIGHT_FIELDS = {
+    'county': 'county', 'town': 'town', 'religion': 'religion',
+    'education': 'education_level', 'marital': 'marital_status',
+}
+
+
+def parse_weights(raw):
+    """Parse "town=4,county=2,..." into {name: weight}; unknown names raise ValueError"""
+    weights = dict.fromkeys(WEIGHT_NAMES, 0.0)
+    for part in filter(None, (piece.strip() for piece in (raw or '').split(','))):
+        name, _, value = part.partition('=')
+        name = name.strip().lower()
+        if name not in weights:
+            raise ValueError(f'Unknown match score weight: {name}')
+        weights[name] = float(value)
+    return weights
+
+
+# Ages index a per-request score table; out-of-range ages clip to its ends
+AGE_TABLE_SIZE = 128
+
+
+def top_k(scores, k):
+    """
+    Indices of the k highest finite scores, best first, ties by lower index.
+
+    A full argpartition over a large array with many tied scores is slow, so
+    the k-th best of every 64th score is used as a cutoff first: at least k
+    scores are >= it, and only those are partitioned.
+    """
+    candidates = None
+    sample = scores[::64]
+    if len(sample) > k > 0:
+        cutoff = np.partition(sample, len(sample) - k)[len(sample) - k]
+        candidates = np.flatnonzero(scores >= cutoff)
+    values = scores if candidates is None else scores[candidates]
+    k = min(k, len(values))
+    if k <= 0:
+        return np.zeros(0, np.int64)
+    threshold = np.partition(values, len(values) - k)[len(values) - k]
+    if not np.isfinite(threshold):
+        above = np.flatnonzero(np.isfinite(values))
+        tied = np.zeros(0, np.int64)
+    else:
+        # Positions are in index order, so the first tied ones are the lowest
+        above = np.flatnonzero(values > threshold)
+        tied = np.flatnonzero(values == threshold)[:k - len(above)]
+    best = np.concatenate([above, tied])
+    if candidates is not None:
+        best = candidates[best]
+    return best[np.lexsort((best, -scores[best]))]
+
+
+def _gender_code(gender):
+    # Profiles store 'M'/'F' from SMS and 'male'/'female' from the API
+    initial = (gender or '').strip()[:1].lower()
+    return {'m': 1, 'f': 2}.get(initial, 0)
+
+
+class MatchScorer:
+    """
+    Column store of complete profiles for ranking match candidates.
+
+    Every profile is a row across parallel NumPy arrays: ids (kept sorted so
+    a row is found with searchsorted), ages, a gender code and one int32
+    code per categorical field, with 0 meaning unknown. Scoring a requester
+    is a single vectorized pass over all rows:
+
+        score = sum(weight[f] * (code[f] == requester code[f]))
+              + weight['age'] * max(0, 1 - |age - requester age| / age span)
+
+    restricted to active profiles of the other gender (and an optional age
+    range), and the top k are picked with a partial sort (see top_k).
+
+    Writes in this process go through upsert(): existing rows are updated
+    in place, new ones are buffered and merged on the next score. Like the
+    candidate index, changes from other processes are picked up every
+    MATCH_SCORE_REFRESH_SECONDS by re-reading users whose updated_at moved.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.weights = parse_weights('town=4,county=2,religion=2,education=1,marital=1,age=3')
+        self.age_span = 10
+        self.refresh_interval = 30
+        self._lock = threading.RLock()
+        self._vocab = {field: {} for field in CATEGORICAL_FIELDS}
+        self._columns = self._empty_columns()
+        self._pending = {}
+        self._synced_at = None
+        self._checked_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('MATCH_SCORING_ENABLED', True)
+        self.weights = parse_weights(app.config.get('MATCH_SCORE_WEIGHTS', ''))
+        self.age_span = app.config.get('MATCH_SCORE_AGE_SPAN', 10)
+        self.refresh_interval = app.config.get('MATCH_SCORE_REFRESH_SECONDS', 30)
+        app.extensions['match_scorer'] = self
+
+    @staticmethod
+    def _empty_columns(size=0):
+        columns = {
+            'id': np.zeros(size, np.int64),
+            'age': np.zeros(size, np.int16),
+            'gender': np.zeros(size, np.int8),
+            'active': np.zeros(size, np.bool_),
+        }
+        for field in CATEGORICAL_FIELDS:
+            columns[field] = np.zeros(size, np.int32)
+        return columns
+
+    def _code(self, field, value, add=True):
+        value = (value or '').strip().lower()
+        if not value:
+            return 0
+        vocab = self._vocab[field]
+        code = vocab.get(value)
+        if code is None and add:
+            code = vocab[value] = len(vocab) + 1
+        return code or 0
+
+    def _encode(self, profile):
+        """Column values for one profile (any object with the User attributes)"""
+        row = {
+            'id': profile.id,
+            'age': profile.age or 0,
+            'gender': _gender_code(profile.gender),
+            'active': (profile.registration_status or '').lower() == 'complete' and profile.age is not None,
+        }
+        for field in CATEGORICAL_FIELDS:
+            row[field] = self._code(field, getattr(profile, field))
+        return row
+
+    def load(self, profiles):
+        """Replace all rows with the given profiles"""
+        with self._lock:
+            self._vocab = {field: {} for field in CATEGORICAL_FIELDS}
+            rows = [self._encode(profile) for profile in profiles]
+            columns = self._empty_columns()
+            for name, column in columns.items():
+                columns[name] = np.fromiter((row[name] for row in rows), dtype=column.dtype, count=len(rows))
+            order = np.argsort(columns['id'], kind='stable')
+            self._columns = {name: column[order] for name, column in columns.items()}
+            self._pending = {}
+
+    def build(self):
+        """(Re)load every complete profile from the database"""
+        started = datetime.utcnow()
+        self.load(self._profile_query().filter(func.lower(User.registration_status) == 'complete'))
+        self._synced_at = started
+        self._checked_at = time.monotonic()
+
+    @staticmethod
+    def _profile_query():
+        return db.session.query(
+            User.id, User.age, User.gender, User.registration_status, *(getattr(User, f) for f in CATEGORICAL_FIELDS)
+        )
+
+    def upsert(self, profile):
+        """Reflect a created or updated profile in the column store"""
+        if not self.enabled:
+            return
+        with self._lock:
+            row = self._encode(profile)
+            ids = self._columns['id']
+            position = int(np.searchsorted(ids, row['id']))
+            if position < len(ids) and ids[position] == row['id']:
+                for name, value in row.items():
+                    self._columns[name][position] = value
+            else:
+                self._pending[row['id']] = row
+
+    def _merge_pending(self):
+        # New profiles are appended in bulk, keeping ids sorted
+        with self._lock:
+            if not self._pending:
+                return self._columns
+            rows = list(self._pending.values())
+            self._pending = {}
+            merged = {}
+            for name, column in self._columns.items():
+                added = np.fromiter((row[name] for row in rows), dtype=column.dtype, count=len(rows))
+                merged[name] = np.concatenate([column, added])
+            order = np.argsort(merged['id'], kind='stable')
+            self._columns = {name: column[order] for name, column in merged.items()}
+            return self._columns
+
+    def refresh(self):
+        """Pick up profiles changed by other processes since the last sync"""
+        if self._synced_at is None:
+            self.build()
+            return
+        started = datetime.utcnow()
+        since = self._synced_at - timedelta(seconds=self.refresh_interval)
+        for profile in self._profile_query().filter(User.updated_at >= since):
+            self.upsert(profile)
+        self._synced_at = started
+        self._checked_at = time.monotonic()
+
+    def score(self, requester, age_min=None, age_max=None, columns=None):
+        """
+        Scores of every row for requester (float32, -inf where not eligible),
+        along with the columns they were computed on.
+        """
+        columns = columns if columns is not None else self._merge_pending()
+        weights = self.weights
+
+        # The age term (and the age range) is a lookup table indexed by age,
+        # so the whole column is scored with one gather
+        ages = np.arange(AGE_TABLE_SIZE, dtype=np.float32)
+        if weights['age'] and requester.age is not None:
+            table = np.clip(1 - np.abs(ages - requester.age) / np.float32(self.age_span), 0, None)
+            table *= np.float32(weights['age'])
+        else:
+            table = np.zeros_like(ages)
+        if age_min is not None:
+            table[:max(age_min, 0)] = -np.inf
+        if age_max is not None:
+            table[max(age_max + 1, 0):] = -np.inf
+        scores = np.take(table, columns['age'], mode='clip')
+
+        for name, field in _WEIGHT_FIELDS.items():
+            code = self._code(field, getattr(requester, field, None), add=False)
+            if weights[name] and code:
+                scores += np.float32(weights[name]) * (columns[field] == code)
+
+        eligible = columns['active'] & (columns['id'] != requester.id)
+        gender = _gender_code(requester.gender)
+        if gender:
+            eligible &= columns['gender'] == 3 - gender
+        return np.where(eligible, scores, np.float32(-np.inf)), columns
+
+    def top_matches(self, requester, k=3, age_min=None, age_max=None, exclude=None):
+        """
+        The k best candidates for requester as [(user_id, score)], best first
+        (ties broken by lower id). exclude is an optional sorted int array of
+        user ids never to return.
+        """
+        if not self.enabled:
+            return []
+        if self._synced_at is None or time.monotonic() - self._checked_at > self.refresh_interval:
+            self.refresh()
+
+        scores, columns = self.score(requester, age_min, age_max)
+        if exclude is not None and len(exclude):
+            # The id column is sorted: find the excluded rows in O(k log n), not a full pass
+            ids, exclude = columns['id'], np.asarray(exclude)
+            positions = np.searchsorted(ids, exclude)
+            found = positions < len(ids)
+            positions = positions[found]
+            scores[positions[ids[positions] == exclude[found]]] = -np.inf
+        best = top_k(scores, k)
+        return [(int(columns['id'][i]), round(float(scores[i]), 3)) for i in best]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'profiles': int(self._columns['active'].sum()) + len(self._pending),
+                'rows': len(self._columns['id']),
+                'pending': len(self._pending),
+                'vocabulary': {field: len(vocab) for field, vocab in self._vocab.items()},
+                'weights': self.weights,
+                'synced_at': self._synced_at.isoformat() if self._synced_at else None,
+            }
+
+
+match_scorer = MatchScorer()
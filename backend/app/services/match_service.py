@@ -1,14 +1,95 @@
 from app.models import Match
 from app.extensions import db
+from app.services.exclusion_store import exclusion_store
+from app.services.match_scorer import match_scorer
+from app.utils.sql import keyset_after, keyset_order, upsert_insert
 
 class MatchService:
+    @staticmethod
+    def top_matches(requester, k=3, age_min=None, age_max=None):
+        """
+        Best-scoring candidates for a requester profile as [(user_id, score)],
+        leaving out profiles the requester already decided on or asked about
+        """
+        return match_scorer.top_matches(
+            requester, k=k, age_min=age_min, age_max=age_max, exclude=exclusion_store.excluded(requester.id)
+        )
+
     @staticmethod
     def create_match(user_id, matched_user_id):
         new_match = Match(user_id=user_id, matched_user_id=matched_user_id)
         db.session.add(new_match)
         db.session.commit()
+        exclusion_store.add(user_id, matched_user_id)
         return new_match
 
     @staticmethod
-    def get_matches(user_id):
-        return Match.query.filter((Match.user_id == user_id) | (Match.matched_user_id == user_id)).all()
\ No newline at end of file
+    def request_match(user_id, matched_user_id):
+        """
+        Record a pending match request, leaving any existing decision on the
+        pair untouched; returns the new match id, or None if the pair exists
+        """
+        statement = upsert_insert(Match).values(
+            user_id=user_id, matched_user_id=matched_user_id, status='pending'
+        ).on_conflict_do_nothing(index_elements=['user_id', 'matched_user_id']).returning(Match.id)
+        match_id = db.session.execute(statement).scalar()
+        db.session.commit()
+        if match_id is not None:
+            exclusion_store.add(user_id, matched_user_id)
+        return match_id
+
+    @staticmethod
+    def set_statuses(decisions):
+        """
+        Record match decisions in one INSERT ... ON CONFLICT (user_id,
+        matched_user_id) DO UPDATE statement and commit.
+
+        decisions is an iterable of (user_id, matched_user_id, status). If a
+        pair appears more than once the last status wins. Returns
+        {(user_id, matched_user_id): match_id}.
+        """
+        latest = {(user_id, matched_user_id): status for user_id, matched_user_id, status in decisions}
+        if not latest:
+            return {}
+        statement = upsert_insert(Match)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'matched_user_id'],
+            set_={'status': statement.excluded.status}
+        ).returning(Match.id, Match.user_id, Match.matched_user_id)
+        rows = db.session.execute(statement, [
+            {'user_id': user_id, 'matched_user_id': matched_user_id, 'status': status}
+            for (user_id, matched_user_id), status in latest.items()
+        ]).all()
+        db.session.commit()
+        exclusion_store.add_many(latest)
+        return {(row.user_id, row.matched_user_id): row.id for row in rows}
+
+    @staticmethod
+    def set_status(user_id, matched_user_id, status):
+        """Create or update a single match decision; returns the match id"""
+        return MatchService.set_statuses([(user_id, matched_user_id, status)])[(user_id, matched_user_id)]
+
+    @staticmethod
+    def matches_query(user_id, after=None):
+        """
+        Matches involving user_id in (match_date, id) order.
+
+        after is a (match_date, id) keyset cursor; only matches sorting after
+        it are returned. Matches without match_date come last.
+        """
+        query = Match.query.filter((Match.user_id == user_id) | (Match.matched_user_id == user_id))
+        if after is not None:
+            query = query.filter(keyset_after(Match.match_date, Match.id, after))
+        return query.order_by(*keyset_order(Match.match_date, Match.id))
+
+    @staticmethod
+    def get_matches(user_id, limit=None, after=None):
+        query = MatchService.matches_query(user_id, after)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def iter_matches(user_id, after=None, chunk_size=500):
+        """Yield matches from a server-side cursor, chunk_size rows at a time"""
+        return MatchService.matches_query(user_id, after).yield_per(chunk_size)
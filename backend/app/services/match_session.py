@@ -0,0 +1,89 @@
+import secrets
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, update
+
+from app.extensions import db
+from app.models.match_session import MatchSession
+
+# Bytes per packed candidate id
+_ID_SIZE = array('i').itemsize
+
+
+class MatchSessionStore:
+    """
+    Server-side cursors over match search results.
+
+    A session holds only the ordered candidate ids of one search plus a read
+    position, so clients page through results without the full profile list
+    ever being serialized. Sessions are rows of match_sessions, so a page can
+    be served by any worker process, not just the one that ran the search.
+    Each page is one UPDATE ... RETURNING that advances the position and
+    returns just that page's slice of the packed ids, so concurrent reads of
+    one session never get the same page. Sessions expire
+    MATCH_SESSION_TTL_SECONDS after their last use; expired rows are
+    deleted a few times per TTL.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 900
+        self._pruned_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('MATCH_SESSION_TTL_SECONDS', 900)
+        app.extensions['match_sessions'] = self
+
+    def create(self, candidate_ids):
+        """Store an ordered list of candidate ids and return the new session id"""
+        session_id = secrets.token_urlsafe(12)
+        ids = array('i', candidate_ids)
+        self._prune()
+        with db.engine.begin() as connection:
+            connection.execute(insert(MatchSession).values(
+                session_id=session_id,
+                candidate_ids=ids.tobytes(),
+                total=len(ids),
+                position=0,
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+            ))
+        return session_id
+
+    def next_page(self, session_id, size):
+        """
+        Advance a session by up to size ids.
+
+        Returns (ids, total, remaining), or None if the session is unknown
+        or has expired.
+        """
+        now = datetime.utcnow()
+        table = MatchSession.__table__
+        # position may run past total; the page is clamped below. RETURNING
+        # sees the advanced position, so the page starts size ids before it.
+        page = func.substr(table.c.candidate_ids, (table.c.position - size) * _ID_SIZE + 1, size * _ID_SIZE)
+        with db.engine.begin() as connection:
+            row = connection.execute(
+                update(table)
+                .where(table.c.session_id == session_id, table.c.expires_at >= now)
+                .values(position=table.c.position + size, expires_at=now + timedelta(seconds=self.ttl))
+                .returning(page.label('page'), table.c.position, table.c.total)
+            ).first()
+        if row is None:
+            return None
+        ids = array('i')
+        ids.frombytes(bytes(row.page or b''))
+        return ids.tolist(), row.total, max(0, row.total - row.position)
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._pruned_at < self.ttl / 4:
+            return
+        self._pruned_at = now
+        with db.engine.begin() as connection:
+            connection.execute(delete(MatchSession).where(MatchSession.expires_at < datetime.utcnow()))
+
+
+match_sessions = MatchSessionStore()
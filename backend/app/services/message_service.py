@@ -1,5 +1,6 @@
 from app.models.message import Message
 from app.extensions import db
+from app.utils.sql import keyset_after, keyset_order
 
 class MessageService:
     @staticmethod
@@ -14,8 +15,29 @@ class MessageService:
         return new_message
 
     @staticmethod
-    def get_messages(phone_number):
-        return Message.query.filter(
+    def messages_query(phone_number, after=None):
+        """
+        Messages sent or received by phone_number in (sent_at, message_id) order.
+
+        after is a (sent_at, message_id) keyset cursor; only messages sorting
+        after it are returned. Messages without sent_at come last.
+        """
+        query = Message.query.filter(
             (Message.sender_phone == phone_number) |
             (Message.receiver_phone == phone_number)
-        ).all()
+        )
+        if after is not None:
+            query = query.filter(keyset_after(Message.sent_at, Message.message_id, after))
+        return query.order_by(*keyset_order(Message.sent_at, Message.message_id))
+
+    @staticmethod
+    def get_messages(phone_number, limit=None, after=None):
+        query = MessageService.messages_query(phone_number, after)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def iter_messages(phone_number, after=None, chunk_size=500):
+        """Yield messages from a server-side cursor, chunk_size rows at a time"""
+        return MessageService.messages_query(phone_number, after).yield_per(chunk_size)
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+from sqlalchemy import case, insert, update
+
+from app.extensions import db
+from app.models import Notification, NotificationCounter, User
+from app.services.exclusion_store import exclusion_store
+from app.services.user_service import UserService
+from app.utils.sql import keyset_after, keyset_order, upsert_insert
+
+
+class NotificationService:
+    """
+    "Someone is interested in you" notifications.
+
+    Each recipient has a row in notification_counters holding their unread
+    count. It is incremented in the same transaction that inserts
+    notifications and decremented by however many rows a mark-read actually
+    changed, so reading the count is a primary key lookup, never a COUNT.
+    """
+
+    @staticmethod
+    def notify_many(pairs):
+        """
+        Record a notification for every (requester_phone, requested_phone)
+        pair with one multi-row insert and one counter upsert. Returns the
+        number of notifications created.
+        """
+        pairs = [(requester, requested) for requester, requested in pairs if requester and requested]
+        if not pairs:
+            return 0
+        now = datetime.utcnow()
+        db.session.execute(insert(Notification), [
+            {'requester_phone': requester, 'requested_phone': requested, 'created_at': now}
+            for requester, requested in pairs
+        ])
+
+        added = {}
+        for _, requested in pairs:
+            added[requested] = added.get(requested, 0) + 1
+        # Sorted so concurrent fan-outs lock counter rows in the same order
+        statement = upsert_insert(NotificationCounter).values(
+            [{'phone_number': phone, 'unread': count} for phone, count in sorted(added.items())]
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['phone_number'],
+            set_={'unread': NotificationCounter.unread + statement.excluded.unread}
+        ))
+        db.session.commit()
+
+        # Requesters have now seen these profiles; stop offering them in search
+        ids = UserService.ids_by_phone({phone for pair in pairs for phone in pair})
+        exclusion_store.add_many(
+            (ids[requester], ids[requested]) for requester, requested in pairs
+            if requester in ids and requested in ids
+        )
+        return len(pairs)
+
+    @staticmethod
+    def notify(requester_phone, requested_phone):
+        return NotificationService.notify_many([(requester_phone, requested_phone)])
+
+    @staticmethod
+    def inbox_query(phone_number, after=None, unread_only=False, user_options=None):
+        """
+        (Notification, requester User) rows for a recipient, newest first, in
+        a single joined query.
+
+        after is a (created_at, id) keyset cursor; only older notifications
+        are returned. Notifications without created_at come first.
+        """
+        query = db.session.query(Notification, User).join(
+            User, User.phone_number == Notification.requester_phone
+        ).filter(Notification.requested_phone == phone_number)
+        if user_options is not None:
+            query = query.options(user_options)
+        if unread_only:
+            query = query.filter(Notification.read_at.is_(None))
+        if after is not None:
+            query = query.filter(keyset_after(Notification.created_at, Notification.id, after, descending=True))
+        return query.order_by(*keyset_order(Notification.created_at, Notification.id, descending=True))
+
+    @staticmethod
+    def get_inbox(phone_number, limit=20, after=None, unread_only=False, user_options=None):
+        return NotificationService.inbox_query(phone_number, after, unread_only, user_options).limit(limit).all()
+
+    @staticmethod
+    def latest_requester(phone_number, user_options=None):
+        """The requester of the most recent notification, or None"""
+        row = NotificationService.inbox_query(phone_number, user_options=user_options).first()
+        return row[1] if row else None
+
+    @staticmethod
+    def unread_count(phone_number):
+        counter = db.session.get(NotificationCounter, phone_number)
+        return counter.unread if counter else 0
+
+    @staticmethod
+    def mark_read(phone_number, ids=None):
+        """
+        Mark a recipient's unread notifications (all, or only the given ids)
+        as read. Returns (marked, unread remaining).
+        """
+        statement = update(Notification).where(
+            Notification.requested_phone == phone_number,
+            Notification.read_at.is_(None),
+        ).values(read_at=datetime.utcnow())
+        if ids is not None:
+            statement = statement.where(Notification.id.in_(ids))
+        marked = db.session.execute(statement).rowcount
+        if marked:
+            db.session.execute(
+                update(NotificationCounter)
+                .where(NotificationCounter.phone_number == phone_number)
+                .values(unread=case((NotificationCounter.unread > marked, NotificationCounter.unread - marked), else_=0))
+            )
+        db.session.commit()
+        return marked, NotificationService.unread_count(phone_number)
@@ -0,0 +1,117 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify
+
+
+class SMSRateLimiter:
+    """
+    Admission control for the SMS ingress.
+
+    Each sender has a token bucket holding up to SMS_RATE_BURST tokens,
+    refilled at SMS_RATE_PER_MINUTE; every SMS takes one token. Buckets
+    are (tokens, timestamp) pairs in last-used order. A bucket idle long
+    enough to have refilled completely is the same as no bucket, so those
+    are dropped from the front, and at most SMS_RATE_MAX_SENDERS are kept.
+
+    Independently, at most SMS_MAX_CONCURRENCY requests per process run
+    their command at once; beyond that requests are shed immediately rather
+    than queueing on the database pool.
+    """
+
+    SENDER_REPLY = 'You are sending messages too fast. Please wait a minute and try again.'
+    BUSY_REPLY = 'Penzi is busy right now. Please try again in a few minutes.'
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.rate = 20 / 60.0
+        self.burst = 10
+        self.max_senders = 100000
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots = None
+        self._counters = {'admitted': 0, 'sender_limited': 0, 'shed': 0, 'evicted': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SMS_RATE_LIMIT_ENABLED', True)
+        self.rate = app.config.get('SMS_RATE_PER_MINUTE', 20) / 60.0
+        self.burst = app.config.get('SMS_RATE_BURST', 10)
+        self.max_senders = app.config.get('SMS_RATE_MAX_SENDERS', 100000)
+        concurrency = app.config.get('SMS_MAX_CONCURRENCY', 32)
+        self._slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self._buckets.clear()
+        app.extensions['sms_rate_limiter'] = self
+
+    def take(self, sender_phone):
+        """
+        Take a token from the sender's bucket.
+
+        Returns 0 if the SMS may proceed, otherwise the seconds until the
+        next token is available.
+        """
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            tokens, stamp = self._buckets.pop(sender_phone, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            if tokens >= 1:
+                self._buckets[sender_phone] = (tokens - 1, now)
+                self._counters['admitted'] += 1
+                wait = 0
+            else:
+                self._buckets[sender_phone] = (tokens, now)
+                self._counters['sender_limited'] += 1
+                wait = (1 - tokens) / self.rate
+            while len(self._buckets) > self.max_senders:
+                self._buckets.popitem(last=False)
+                self._counters['evicted'] += 1
+        return wait
+
+    def _expire(self, now):
+        # Oldest-used first; anything idle for a full refill is back at burst
+        idle = self.burst / self.rate
+        while self._buckets:
+            sender_phone, (_, stamp) = next(iter(self._buckets.items()))
+            if now - stamp < idle:
+                break
+            del self._buckets[sender_phone]
+
+    def acquire(self):
+        """Take a concurrency slot without waiting; False if the ingress is full"""
+        if not self.enabled or self._slots is None:
+            return True
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            self._counters['shed'] += 1
+        return False
+
+    def release(self):
+        if self.enabled and self._slots is not None:
+            self._slots.release()
+
+    def sender_limited_reply(self, wait):
+        return self._reply(self.SENDER_REPLY, 'Rate limit exceeded', wait)
+
+    def busy_reply(self):
+        return self._reply(self.BUSY_REPLY, 'Server busy', 1)
+
+    def _reply(self, message, error, wait):
+        response = jsonify({'error': error, 'message': message})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+        return response
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, enabled=self.enabled, senders=len(self._buckets),
+                        per_minute=round(self.rate * 60, 3), burst=self.burst)
+
+
+sms_rate_limiter = SMSRateLimiter()
@@ -0,0 +1,209 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import Response
+from sqlalchemy import delete, select, update
+
+from app.extensions import db
+from app.models.sms_receipt import SMSReceipt
+from app.utils.sql import upsert_insert
+
+
+class SMSDedup:
+    """
+    Idempotent SMS receipt for webhook retries.
+
+    An SMS is keyed on the provider's message id. Deliveries without one
+    (the common case for our aggregators) are keyed on a hash of (sender,
+    content, time bucket of SMS_DEDUP_WINDOW_SECONDS) while
+    SMS_DEDUP_CONTENT_FALLBACK is on, the default; that treats a user
+    repeating a command within a bucket as a retry, and misses retries that
+    straddle two buckets. With it off, only deliveries carrying an id are
+    deduplicated. The first delivery claims the key by inserting it into
+    sms_receipts (unique index, so concurrent deliveries in other workers
+    lose the race cleanly), runs the command and records the response.
+    Later deliveries of the same key get that response back without the SMS
+    being logged or the command handlers running.
+
+    A delivery arriving while the first is still running gets a 503 with
+    Retry-After, never a success, so the gateway retries it in case the
+    first attempt fails. A claim is a lease of SMS_DEDUP_LEASE_SECONDS: one
+    left unfinished by a crashed or stalled worker is taken over by the
+    next delivery, and the stale owner can no longer record or release it.
+
+    Recorded responses are also kept in a bounded in-process LRU
+    (SMS_DEDUP_SIZE entries), so most retries never reach the database.
+    A 5xx response, or an exception before a response exists, releases the
+    claim, letting the retry do the work.
+    """
+
+    REPLAY_HEADER = 'Idempotent-Replayed'
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.window = 300
+        self.maxsize = 10000
+        self.content_fallback = True
+        self.lease = 30
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Claim time of each key owned by this thread's request, which fences out a stale owner
+        self._local = threading.local()
+        self._pruned_at = 0.0
+        self._counters = {'claims': 0, 'taken_over': 0, 'memory_hits': 0, 'db_hits': 0, 'in_flight': 0,
+                          'released': 0, 'lease_lost': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SMS_DEDUP_ENABLED', True)
+        self.window = app.config.get('SMS_DEDUP_WINDOW_SECONDS', 300)
+        self.maxsize = app.config.get('SMS_DEDUP_SIZE', 10000)
+        self.content_fallback = app.config.get('SMS_DEDUP_CONTENT_FALLBACK', True)
+        self.lease = app.config.get('SMS_DEDUP_LEASE_SECONDS', 30)
+        self._entries.clear()
+        app.extensions['sms_dedup'] = self
+
+    def key(self, data, sender_phone, message):
+        """Idempotency key for a webhook payload, or None when it is not deduplicated"""
+        if not self.enabled:
+            return None
+        provider_id = data.get('message_id') or data.get('provider_message_id')
+        if provider_id:
+            raw = f'id\0{provider_id}'
+        elif self.content_fallback:
+            raw = f'sms\0{sender_phone}\0{message}\0{int(time.time() // self.window)}'
+        else:
+            return None
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def claim(self, key):
+        """
+        Claim key for processing.
+
+        Returns None if the caller now owns the key and should handle the
+        SMS, otherwise the response to send for the duplicate.
+        """
+        if key is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                status, body, expires_at = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return self._replay(status, body)
+                del self._entries[key]
+
+        self._prune(now)
+        claimed_at = datetime.utcnow()
+        statement = upsert_insert(SMSReceipt).values(
+            idempotency_key=key, received_at=claimed_at
+        ).on_conflict_do_nothing(index_elements=['idempotency_key']).returning(SMSReceipt.id)
+        taken_over, row = False, None
+        with db.engine.begin() as connection:
+            claimed = connection.execute(statement).first() is not None
+            if not claimed:
+                # Take over a claim whose owner has not finished within the lease
+                taken_over = claimed = connection.execute(
+                    update(SMSReceipt)
+                    .where(SMSReceipt.idempotency_key == key, SMSReceipt.status_code.is_(None),
+                           SMSReceipt.received_at < claimed_at - timedelta(seconds=self.lease))
+                    .values(received_at=claimed_at)
+                    .returning(SMSReceipt.id)
+                ).first() is not None
+            if not claimed:
+                row = connection.execute(
+                    select(SMSReceipt.status_code, SMSReceipt.response_body, SMSReceipt.received_at)
+                    .where(SMSReceipt.idempotency_key == key)
+                ).first()
+        if claimed:
+            self._claims()[key] = claimed_at
+            with self._lock:
+                self._counters['taken_over' if taken_over else 'claims'] += 1
+            return None
+
+        if row is None or row.status_code is None:
+            # The first delivery is still running (or just released its claim): retry once it is done
+            with self._lock:
+                self._counters['in_flight'] += 1
+            remaining = self.lease - (claimed_at - row.received_at).total_seconds() if row else 0
+            response = self._replay(503, '{"message": "Duplicate SMS is already being processed"}')
+            response.headers['Retry-After'] = str(max(1, math.ceil(remaining)))
+            return response
+        with self._lock:
+            self._counters['db_hits'] += 1
+        self._remember(key, row.status_code, row.response_body, now)
+        return self._replay(row.status_code, row.response_body)
+
+    def record(self, key, response):
+        """
+        Store the response for a claimed key; release the claim on a 5xx or
+        no response. Does nothing if the claim was taken over meanwhile.
+        """
+        if key is None:
+            return
+        owned = (SMSReceipt.idempotency_key == key, SMSReceipt.status_code.is_(None),
+                 SMSReceipt.received_at == self._claims().pop(key, None))
+        with db.engine.begin() as connection:
+            if response is None or response.status_code >= 500:
+                released = connection.execute(delete(SMSReceipt).where(*owned)).rowcount
+                with self._lock:
+                    self._counters['released' if released else 'lease_lost'] += 1
+                return
+            body = response.get_data(as_text=True)
+            stored = connection.execute(
+                update(SMSReceipt).where(*owned).values(status_code=response.status_code, response_body=body)
+            ).rowcount
+        if not stored:
+            with self._lock:
+                self._counters['lease_lost'] += 1
+            return
+        self._remember(key, response.status_code, body, time.monotonic())
+
+    def release(self, key):
+        """Give up a claimed key without handling the SMS, so its retry is handled afresh"""
+        self.record(key, None)
+
+    def _claims(self):
+        claims = getattr(self._local, 'claims', None)
+        if claims is None:
+            claims = self._local.claims = {}
+        return claims
+
+    def _remember(self, key, status, body, now):
+        with self._lock:
+            self._entries[key] = (status, body, now + self.window)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _replay(self, status, body):
+        response = Response(body, status=status, mimetype='application/json')
+        response.headers[self.REPLAY_HEADER] = 'true'
+        return response
+
+    def _prune(self, now):
+        # Receipts only matter within the window; drop older ones a few times per window
+        if now - self._pruned_at < self.window / 4:
+            return
+        self._pruned_at = now
+        cutoff = datetime.utcnow() - timedelta(seconds=self.window)
+        with db.engine.begin() as connection:
+            connection.execute(delete(SMSReceipt).where(SMSReceipt.received_at < cutoff))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, enabled=self.enabled, window_seconds=self.window,
+                        lease_seconds=self.lease, content_fallback=self.content_fallback,
+                        entries=len(self._entries), maxsize=self.maxsize)
+
+
+sms_dedup = SMSDedup()
@@ -0,0 +1,281 @@
+import atexit
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, func, insert, select, update
+
+from app.extensions import db
+from app.models.outbound_sms import OutboundSMS
+from app.services.sms_gateway import SMSGatewayClient, SMSGatewayError
+from app.services.sms_log_writer import sms_log_writer
+
+
+class SMSDispatcher:
+    """
+    Asynchronous outbound SMS delivery.
+
+    enqueue() inserts rows into the outbound_sms table in its own short
+    transaction, committed in the calling (request) thread so a queued reply
+    survives a crash, and wakes the workers; request threads never talk to
+    the gateway. A pool of
+    SMS_DISPATCH_WORKERS threads claims up to SMS_DISPATCH_BATCH_SIZE due
+    rows at a time (FOR UPDATE SKIP LOCKED on Postgres, so several
+    processes can dispatch side by side) and sends each batch in one
+    gateway call over a keep-alive session.
+
+    A failed message is retried after SMS_DISPATCH_BACKOFF_SECONDS * 2^n
+    (with jitter) until SMS_DISPATCH_MAX_ATTEMPTS attempts, then marked
+    failed. A row whose lease expired on its last attempt is marked failed
+    rather than claimed again. Every delivered message is recorded in sms_log as OUTGOING.
+
+    Workers start lazily in each process that enqueues when
+    SMS_DISPATCH_IN_PROCESS is set; otherwise run them with
+    `flask dispatch-sms`.
+    """
+
+    # How long a claimed row stays invisible to other workers
+    LEASE = timedelta(minutes=5)
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.gateway = None
+        self._threads = []
+        self._pid = None
+        self._registered = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'batches': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'gateway_errors': 0}
+        self._queue_counts = None
+        self._queue_counted_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SMS_DISPATCH_ENABLED', False)
+        self.in_process = app.config.get('SMS_DISPATCH_IN_PROCESS', True)
+        self.sender_id = app.config.get('SMS_SENDER_ID', 'PENZI')
+        self.workers = app.config.get('SMS_DISPATCH_WORKERS', 4)
+        self.batch_size = app.config.get('SMS_DISPATCH_BATCH_SIZE', 100)
+        self.poll_interval = app.config.get('SMS_DISPATCH_POLL_MS', 500) / 1000.0
+        self.max_attempts = app.config.get('SMS_DISPATCH_MAX_ATTEMPTS', 5)
+        self.backoff = app.config.get('SMS_DISPATCH_BACKOFF_SECONDS', 2.0)
+        self.stats_ttl = app.config.get('SMS_DISPATCH_STATS_TTL_SECONDS', 10)
+        self.gateway = SMSGatewayClient(
+            app.config.get('SMS_GATEWAY_URL', 'http://localhost:9090'),
+            api_key=app.config.get('SMS_GATEWAY_API_KEY'),
+            timeout=app.config.get('SMS_GATEWAY_TIMEOUT_SECONDS', 10.0),
+        )
+        app.extensions['sms_dispatcher'] = self
+        if not self._registered:
+            atexit.register(self.stop)
+            self._registered = True
+
+    def enqueue(self, to_number, message_content):
+        self.enqueue_many([(to_number, message_content)])
+
+    def enqueue_many(self, messages):
+        """Queue (to_number, message_content) pairs for delivery"""
+        if not self.enabled or not messages:
+            return
+        now = datetime.utcnow()
+        rows = [{
+            'from_number': self.sender_id,
+            'to_number': to_number,
+            'message_content': message_content,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+        } for to_number, message_content in messages]
+        # Own transaction: the queue row must not depend on the caller's commit
+        with db.engine.begin() as connection:
+            connection.execute(insert(OutboundSMS), rows)
+        with self._stats_lock:
+            self._stats['enqueued'] += len(rows)
+        if self.in_process:
+            self.start()
+        self._wake.set()
+
+    def start(self):
+        """Start the worker pool in this process (once per process)"""
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            # Threads do not survive fork; a child starts its own pool
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'sms-dispatch-{n}', daemon=True)
+                for n in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                sent = self.dispatch_once()
+            except Exception:
+                self.app.logger.exception('SMS dispatch failed')
+                sent = 0
+            if not sent:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        # Leases that expired on the last attempt would otherwise sit in sending forever
+        expired = update(OutboundSMS).where(
+            OutboundSMS.status == 'sending',
+            OutboundSMS.next_attempt_at <= now,
+            OutboundSMS.attempts >= self.max_attempts,
+        ).values(status='failed', last_error='Lease expired on the last attempt')
+        due = select(OutboundSMS.id).where(
+            OutboundSMS.status.in_(('pending', 'sending')),
+            OutboundSMS.next_attempt_at <= now,
+            OutboundSMS.attempts < self.max_attempts,
+        ).order_by(OutboundSMS.id).limit(self.batch_size).with_for_update(skip_locked=True)
+        statement = update(OutboundSMS).where(OutboundSMS.id.in_(due.scalar_subquery())).values(
+            status='sending', attempts=OutboundSMS.attempts + 1, next_attempt_at=now + self.LEASE,
+        ).returning(OutboundSMS.id, OutboundSMS.from_number, OutboundSMS.to_number,
+                    OutboundSMS.message_content, OutboundSMS.attempts)
+        with self.app.app_context(), db.engine.begin() as connection:
+            failed = connection.execute(expired).rowcount
+            claimed = connection.execute(statement).all()
+        if failed:
+            with self._stats_lock:
+                self._stats['failed'] += failed
+        return claimed
+
+    def dispatch_once(self):
+        """Claim one batch of due messages and send it; returns how many were claimed"""
+        claimed = self._claim()
+        if not claimed:
+            return 0
+
+        messages = [{'id': row.id, 'from': row.from_number, 'to': row.to_number, 'text': row.message_content}
+                    for row in claimed]
+        try:
+            outcomes = self.gateway.send_batch(messages)
+        except SMSGatewayError as e:
+            with self._stats_lock:
+                self._stats['gateway_errors'] += 1
+            outcomes = {row.id: (False, None, str(e)) for row in claimed}
+
+        self._record(claimed, outcomes)
+        return len(claimed)
+
+    def _record(self, claimed, outcomes):
+        now = datetime.utcnow()
+        delivered, retries, failures, log_rows = [], [], [], []
+        for row in claimed:
+            sent, provider_message_id, error = outcomes[row.id]
+            if sent:
+                delivered.append({'row_id': row.id, 'provider_message_id': provider_message_id, 'sent_at': now})
+                log_rows.append(sms_log_writer.row(row.from_number, row.to_number, 'OUTGOING', row.message_content))
+            elif row.attempts >= self.max_attempts:
+                failures.append({'row_id': row.id, 'last_error': error})
+            else:
+                delay = self.backoff * 2 ** (row.attempts - 1) * random.uniform(0.8, 1.2)
+                retries.append({'row_id': row.id, 'last_error': error,
+                                'next_attempt_at': now + timedelta(seconds=delay)})
+
+        row_id = OutboundSMS.id == bindparam('row_id')
+        with self.app.app_context(), db.engine.begin() as connection:
+            if delivered:
+                connection.execute(update(OutboundSMS).where(row_id).values(
+                    status='sent', provider_message_id=bindparam('provider_message_id'),
+                    sent_at=bindparam('sent_at'), last_error=None,
+                ), delivered)
+            if retries:
+                connection.execute(update(OutboundSMS).where(row_id).values(
+                    status='pending', last_error=bindparam('last_error'),
+                    next_attempt_at=bindparam('next_attempt_at'),
+                ), retries)
+            if failures:
+                connection.execute(update(OutboundSMS).where(row_id).values(
+                    status='failed', last_error=bindparam('last_error'),
+                ), failures)
+        sms_log_writer.write(log_rows)
+
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['sent'] += len(delivered)
+            self._stats['retried'] += len(retries)
+            self._stats['failed'] += len(failures)
+
+    def drain(self):
+        """Send everything currently due from the calling thread"""
+        while self.dispatch_once():
+            pass
+
+    def stop(self, timeout=5.0):
+        """Stop this process's workers"""
+        self._stopping.set()
+        self._wake.set()
+        if self._pid == os.getpid():
+            for thread in self._threads:
+                thread.join(timeout)
+        self._threads = []
+        if self.gateway is not None:
+            self.gateway.close()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        stats['workers'] = len(self._threads) if self._pid == os.getpid() else 0
+        if self.enabled:
+            stats['queue'] = self._queue_depth()
+        return stats
+
+    def _queue_depth(self):
+        """
+        Rows waiting or in flight, by status. Only the active statuses are
+        counted (through ix_outbound_sms_due), and the result is cached for
+        SMS_DISPATCH_STATS_TTL_SECONDS; sent and failed totals are the
+        counters above.
+        """
+        now = time.monotonic()
+        if self._queue_counts is None or now - self._queue_counted_at >= self.stats_ttl:
+            with self.app.app_context(), db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(OutboundSMS.status, func.count())
+                    .where(OutboundSMS.status.in_(('pending', 'sending')))
+                    .group_by(OutboundSMS.status)
+                ).all()
+            self._queue_counts = dict({'pending': 0, 'sending': 0}, **dict(rows))
+            self._queue_counted_at = now
+        return dict(self._queue_counts)
+
+
+sms_dispatcher = SMSDispatcher()
+
+
+@click.command('dispatch-sms')
+@click.option('--once', is_flag=True, help='Send what is due now and exit.')
+@with_appcontext
+def dispatch_sms_command(once):
+    """Run the outbound SMS workers in the foreground."""
+    if once:
+        sms_dispatcher.drain()
+        click.echo(f"Sent {sms_dispatcher.stats()['sent']} SMS.")
+        return
+    sms_dispatcher.start()
+    click.echo(f'Dispatching outbound SMS with {sms_dispatcher.workers} worker(s); Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sms_dispatcher.stop()
@@ -0,0 +1,82 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SMSGatewayError(Exception):
+    """The gateway could not be reached or rejected the whole batch"""
+
+
+class SMSGatewayClient:
+    """
+    HTTP client for the SMS provider's batch send API.
+
+    POST {SMS_GATEWAY_URL}/send with
+        {"messages": [{"id": ..., "from": ..., "to": ..., "text": ...}]}
+    answers
+        {"results": [{"id": ..., "status": "sent" | "failed",
+                      "provider_message_id": ..., "error": ...}]}
+
+    Each thread keeps its own requests.Session, so connections stay alive
+    between batches without sessions being shared across threads. close()
+    closes every thread's session.
+    """
+
+    def __init__(self, url, api_key=None, timeout=10.0, pool_size=4):
+        self.url = url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        # Bumped by close() so threads drop their closed sessions
+        self._generation = 0
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None or self._local.generation != self._generation:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if self.api_key:
+                session.headers['Authorization'] = f'Bearer {self.api_key}'
+            with self._sessions_lock:
+                self._sessions.append(session)
+                self._local.generation = self._generation
+            self._local.session = session
+        return session
+
+    def send_batch(self, messages):
+        """
+        Send [{"id", "from", "to", "text"}] in one call.
+
+        Returns {id: (sent, provider_message_id, error)}; messages missing
+        from the answer count as failed. Raises SMSGatewayError if the call
+        itself fails.
+        """
+        try:
+            response = self._session().post(f'{self.url}/send', json={'messages': messages}, timeout=self.timeout)
+            response.raise_for_status()
+            results = response.json()['results']
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            raise SMSGatewayError(str(e)) from e
+
+        outcomes = {
+            result.get('id'): (result.get('status') == 'sent', result.get('provider_message_id'), result.get('error'))
+            for result in results if isinstance(result, dict)
+        }
+        return {
+            message['id']: outcomes.get(message['id'], (False, None, 'Missing from gateway response'))
+            for message in messages
+        }
+
+    def close(self):
+        """Close the sessions of all threads; a thread sending afterwards opens a new one"""
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+            self._generation += 1
+        for session in sessions:
+            session.close()
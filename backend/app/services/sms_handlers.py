@@ -1,41 +1,116 @@
-from flask import jsonify
+from flask import current_app, jsonify
 
-from app.models.user import User
-from app.extensions import db
+from app.services.match_service import MatchService
+from app.services.notification_service import NotificationService
+from app.services.user_service import UserService
 
 
 def handle_register(parsed):
-    params = parsed.parameters
-    phone = parsed.sender_phone
-
-    existing_user = User.query.filter_by(phone_number=phone).first()
-    if existing_user:
+    # ON CONFLICT DO NOTHING: nothing returned means the phone is already registered
+    created = UserService.insert_users([_registration_row(parsed)])
+    if not created:
         return jsonify({"message": "Phone number already registered."}), 409
 
-    new_user = User(
-        phone_number=phone,
+    return jsonify({"message": "User registered successfully."}), 201
+
+
+def _registration_row(parsed):
+    params = parsed.parameters
+    return dict(
+        phone_number=parsed.sender_phone,
         username=params.get("name", "Anonymous"),
         age=params.get("age"),
         gender=params.get("gender"),
         county=params.get("county"),
         town=params.get("town")
     )
-    db.session.add(new_user)
-    db.session.commit()
-
-    return jsonify({"message": "User registered successfully."}), 201
 
 
 def handle_match_request(parsed):
-    # This is just a stub
+    requester = UserService.find_user(phone_number=parsed.sender_phone)
+    if not requester:
+        return jsonify({"message": "You are not registered. Send REG NAME: ..., AGE: ... to register."}), 404
+
+    target_id = parsed.parameters.get("target_user_id")
+    if target_id is not None:
+        return _request_match(requester, target_id)
+
+    ranked = MatchService.top_matches(requester, k=current_app.config['MATCH_TOP_K'])
+    matches = []
+    for user_id, score in ranked:
+        user = UserService.find_user(user_id=user_id)
+        if user:
+            matches.append({"username": user.username, "age": user.age, "town": user.town,
+                            "phone_number": user.phone_number, "score": score})
+
     return jsonify({
-        "message": "Match request received.",
-        "params": parsed.parameters
+        "message": f"We have {len(matches)} match(es) for you." if matches else "No matches found yet. Try again later.",
+        "matches": matches
     }), 200
 
 
+def _request_match(requester, target_id):
+    """MATCH <id>: ask user target_id for a match and notify them"""
+    target = UserService.find_user(user_id=target_id)
+    if not target or target.id == requester.id:
+        return jsonify({"message": f"User {target_id} not found."}), 404
+
+    match_id = MatchService.request_match(requester.id, target.id)
+    if match_id is None:
+        return jsonify({"message": f"You have already requested a match with {target.username}."}), 409
+
+    NotificationService.notify(requester.phone_number, target.phone_number)
+    return jsonify({"message": f"Match request sent to {target.username}.", "match_id": match_id}), 201
+
+
 def handle_message(parsed):
     return jsonify({
         "message": "Message command handled (to be implemented).",
         "params": parsed.parameters
     }), 200
+
+
+REQUIRED_REGISTRATION_FIELDS = ["age", "gender", "county", "town"]
+
+
+def handle_register_batch(parsed_commands):
+    """
+    Register many senders at once.
+
+    All new users go into a single INSERT ... ON CONFLICT DO NOTHING
+    RETURNING statement; senders whose phone comes back are registered,
+    the rest already existed. Returns a (body, status) pair per command, in
+    the order given.
+    """
+    results = [None] * len(parsed_commands)
+    rows = []
+    pending = {}
+    for position, parsed in enumerate(parsed_commands):
+        params = parsed.parameters
+        phone = parsed.sender_phone
+
+        missing = [field for field in REQUIRED_REGISTRATION_FIELDS if not params.get(field)]
+        if missing:
+            results[position] = ({
+                "error": "Error processing SMS command",
+                "details": f"Missing registration fields: {', '.join(missing)}",
+                "parsed_command": parsed.command,
+                "parameters": params
+            }, 400)
+            continue
+
+        # Only the first registration for a phone in the batch can succeed
+        if phone not in pending:
+            pending[phone] = position
+            rows.append(_registration_row(parsed))
+
+    created = {user.phone_number for user in UserService.insert_users(rows)}
+    for position, parsed in enumerate(parsed_commands):
+        if results[position] is not None:
+            continue
+        if parsed.sender_phone in created and pending[parsed.sender_phone] == position:
+            results[position] = ({"message": "User registered successfully."}, 201)
+        else:
+            results[position] = ({"message": "Phone number already registered."}, 409)
+
+    return results
@@ -0,0 +1,326 @@
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, text
+
+from app.extensions import db
+from app.models.sms_log import SMSLog
+from app.utils.segments import SegmentError, SegmentReader, SegmentWriter
+
+# A month range of sms_log; start is None for the partition holding
+# everything older than the first monthly one. table is the native partition
+# holding exactly these rows, or None when they are addressed by their
+# sent_date range (SQLite, and old months left in the DEFAULT partition).
+Partition = namedtuple('Partition', 'name start end table', defaults=(None,))
+
+SEGMENT_SUFFIX = '.seg'
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(start):
+    return f'sms_log_{start:%Y_%m}'
+
+
+def _parse_bound(value):
+    value = value.strip()
+    return None if value.upper() == 'MINVALUE' else datetime.fromisoformat(value.strip("'"))
+
+
+class SMSLogArchive:
+    """
+    Monthly partitions of sms_log and their archival to segment files.
+
+    On Postgres sms_log is natively partitioned by RANGE (sent_date) (see
+    migration 0006): one table per month plus a DEFAULT partition for
+    anything no monthly partition covers yet. ensure_partitions() creates
+    the current month and SMS_LOG_PARTITION_PREMAKE_MONTHS ahead. On SQLite
+    the partitions are emulated as month ranges of the single table, served
+    by the sent_date index.
+
+    archive() exports every partition older than SMS_LOG_HOT_MONTHS to a
+    compressed segment file in SMS_LOG_ARCHIVE_DIR (see app.utils.segments),
+    checks the file against the database and only then drops the partition
+    (deletes the range on SQLite). Rows of cold months that landed in the
+    DEFAULT partition are archived too, one segment per month and run,
+    and deleted from it. An existing segment file is never overwritten; a
+    partition whose segment already exists is skipped and reported. Run it
+    from cron with `flask archive-sms-log`. Archived rows stay readable
+    through scan().
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.directory = None
+        self.hot_months = 3
+        self.premake_months = 2
+        self.block_rows = 4096
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config.get('SMS_LOG_ARCHIVE_DIR', 'archive/sms_log')
+        self.hot_months = app.config.get('SMS_LOG_HOT_MONTHS', 3)
+        self.premake_months = app.config.get('SMS_LOG_PARTITION_PREMAKE_MONTHS', 2)
+        self.block_rows = app.config.get('SMS_LOG_SEGMENT_BLOCK_ROWS', 4096)
+        app.extensions['sms_log_archive'] = self
+
+    @staticmethod
+    def native(connection):
+        """Whether sms_log is a natively partitioned table on this connection"""
+        if connection.dialect.name != 'postgresql':
+            return False
+        return connection.execute(text(
+            "SELECT 1 FROM pg_class WHERE relname = 'sms_log' AND relkind = 'p'"
+        )).first() is not None
+
+    def partitions(self, connection):
+        """Monthly (and legacy) partitions, oldest first; never the DEFAULT partition"""
+        if self.native(connection):
+            rows = connection.execute(text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'sms_log'::regclass"
+            ))
+            partitions = []
+            for name, bound in rows:
+                match = _BOUND.search(bound or '')
+                if match:
+                    partitions.append(
+                        Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2)), name)
+                    )
+            return sorted(partitions, key=lambda partition: partition.end)
+
+        oldest, newest = connection.execute(select(func.min(SMSLog.sent_date), func.max(SMSLog.sent_date))).one()
+        if oldest is None:
+            return []
+        start, partitions = month_start(oldest), []
+        while start <= newest:
+            end = add_months(start, 1)
+            partitions.append(Partition(partition_name(start), start, end))
+            start = end
+        return partitions
+
+    def ensure_partitions(self, connection, now=None):
+        """
+        Create the monthly partitions from the current month to
+        premake_months ahead. Rows that already landed in the DEFAULT
+        partition for such a month are moved into it. Postgres only; run it
+        in a transaction.
+        """
+        if not self.native(connection):
+            return []
+        existing = self.partitions(connection)
+        current = month_start(now or datetime.utcnow())
+        created = []
+        for offset in range(self.premake_months + 1):
+            start = add_months(current, offset)
+            end = add_months(start, 1)
+            if any((p.start is None or p.start < end) and start < p.end for p in existing):
+                continue
+            name = partition_name(start)
+            connection.execute(text(f'CREATE TABLE IF NOT EXISTS {name} (LIKE sms_log INCLUDING DEFAULTS)'))
+            connection.execute(text(
+                f'WITH moved AS (DELETE FROM sms_log_default WHERE sent_date >= :start AND sent_date < :end '
+                f'RETURNING *) INSERT INTO {name} SELECT * FROM moved'
+            ), {'start': start, 'end': end})
+            connection.execute(text(
+                f"ALTER TABLE sms_log ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+            ))
+            created.append(name)
+        return created
+
+    def default_months(self, connection, before, now=None):
+        """
+        Months with rows in the DEFAULT partition older than before, as
+        range-addressed partitions. The names carry the archive time, since
+        late rows for an already archived month may arrive there again.
+        """
+        if not self.native(connection):
+            return []
+        months = connection.execute(text(
+            "SELECT DISTINCT date_trunc('month', sent_date) AS month FROM sms_log_default "
+            "WHERE sent_date < :before ORDER BY month"
+        ), {'before': before}).scalars()
+        stamp = f'{now or datetime.utcnow():%Y%m%d%H%M%S}'
+        return [Partition(f'{partition_name(start)}_default_{stamp}', start, add_months(start, 1)) for start in months]
+
+    def cold_partitions(self, connection, now=None):
+        cutoff = add_months(month_start(now or datetime.utcnow()), -self.hot_months)
+        cold = [partition for partition in self.partitions(connection) if partition.end <= cutoff]
+        return cold + self.default_months(connection, cutoff, now)
+
+    def segment_path(self, partition):
+        return os.path.join(self.directory, partition.name + SEGMENT_SUFFIX)
+
+    @staticmethod
+    def _range(partition):
+        condition = SMSLog.sent_date < partition.end
+        if partition.start is not None:
+            condition = condition & (SMSLog.sent_date >= partition.start)
+        return condition
+
+    def export(self, connection, partition):
+        """Write a partition's rows to its segment file; returns the row count"""
+        columns = list(SMSLog.__table__.columns)
+        rows = connection.execute(
+            select(*columns).where(self._range(partition)).order_by(SMSLog.sent_date, SMSLog.id)
+            .execution_options(yield_per=self.block_rows)
+        )
+        meta = {
+            'table': 'sms_log', 'partition': partition.name,
+            'start': partition.start.isoformat() if partition.start else None, 'end': partition.end.isoformat(),
+        }
+        with SegmentWriter(self.segment_path(partition), [column.name for column in columns],
+                           block_rows=self.block_rows, meta=meta) as writer:
+            for row in rows:
+                writer.add(tuple(row))
+        return writer.rows
+
+    def drop(self, connection, partition, expected_rows):
+        """
+        Remove an exported partition from the database, unless it no longer
+        holds exactly the rows that were archived. Run it in a transaction.
+        """
+        native = partition.table is not None and self.native(connection)
+        if native:
+            connection.execute(text(f'LOCK TABLE {partition.table} IN ACCESS EXCLUSIVE MODE'))
+            count = connection.execute(text(f'SELECT COUNT(*) FROM {partition.table}')).scalar()
+        else:
+            count = connection.execute(select(func.count()).where(self._range(partition))).scalar()
+        if count != expected_rows:
+            raise SegmentError(
+                f'{partition.name} holds {count} rows but {expected_rows} were archived; not dropping it'
+            )
+        if native:
+            connection.execute(text(f'ALTER TABLE sms_log DETACH PARTITION {partition.table}'))
+            connection.execute(text(f'DROP TABLE {partition.table}'))
+        else:
+            connection.execute(delete(SMSLog).where(self._range(partition)))
+
+    def archive(self, now=None, dry_run=False, echo=print):
+        """
+        Archive and drop every cold partition; returns the archived
+        partitions and the names of those skipped because their segment
+        file already exists.
+        """
+        with db.engine.begin() as connection:
+            created = self.ensure_partitions(connection, now)
+            cold = self.cold_partitions(connection, now)
+        if created:
+            echo(f"Created partitions: {', '.join(created)}")
+
+        archived, skipped = [], []
+        for partition in cold:
+            if dry_run:
+                echo(f'Would archive {partition.name}')
+                continue
+            if partition.table is None and os.path.exists(self.segment_path(partition)):
+                with db.engine.connect() as connection:
+                    if not connection.execute(select(func.count()).where(self._range(partition))).scalar():
+                        # Archived by an earlier run and nothing new since
+                        continue
+            try:
+                with db.engine.connect() as connection:
+                    rows = self.export(connection, partition)
+            except SegmentError as e:
+                echo(f'Skipping {partition.name}: {e}; move the existing segment aside to archive it again')
+                skipped.append(partition.name)
+                continue
+            if rows:
+                with SegmentReader(self.segment_path(partition)) as segment:
+                    segment.verify()
+            else:
+                # Nothing to keep; an empty month only needs dropping
+                os.remove(self.segment_path(partition))
+            with db.engine.begin() as connection:
+                self.drop(connection, partition, rows)
+            echo(f'Archived {partition.name}: {rows} row(s)' + (f' to {self.segment_path(partition)}' if rows else ''))
+            archived.append(partition)
+        return archived, skipped
+
+    def segments(self):
+        """Paths of the archived segment files, oldest first"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def scan(self, start=None, end=None, phone_number=None):
+        """Archived rows with sent_date in [start, end), optionally to or from one phone number"""
+        predicate = None
+        if phone_number:
+            predicate = lambda row: phone_number in (row.get('from_number'), row.get('to_number'))  # noqa: E731
+        for path in self.segments():
+            with SegmentReader(path) as segment:
+                if segment.overlaps(start, end):
+                    yield from segment.scan(start, end, predicate)
+
+    def stats(self):
+        segments = []
+        for path in self.segments():
+            with SegmentReader(path) as segment:
+                segments.append({
+                    'partition': segment.header.get('partition'),
+                    'rows': segment.rows,
+                    'bytes': os.path.getsize(path),
+                    'first_sent_date': segment.min_ts.isoformat() if segment.min_ts else None,
+                    'last_sent_date': segment.max_ts.isoformat() if segment.max_ts else None,
+                })
+        with self.app.app_context(), db.engine.connect() as connection:
+            native = self.native(connection)
+            partitions = [{
+                'name': partition.name,
+                'start': partition.start.isoformat() if partition.start else None,
+                'end': partition.end.isoformat(),
+            } for partition in self.partitions(connection)]
+        return {
+            'native_partitioning': native,
+            'hot_months': self.hot_months,
+            'partitions': partitions,
+            'archived_segments': segments,
+        }
+
+
+sms_log_archive = SMSLogArchive()
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+@click.command('archive-sms-log')
+@click.option('--dry-run', is_flag=True, help='List the partitions that would be archived.')
+@with_appcontext
+def archive_sms_log_command(dry_run):
+    """Create upcoming sms_log partitions and archive the cold ones."""
+    archived, skipped = sms_log_archive.archive(dry_run=dry_run, echo=click.echo)
+    if not dry_run:
+        click.echo(f'Archived {len(archived)} partition(s).')
+    if skipped:
+        raise click.ClickException(f'{len(skipped)} partition(s) skipped: {", ".join(skipped)}')
+
+
+@click.command('scan-sms-archive')
+@click.option('--from', 'start', help='Earliest sent_date (ISO format), inclusive.')
+@click.option('--to', 'end', help='Latest sent_date (ISO format), exclusive.')
+@click.option('--phone', help='Only messages to or from this number.')
+@with_appcontext
+def scan_sms_archive_command(start, end, phone):
+    """Print archived sms_log rows as NDJSON."""
+    for row in sms_log_archive.scan(_parse_date(start), _parse_date(end), phone):
+        click.echo(json.dumps(row, default=lambda value: value.isoformat()))
@@ -0,0 +1,237 @@
+"""
+Re-parse historical sms_log messages after SMSParser rules change.
+
+    flask replay-sms-log --mode diff --output changes.ndjson
+    flask replay-sms-log --mode backfill --workers 16
+
+The id range is split into chunks of SMS_REPLAY_CHUNK_SIZE ids, handed to a
+pool of SMS_REPLAY_WORKERS processes with their own database connections.
+Chunks are taken in id order and the highest finished id is recorded in a
+checkpoint file once the chunk's output is written, so an interrupted run
+picks up where it stopped when started again with the same options.
+"""
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, create_engine, func, select, update
+
+from app.extensions import db
+from app.models.sms_log import SMSLog
+from app.utils.sms_parser import SMSParser
+
+MODES = ('diff', 'backfill')
+
+sms_log = SMSLog.__table__
+
+# Per worker process engine, created by _init_worker
+_engine = None
+
+
+def _init_worker(database_uri):
+    global _engine
+    _engine = create_engine(database_uri)
+
+
+def replay_chunk(task):
+    """
+    Re-parse the INCOMING rows with ids in [low, high).
+
+    In backfill mode rows whose stored command differs are updated with
+    one executemany; in diff mode they are returned instead, along with
+    every REGISTER row when registrations is set. Runs in a pool worker
+    (or in-process with a single worker).
+    """
+    mode, low, high, registrations = task
+    started = time.perf_counter()
+    with _engine.connect() as connection:
+        rows = connection.execute(
+            select(sms_log.c.id, sms_log.c.sent_date, sms_log.c.from_number,
+                   sms_log.c.message_content, sms_log.c.command)
+            .where(sms_log.c.id >= low, sms_log.c.id < high, sms_log.c.message_type == 'INCOMING')
+            .order_by(sms_log.c.id)
+        ).all()
+
+        changed, registered = [], []
+        for row in rows:
+            parsed = SMSParser.parse_sms(row.message_content or '', row.from_number or '')
+            if parsed.command != row.command:
+                changed.append((row, parsed))
+            elif registrations and parsed.command == 'REGISTER':
+                registered.append((row, parsed))
+
+        diffs = []
+        if mode == 'backfill' and changed:
+            # sent_date lets Postgres prune to the row's partition
+            connection.execute(
+                update(sms_log)
+                .where(sms_log.c.id == bindparam('row_id'), sms_log.c.sent_date == bindparam('row_sent_date'))
+                .values(command=bindparam('new_command')),
+                [{'row_id': row.id, 'row_sent_date': row.sent_date, 'new_command': parsed.command}
+                 for row, parsed in changed]
+            )
+            connection.commit()
+        elif mode == 'diff':
+            diffs = [{
+                'id': row.id,
+                'sent_date': row.sent_date.isoformat() if row.sent_date else None,
+                'from_number': row.from_number,
+                'old_command': row.command,
+                'new_command': parsed.command,
+                'parameters': parsed.parameters,
+            } for row, parsed in sorted(changed + registered, key=lambda pair: pair[0].id)]
+    return low, len(rows), len(changed), diffs, time.perf_counter() - started
+
+
+class ReplayCheckpoint:
+    """
+    Progress of a replay run, saved as JSON after every chunk: every id
+    below next_id is done.
+
+    Chunks complete in id order, so this one high-water mark is enough. A
+    run resumes only with the same mode, id range and options.
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.next_id = settings['from_id']
+        self.rows = 0
+        self.changed = 0
+
+    def load(self):
+        """Resume from the file if it exists; raises click.ClickException on a mismatch"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as file:
+            saved = json.load(file)
+        if saved.get('settings') != self.settings:
+            raise click.ClickException(
+                f'{self.path} was written by a run with different settings '
+                f'({saved.get("settings")}); pass --restart to discard it.'
+            )
+        self.next_id = saved['next_id']
+        self.rows = saved['rows']
+        self.changed = saved['changed']
+        return True
+
+    def complete(self, high, rows, changed):
+        self.next_id = high
+        self.rows += rows
+        self.changed += changed
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as file:
+            json.dump({'settings': self.settings, 'next_id': self.next_id,
+                       'rows': self.rows, 'changed': self.changed}, file)
+        os.replace(tmp, self.path)
+
+
+def _chunks(first_id, last_id, chunk_size):
+    return [(low, min(low + chunk_size, last_id + 1)) for low in range(first_id, last_id + 1, chunk_size)]
+
+
+def _results(tasks, workers, database_uri):
+    """Yield replay_chunk results in task order, from a process pool when there are several workers"""
+    if workers > 1 and len(tasks) > 1:
+        # Leaving the block (done, failed or closed early) terminates the workers
+        with multiprocessing.Pool(workers, _init_worker, (database_uri,)) as pool:
+            yield from pool.imap(replay_chunk, tasks)
+    else:
+        _init_worker(database_uri)
+        yield from map(replay_chunk, tasks)
+
+
+def _open_diff_output(path, resumed):
+    """
+    The diff file and the last id already in it. On resume a line cut
+    short by a crash is dropped, and diffs up to that id must be skipped:
+    they were written after the last checkpoint.
+    """
+    if not resumed or not os.path.exists(path):
+        return open(path, 'w'), None
+    diff_file = open(path, 'r+')
+    last_id, end = None, 0
+    while True:
+        line = diff_file.readline()
+        if not line.endswith('\n'):
+            break
+        last_id = json.loads(line)['id']
+        end = diff_file.tell()
+    diff_file.seek(end)
+    diff_file.truncate()
+    return diff_file, last_id
+
+
+@click.command('replay-sms-log')
+@click.option('--mode', type=click.Choice(MODES), default='diff', show_default=True,
+              help='diff writes changed commands to --output; backfill updates sms_log.command.')
+@click.option('--workers', type=int, help='Worker processes (SMS_REPLAY_WORKERS).')
+@click.option('--chunk-size', type=int, help='Ids per chunk (SMS_REPLAY_CHUNK_SIZE).')
+@click.option('--from-id', type=int, help='First sms_log id (default: the lowest).')
+@click.option('--to-id', type=int, help='Last sms_log id, inclusive (default: the highest).')
+@click.option('--checkpoint', 'checkpoint_path', help='Checkpoint file (default: sms_log_replay.<mode>.json).')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start over.')
+@click.option('--output', default='sms_log_replay.diff.ndjson', show_default=True, help='Diff output (NDJSON).')
+@click.option('--registrations', is_flag=True,
+              help='In diff mode, also write the re-parsed fields of unchanged REGISTER messages.')
+@with_appcontext
+def replay_sms_log_command(mode, workers, chunk_size, from_id, to_id, checkpoint_path, restart, output,
+                           registrations):
+    """Re-parse sms_log messages with the current SMSParser rules."""
+    workers = workers or current_app.config['SMS_REPLAY_WORKERS']
+    chunk_size = chunk_size or current_app.config['SMS_REPLAY_CHUNK_SIZE']
+    if from_id is None or to_id is None:
+        lowest, highest = db.session.execute(select(func.min(sms_log.c.id), func.max(sms_log.c.id))).one()
+        from_id = lowest if from_id is None else from_id
+        to_id = highest if to_id is None else to_id
+    db.session.close()
+    # Forked workers open their own connections; none may be shared
+    db.engine.dispose()
+    if from_id is None or to_id is None or to_id < from_id:
+        click.echo('Nothing to replay.')
+        return
+
+    checkpoint = ReplayCheckpoint(
+        checkpoint_path or f'sms_log_replay.{mode}.json',
+        {'mode': mode, 'from_id': from_id, 'to_id': to_id, 'registrations': registrations},
+    )
+    if restart and os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    resumed = checkpoint.load()
+    chunks = _chunks(checkpoint.next_id, to_id, chunk_size)
+    tasks = [(mode, low, high, registrations) for low, high in chunks]
+    click.echo(f'{"Resuming" if resumed else "Starting"} {mode} replay of ids {from_id}-{to_id} '
+               f'from id {checkpoint.next_id}: {len(chunks)} chunk(s), {workers} worker(s).')
+
+    diff_file, written_id = _open_diff_output(output, resumed) if mode == 'diff' else (None, None)
+    started = time.perf_counter()
+    rows = 0
+    try:
+        with contextlib.closing(_results(tasks, workers, current_app.config['SQLALCHEMY_DATABASE_URI'])) as results:
+            for count, ((_, _, high, _), (_, chunk_rows, changed, diffs, _)) in enumerate(zip(tasks, results), 1):
+                if diff_file is not None:
+                    diff_file.writelines(
+                        json.dumps(diff) + '\n' for diff in diffs if written_id is None or diff['id'] > written_id
+                    )
+                    diff_file.flush()
+                    os.fsync(diff_file.fileno())
+                # Only once the chunk's output is on disk
+                checkpoint.complete(high, chunk_rows, changed)
+                rows += chunk_rows
+                elapsed = time.perf_counter() - started
+                if count % max(1, len(tasks) // 20) == 0 or count == len(tasks):
+                    click.echo(f'  {count}/{len(tasks)} chunks, up to id {high - 1}, {checkpoint.rows} rows, '
+                               f'{rows / elapsed if elapsed else 0:,.0f} rows/s')
+    finally:
+        if diff_file is not None:
+            diff_file.close()
+
+    elapsed = time.perf_counter() - started
+    verb = 'updated' if mode == 'backfill' else f'written to {output}'
+    click.echo(f'Replayed {checkpoint.rows} row(s), {checkpoint.changed} changed ({verb}); '
+               f'this run: {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s).')
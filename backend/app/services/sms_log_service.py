@@ -1,9 +1,21 @@
 from app.models import SMSLog
 from app.extensions import db
+from app.services.sms_log_writer import sms_log_writer
 
 class SMSLogService:
     @staticmethod
     def log_sms(from_number, to_number, message_type, message_content):
+        """
+        Record an SMS in the audit log.
+
+        When write-behind logging is enabled the row is queued and written
+        with the next flush, and None is returned. Otherwise the row is
+        committed immediately and returned.
+        """
+        if sms_log_writer.enabled:
+            sms_log_writer.log(from_number, to_number, message_type, message_content)
+            return None
+
         new_sms_log = SMSLog(
             from_number=from_number,
             to_number=to_number,
@@ -12,4 +24,4 @@ class SMSLogService:
         )
         db.session.add(new_sms_log)
         db.session.commit()
-        return new_sms_log
\ No newline at end of file
+        return new_sms_log
@@ -0,0 +1,297 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models.sms_log import SMSLog
+
+
+class SMSLogWriter:
+    """
+    Write-behind buffer for SMSLog audit rows.
+
+    Rows are queued in memory and a background thread writes them with one
+    multi-row insert and one commit per flush. A flush happens when
+    SMS_LOG_FLUSH_ROWS rows are waiting or SMS_LOG_FLUSH_INTERVAL_MS has
+    passed since the first of them was queued. The queue is bounded: when it
+    is full, callers block for up to SMS_LOG_PUT_TIMEOUT_MS and then write
+    their rows synchronously, so nothing is dropped. Pending rows are flushed
+    at interpreter exit.
+
+    A failed flush is retried SMS_LOG_RETRY_ATTEMPTS times with exponential
+    backoff from SMS_LOG_RETRY_BACKOFF_MS; a failed synchronous write is not
+    retried, to keep the request short. Rows that still cannot be written
+    are appended to an NDJSON spill file in SMS_LOG_SPILL_DIR, which the
+    worker loads back once the database accepts writes again (or run
+    `flask load-sms-log-spill`).
+
+    With SMS_LOG_WRITE_BEHIND disabled every call writes synchronously.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._registered = False
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spill_checked_at = 0.0
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SMS_LOG_WRITE_BEHIND', True)
+        self.batch_size = app.config.get('SMS_LOG_FLUSH_ROWS', 200)
+        self.interval = app.config.get('SMS_LOG_FLUSH_INTERVAL_MS', 50) / 1000.0
+        self.put_timeout = app.config.get('SMS_LOG_PUT_TIMEOUT_MS', 100) / 1000.0
+        self.retry_attempts = app.config.get('SMS_LOG_RETRY_ATTEMPTS', 4)
+        self.retry_backoff = app.config.get('SMS_LOG_RETRY_BACKOFF_MS', 200) / 1000.0
+        self.spill_dir = app.config.get('SMS_LOG_SPILL_DIR', 'spill/sms_log')
+        self.spill_reload_interval = app.config.get('SMS_LOG_SPILL_RELOAD_SECONDS', 60)
+        self._queue = queue.Queue(maxsize=app.config.get('SMS_LOG_QUEUE_SIZE', 10000))
+        app.extensions['sms_log_writer'] = self
+        if not self._registered:
+            atexit.register(self.stop)
+            self._registered = True
+
+    def _reset_stats(self):
+        self._stats = {
+            'rows_queued': 0,
+            'rows_written': 0,
+            'flushes': 0,
+            'sync_writes': 0,
+            'flush_errors': 0,
+            'rows_spilled': 0,
+            'rows_reloaded': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    @staticmethod
+    def row(from_number, to_number, message_type, message_content, command=None, outcome=None):
+        """Build an insertable SMSLog row, stamped at the time it is received"""
+        return {
+            'from_number': from_number,
+            'to_number': to_number,
+            'message_type': message_type,
+            'message_content': message_content,
+            'sent_date': datetime.utcnow(),
+            'command': command,
+            'outcome': outcome,
+        }
+
+    def log(self, from_number, to_number, message_type, message_content, command=None, outcome=None):
+        self.write([self.row(from_number, to_number, message_type, message_content, command, outcome)])
+
+    def write(self, rows):
+        """Queue rows for the next flush, or write them now if write-behind is off"""
+        if not rows:
+            return
+        if not self.enabled or self._stopping.is_set():
+            self._write_sync(rows)
+            return
+
+        self._ensure_worker()
+        deadline = time.monotonic() + self.put_timeout
+        for index, row in enumerate(rows):
+            try:
+                self._queue.put(row, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                # Backpressure: the queue stayed full, write the rest ourselves
+                self._write_sync(rows[index:])
+                return
+            with self._stats_lock:
+                self._stats['rows_queued'] += 1
+
+    def _insert(self, rows):
+        # A fresh app context gets its own session, leaving the caller's untouched
+        with self.app.app_context():
+            db.session.execute(insert(SMSLog), rows)
+            db.session.commit()
+
+    def _write_sync(self, rows):
+        try:
+            self._insert(rows)
+        except Exception:
+            self.app.logger.exception('Failed to write %d SMS log rows', len(rows))
+            with self._stats_lock:
+                self._stats['flush_errors'] += 1
+            self._spill(rows)
+            return
+        with self._stats_lock:
+            self._stats['sync_writes'] += len(rows)
+            self._stats['rows_written'] += len(rows)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='sms-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._drain(block=True)
+            if time.monotonic() - self._spill_checked_at >= self.spill_reload_interval:
+                self._spill_checked_at = time.monotonic()
+                try:
+                    self.load_spill()
+                except Exception:
+                    self.app.logger.exception('Failed to reload spilled SMS log rows')
+
+    def _drain(self, block):
+        """Collect up to one batch from the queue and write it"""
+        rows = []
+        try:
+            rows.append(self._queue.get(timeout=self.interval) if block else self._queue.get_nowait())
+        except queue.Empty:
+            return 0
+
+        deadline = time.monotonic() + self.interval
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                rows.append(self._queue.get(timeout=remaining) if block and remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        self._flush(rows)
+        return len(rows)
+
+    def _flush(self, rows):
+        started = time.perf_counter()
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                self._insert(rows)
+                break
+            except Exception:
+                self.app.logger.exception('Failed to flush %d SMS log rows (attempt %d)', len(rows), attempt + 1)
+                with self._stats_lock:
+                    self._stats['flush_errors'] += 1
+                if attempt == self.retry_attempts:
+                    self._spill(rows)
+                    return
+                time.sleep(self.retry_backoff * 2 ** attempt)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['rows_written'] += len(rows)
+            self._stats['flushes'] += 1
+            self._stats['last_flush_ms'] = elapsed_ms
+            self._stats['total_flush_ms'] += elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+
+    def _spill(self, rows):
+        """Append rows that could not be written to this process's spill file"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f'sms_log-{os.getpid()}.ndjson')
+        with self._spill_lock, open(path, 'a', encoding='utf-8') as spill:
+            for row in rows:
+                spill.write(json.dumps(dict(row, sent_date=row['sent_date'].isoformat())) + '\n')
+            spill.flush()
+            os.fsync(spill.fileno())
+        self.app.logger.error('Spilled %d SMS log rows to %s', len(rows), path)
+        with self._stats_lock:
+            self._stats['rows_spilled'] += len(rows)
+
+    def spill_files(self):
+        """Spill files waiting to be loaded, one per process that wrote them"""
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return []
+        return sorted(os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir)
+                      if name.endswith('.ndjson'))
+
+    def load_spill(self):
+        """
+        Insert the rows of every spill file and delete the files; returns the
+        rows loaded. A file is renamed before loading, so concurrent loaders
+        never insert it twice, and renamed back if its insert fails. Files
+        another live process may still be appending to are left alone.
+        """
+        loaded = 0
+        for path in self.spill_files():
+            if self._writer_alive(path):
+                continue
+            claimed = f'{path}.{os.getpid()}.loading'
+            with self._spill_lock:
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    continue
+            try:
+                with open(claimed, encoding='utf-8') as spill:
+                    rows = [json.loads(line) for line in spill if line.strip()]
+                for row in rows:
+                    row['sent_date'] = datetime.fromisoformat(row['sent_date'])
+                # One transaction, so a failed load inserts nothing and can simply be retried
+                self._insert(rows)
+            except Exception:
+                os.rename(claimed, path)
+                raise
+            os.remove(claimed)
+            loaded += len(rows)
+        with self._stats_lock:
+            self._stats['rows_reloaded'] += loaded
+        return loaded
+
+    @staticmethod
+    def _writer_alive(path):
+        pid = int(os.path.basename(path)[len('sms_log-'):-len('.ndjson')])
+        if pid == os.getpid():
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        while self._queue is not None and self._drain(block=False):
+            pass
+
+    def stop(self, timeout=5.0):
+        """Stop the worker and flush whatever is left"""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['queue_capacity'] = self._queue.maxsize if self._queue is not None else 0
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+        stats['spill_files'] = len(self.spill_files())
+        return stats
+
+
+sms_log_writer = SMSLogWriter()
+
+
+@click.command('load-sms-log-spill')
+@with_appcontext
+def load_sms_log_spill_command():
+    """Insert SMS log rows spilled to disk while the database was failing."""
+    loaded = sms_log_writer.load_spill()
+    click.echo(f'Loaded {loaded} spilled SMS log row(s).')
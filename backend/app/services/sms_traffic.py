@@ -0,0 +1,242 @@
+import atexit
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from app.extensions import db
+from app.models.sms_traffic import SMSTrafficRollup
+from app.utils.sql import upsert_insert
+
+# Inclusive upper bounds of the latency histogram buckets; slower commands
+# land in OVERFLOW_BUCKET
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+OVERFLOW_BUCKET = 2 ** 31 - 1
+
+# Rows per upsert statement, well under SQLite's bound parameter limit
+FLUSH_CHUNK_ROWS = 500
+
+_SUMMED = ('messages', 'rejected', 'errors', 'latency_ms_total')
+
+
+def latency_bucket(latency_ms):
+    index = bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+    return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else OVERFLOW_BUCKET
+
+
+def minute_of(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def percentile(histogram, fraction):
+    """Upper bound of the bucket holding the given fraction of samples; None past the last bound"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bound in sorted(histogram):
+        seen += histogram[bound]
+        if seen >= fraction * total:
+            return bound if bound != OVERFLOW_BUCKET else None
+    return None
+
+
+class SMSTrafficStats:
+    """
+    Per-minute SMS command traffic: message counts by command, rejected
+    (4xx) and error (5xx) counts and a latency histogram.
+
+    record() adds to in-memory counters keyed by (minute, command, latency
+    bucket). A background thread adds them to the sms_traffic_rollup table
+    every SMS_TRAFFIC_FLUSH_SECONDS with one additive upsert, so any number
+    of processes can flush into the same rows. query() reads the rollup
+    table, never sms_log, and includes this process's unflushed counts.
+    Counts from other processes show up within one flush interval.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._registered = False
+        self._stopping = threading.Event()
+        self._counters = {'recorded': 0, 'flushes': 0, 'rows_flushed': 0, 'flush_errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SMS_TRAFFIC_ENABLED', True)
+        self.flush_interval = app.config.get('SMS_TRAFFIC_FLUSH_SECONDS', 10)
+        self.max_range = timedelta(hours=app.config.get('SMS_TRAFFIC_MAX_RANGE_HOURS', 168))
+        app.extensions['sms_traffic'] = self
+        if not self._registered:
+            atexit.register(self.stop)
+            self._registered = True
+
+    @staticmethod
+    def outcome(status_code):
+        if status_code >= 500:
+            return 'error'
+        if status_code >= 400:
+            return 'rejected'
+        return 'ok'
+
+    def record(self, command, outcome, latency_ms, at=None):
+        """Count one handled SMS"""
+        if not self.enabled:
+            return
+        key = (minute_of(at or datetime.utcnow()), command or 'UNKNOWN', latency_bucket(latency_ms))
+        with self._lock:
+            counts = self._pending.get(key)
+            if counts is None:
+                counts = self._pending[key] = [0, 0, 0, 0.0]
+            counts[0] += 1
+            counts[1] += outcome == 'rejected'
+            counts[2] += outcome == 'error'
+            counts[3] += latency_ms
+            self._counters['recorded'] += 1
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so start one per process on first use
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='sms-traffic', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Add the pending counts to the rollup table; returns the rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        # Sorted so concurrent flushes lock rollup rows in the same order
+        rows = [{
+            'minute': minute, 'command': command, 'latency_le_ms': bucket,
+            'messages': counts[0], 'rejected': counts[1], 'errors': counts[2], 'latency_ms_total': counts[3],
+        } for (minute, command, bucket), counts in sorted(pending.items())]
+        try:
+            with self.app.app_context():
+                for start in range(0, len(rows), FLUSH_CHUNK_ROWS):
+                    statement = upsert_insert(SMSTrafficRollup).values(rows[start:start + FLUSH_CHUNK_ROWS])
+                    db.session.execute(statement.on_conflict_do_update(
+                        index_elements=['minute', 'command', 'latency_le_ms'],
+                        set_={name: getattr(SMSTrafficRollup, name) + statement.excluded[name] for name in _SUMMED},
+                    ))
+                db.session.commit()
+        except Exception:
+            self.app.logger.exception('Failed to flush %d SMS traffic rollup rows', len(rows))
+            # Keep the counts for the next flush
+            with self._lock:
+                for key, counts in pending.items():
+                    merged = self._pending.setdefault(key, [0, 0, 0, 0.0])
+                    for index, value in enumerate(counts):
+                        merged[index] += value
+                self._counters['flush_errors'] += 1
+            return 0
+        with self._lock:
+            self._counters['flushes'] += 1
+            self._counters['rows_flushed'] += len(rows)
+        return len(rows)
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher and write whatever is pending"""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+        if self.app is not None:
+            self.flush()
+
+    def query(self, start, end, step_minutes=1, command=None):
+        """
+        Traffic in [start, end) as one point per step_minutes, plus totals.
+        Raises ValueError for an empty or too long range.
+        """
+        start, end = minute_of(start), minute_of(end)
+        if end <= start:
+            raise ValueError('The range must end after it starts')
+        if end - start > self.max_range:
+            raise ValueError(f'The range may span at most {self.max_range.total_seconds() / 3600:g} hours')
+        step = timedelta(minutes=step_minutes)
+
+        query = db.session.query(SMSTrafficRollup).filter(
+            SMSTrafficRollup.minute >= start, SMSTrafficRollup.minute < end
+        )
+        if command:
+            query = query.filter(SMSTrafficRollup.command == command)
+        entries = [
+            (row.minute, row.command, row.latency_le_ms, [getattr(row, name) for name in _SUMMED])
+            for row in query
+        ]
+        with self._lock:
+            entries.extend(
+                (minute, key_command, bucket, list(counts))
+                for (minute, key_command, bucket), counts in self._pending.items()
+                if start <= minute < end and (not command or key_command == command)
+            )
+
+        points, totals = {}, self._empty_point()
+        for minute, row_command, bucket, counts in entries:
+            slot = start + (minute - start) // step * step
+            for point in (points.setdefault(slot, self._empty_point()), totals):
+                for name, value in zip(_SUMMED, counts):
+                    point[name] += value
+                point['commands'][row_command] = point['commands'].get(row_command, 0) + counts[0]
+                point['histogram'][bucket] = point['histogram'].get(bucket, 0) + counts[0]
+
+        return {
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'step_minutes': step_minutes,
+            'series': [dict(self._summary(points[slot]), minute=slot.isoformat()) for slot in sorted(points)],
+            'totals': self._summary(totals),
+        }
+
+    @staticmethod
+    def _empty_point():
+        return {'messages': 0, 'rejected': 0, 'errors': 0, 'latency_ms_total': 0.0, 'commands': {}, 'histogram': {}}
+
+    @staticmethod
+    def _summary(point):
+        histogram = point['histogram']
+        return {
+            'messages': point['messages'],
+            'rejected': point['rejected'],
+            'errors': point['errors'],
+            'commands': point['commands'],
+            'latency_ms': {
+                'mean': point['latency_ms_total'] / point['messages'] if point['messages'] else None,
+                'p50': percentile(histogram, 0.50),
+                'p95': percentile(histogram, 0.95),
+                'p99': percentile(histogram, 0.99),
+                # le_ms is null for the bucket past the last bound
+                'histogram': [
+                    {'le_ms': bound if bound != OVERFLOW_BUCKET else None, 'count': histogram[bound]}
+                    for bound in sorted(histogram)
+                ],
+            },
+        }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending_rows'] = len(self._pending)
+        stats['enabled'] = self.enabled
+        stats['flush_interval_seconds'] = self.flush_interval
+        return stats
+
+
+sms_traffic = SMSTrafficStats()
@@ -0,0 +1,265 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Column, MetaData, Table, func, select, text
+from werkzeug.exceptions import BadRequest
+
+from app.extensions import db
+from app.models.user import User
+from app.services.user_cache import user_cache
+from app.services.user_service import UserService
+from app.services.user_stats_service import UserStatsService
+from app.utils.serializers import USER_FIELDS
+from app.utils.sql import upsert_insert
+from app.utils.validation import RegistrationValidator
+
+FORMATS = ('csv', 'ndjson')
+
+# Validated only when present; absent ones keep the stored value on update
+OPTIONAL_FIELDS = {
+    'education_level': RegistrationValidator.validate_education_level,
+    'profession': RegistrationValidator.validate_profession,
+    'marital_status': RegistrationValidator.validate_marital_status,
+    'religion': RegistrationValidator.validate_religion,
+    'ethnicity': RegistrationValidator.validate_ethnicity,
+    'self_description': RegistrationValidator.validate_self_description,
+}
+REQUIRED_FIELDS = ('phone_number', 'username', 'age', 'gender', 'county', 'town')
+STAGED_FIELDS = REQUIRED_FIELDS + tuple(OPTIONAL_FIELDS) + ('registration_status',)
+EXPORT_FIELDS = USER_FIELDS + ('created_at', 'updated_at')
+
+# Session-local Postgres staging table that COPY loads each chunk into
+staging = Table('users_import', MetaData(), *(Column(name, User.__table__.c[name].type) for name in STAGED_FIELDS))
+
+# The columns UserStatsService.snapshot() reads, returned by the merge
+_SNAPSHOT_COLUMNS = (User.gender, User.county, User.town, User.age, User.registration_status)
+
+
+def detect_format(filename, fmt=None):
+    if fmt:
+        return fmt
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+
+
+def read_records(stream, fmt):
+    """Yield (line number, record) pairs; record is None for an unparseable line"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def validate_record(record):
+    """The users row for one import record; raises BadRequest like registration does"""
+    record = dict(record)
+    if record.get('phone_number') is not None:
+        record['phone_number'] = str(record['phone_number'])
+    row = RegistrationValidator.validate_step_data(1, record)
+    row.update(RegistrationValidator.validate_step_data(2, record))
+    for field, validate in OPTIONAL_FIELDS.items():
+        value = record.get(field)
+        row[field] = validate(value) if value not in (None, '') else None
+    row['registration_status'] = 'complete' if UserService._is_complete_profile(row) else 'incomplete'
+    return row
+
+
+class UserBulkService:
+    """
+    Streaming user import and export.
+
+    Records are validated with RegistrationValidator and merged in chunks
+    of USER_IMPORT_CHUNK_SIZE, one transaction per chunk, so memory stays
+    flat however large the file is. On Postgres each chunk is COPYed into
+    a temporary staging table and merged with a single
+    INSERT ... SELECT ... ON CONFLICT (phone_number); other databases run
+    the same upsert with executemany.
+
+    The user stats rollup is adjusted in the merge transaction. Running
+    servers pick the imported profiles up through the candidate index and
+    match scorer refreshes (the merge bumps updated_at), as they do for
+    writes from any other process.
+    """
+
+    @staticmethod
+    def import_records(records, chunk_size=5000, update_existing=True, on_reject=None, dry_run=False):
+        """
+        Import (line number, record) pairs. Existing phone numbers are
+        updated, or skipped when update_existing is false. Invalid records
+        are counted and passed to on_reject(line, record, error).
+        """
+        counts = {'read': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'rejected': 0}
+        chunk = {}
+        for line, record in records:
+            counts['read'] += 1
+            try:
+                if record is None:
+                    raise BadRequest('Malformed record')
+                row = validate_record(record)
+            except BadRequest as e:
+                counts['rejected'] += 1
+                if on_reject is not None:
+                    on_reject(line, record, e.description)
+                continue
+            # One statement cannot upsert a phone number twice; the last record wins
+            if row['phone_number'] in chunk:
+                counts['skipped'] += 1
+            chunk[row['phone_number']] = row
+            if len(chunk) >= chunk_size:
+                UserBulkService._merge(list(chunk.values()), update_existing, counts, dry_run)
+                chunk = {}
+        if chunk:
+            UserBulkService._merge(list(chunk.values()), update_existing, counts, dry_run)
+        return counts
+
+    @staticmethod
+    def _merge(rows, update_existing, counts, dry_run):
+        before = {}
+        if update_existing:
+            existing = db.session.execute(
+                select(User.phone_number, *_SNAPSHOT_COLUMNS)
+                .where(User.phone_number.in_([row['phone_number'] for row in rows]))
+                .with_for_update()
+            )
+            before = {phone: tuple(snapshot) for phone, *snapshot in existing}
+
+        copy = db.session.get_bind().dialect.name == 'postgresql'
+        statement = upsert_insert(User)
+        if copy:
+            UserBulkService._copy_to_staging(rows)
+            statement = statement.from_select(STAGED_FIELDS, select(*staging.c))
+        if update_existing:
+            excluded = statement.excluded
+            statement = statement.on_conflict_do_update(index_elements=['phone_number'], set_={
+                **{field: excluded[field] for field in STAGED_FIELDS[1:] if field not in OPTIONAL_FIELDS},
+                **{field: func.coalesce(excluded[field], User.__table__.c[field]) for field in OPTIONAL_FIELDS},
+                'updated_at': func.now(),
+            })
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=['phone_number'])
+        statement = statement.returning(User.id, User.phone_number, *_SNAPSHOT_COLUMNS)
+        # Core execution: the ORM bulk-insert path re-splices RETURNING rows per batch
+        connection = db.session.connection()
+        merged = connection.execute(statement).all() if copy else connection.execute(statement, rows).all()
+
+        added, removed = [], []
+        for _, phone, *snapshot in merged:
+            added.append(tuple(snapshot))
+            if phone in before:
+                removed.append(before[phone])
+        UserStatsService.record(added=added, removed=removed)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+            for user_id, phone, *_ in merged:
+                user_cache.invalidate(user_id, phone)
+        db.session.expunge_all()
+
+        counts['updated'] += len(removed)
+        counts['created'] += len(merged) - len(removed)
+        counts['skipped'] += len(rows) - len(merged)
+
+    @staticmethod
+    def _copy_to_staging(rows):
+        connection = db.session.connection()
+        columns = ', '.join(STAGED_FIELDS)
+        connection.execute(text(
+            f'CREATE TEMP TABLE IF NOT EXISTS {staging.name} ON COMMIT DELETE ROWS '
+            f'AS SELECT {columns} FROM users WITH NO DATA'
+        ))
+        buffer = io.StringIO()
+        # csv writes None as an unquoted empty field, which COPY reads as NULL
+        csv.writer(buffer).writerows([row[field] for field in STAGED_FIELDS] for row in rows)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(f'COPY {staging.name} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+    @staticmethod
+    def export(stream, fmt, chunk_size=5000):
+        """Write every user to stream as CSV or NDJSON, ordered by id; returns the row count"""
+        if fmt == 'csv' and db.session.get_bind().dialect.name == 'postgresql':
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert(
+                f"COPY (SELECT {', '.join(EXPORT_FIELDS)} FROM users ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)",
+                stream,
+            )
+            return cursor.rowcount
+
+        rows = db.session.execute(
+            select(*(User.__table__.c[field] for field in EXPORT_FIELDS))
+            .order_by(User.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        writer = csv.writer(stream) if fmt == 'csv' else None
+        if writer is not None:
+            writer.writerow(EXPORT_FIELDS)
+        count = 0
+        for row in rows:
+            values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                stream.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) + '\n')
+            count += 1
+        return count
+
+
+@click.command('import-users')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--chunk-size', type=int, help='Records per transaction (USER_IMPORT_CHUNK_SIZE).')
+@click.option('--skip-existing', is_flag=True, help='Leave users whose phone number exists untouched.')
+@click.option('--rejects', type=click.File('w', encoding='utf-8'), help='Write rejected records here as NDJSON.')
+@click.option('--dry-run', is_flag=True, help='Validate and merge, then roll every chunk back.')
+@with_appcontext
+def import_users_command(source, fmt, chunk_size, skip_existing, rejects, dry_run):
+    """Import users from a CSV or NDJSON file (- for stdin)."""
+    fmt = detect_format(source.name, fmt)
+
+    def on_reject(line, record, error):
+        if rejects is not None:
+            rejects.write(json.dumps({'line': line, 'error': error, 'record': record}) + '\n')
+
+    started = time.perf_counter()
+    counts = UserBulkService.import_records(
+        read_records(source, fmt),
+        chunk_size=chunk_size or current_app.config['USER_IMPORT_CHUNK_SIZE'],
+        update_existing=not skip_existing,
+        on_reject=on_reject,
+        dry_run=dry_run,
+    )
+    elapsed = time.perf_counter() - started
+    click.echo(', '.join(f'{name} {count}' for name, count in counts.items())
+               + f' in {elapsed:.1f}s ({counts["read"] / elapsed if elapsed else 0:.0f} records/s)'
+               + (' [dry run]' if dry_run else ''))
+
+
+@click.command('export-users')
+@click.argument('target', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@with_appcontext
+def export_users_command(target, fmt):
+    """Export all users to a CSV or NDJSON file (- for stdout)."""
+    count = UserBulkService.export(
+        target, detect_format(target.name, fmt), current_app.config['USER_IMPORT_CHUNK_SIZE']
+    )
+    click.echo(f'Exported {count} user(s).', err=True)
@@ -0,0 +1,151 @@
+import ctypes
+import multiprocessing
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+
+from app.models.user import User
+from app.utils.serializers import USER_FIELDS
+
+# Read-only copy of a user row; safe to share between requests and threads
+CachedUser = namedtuple('CachedUser', USER_FIELDS + ('updated_at',))
+
+
+class UserCache:
+    """
+    Read-through LRU + TTL cache of user rows keyed by id and by phone number.
+
+    Entries are CachedUser snapshots, not ORM objects. Writers call
+    invalidate() after committing a change to a user.
+
+    Every key hashes to a generation counter. An entry is only valid while
+    its counter still has the value it had before the row was read, so an
+    invalidation also defeats a concurrent read that fetched the old row.
+    With USER_CACHE_SHARED the counters live in shared memory allocated
+    before the server forks, so an invalidation in one prefork worker is
+    seen by all of them at once. Otherwise they are process-local, and
+    other processes can serve a stale row for up to USER_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.maxsize = 10000
+        self.ttl = 30
+        self.shared = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = None
+        self._generation_lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('USER_CACHE_ENABLED', True)
+        self.maxsize = app.config.get('USER_CACHE_SIZE', 10000)
+        self.ttl = app.config.get('USER_CACHE_TTL_SECONDS', 30)
+        self.shared = app.config.get('USER_CACHE_SHARED', False)
+        slots = app.config.get('USER_CACHE_GENERATION_SLOTS', 4096)
+        if self.shared:
+            self._generations = multiprocessing.RawArray(ctypes.c_uint64, slots)
+            self._generation_lock = multiprocessing.Lock()
+        else:
+            self._generations = (ctypes.c_uint64 * slots)()
+            self._generation_lock = threading.Lock()
+        self._entries.clear()
+        app.extensions['user_cache'] = self
+
+    def _slot(self, key):
+        return zlib.crc32(repr(key).encode()) % len(self._generations)
+
+    def get(self, user_id=None, phone_number=None):
+        """The user with this id (or phone number) as a CachedUser, or None"""
+        key = ('id', user_id) if user_id is not None else ('phone', phone_number)
+        if not self.enabled:
+            return self._load(key)
+
+        slot = self._slot(key)
+        generation = self._generations[slot]
+        now = time.monotonic()
+        user = self._lookup(key, generation, now)
+        if user is not None:
+            return user
+
+        user = self._load(key)
+        if user is None:
+            return None
+
+        other_key = ('phone', user.phone_number) if key[0] == 'id' else ('id', user.id)
+        # Invalidations bump both keys under this lock, so reading both here
+        # tells us whether the row could have changed since we read it
+        with self._generation_lock:
+            current = self._generations[slot]
+            other_generation = self._generations[self._slot(other_key)]
+        if current == generation:
+            self._store(key, user, now, generation)
+            self._store(other_key, user, now, other_generation)
+        return user
+
+    def peek(self, user_id=None, phone_number=None):
+        """The cached CachedUser for this id (or phone number), or None on a miss; never reads the database"""
+        if not self.enabled:
+            return None
+        key = ('id', user_id) if user_id is not None else ('phone', phone_number)
+        return self._lookup(key, self._generations[self._slot(key)], time.monotonic())
+
+    def _lookup(self, key, generation, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, expires_at, entry_generation = entry
+                if expires_at >= now and entry_generation == generation:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return user
+                del self._entries[key]
+                self._counters['expirations'] += 1
+            self._counters['misses'] += 1
+        return None
+
+    def _store(self, key, user, now, generation):
+        with self._lock:
+            self._entries[key] = (user, now + self.ttl, generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    @staticmethod
+    def _load(key):
+        kind, value = key
+        query = User.query.filter_by(id=value) if kind == 'id' else User.query.filter_by(phone_number=value)
+        row = query.first()
+        if row is None:
+            return None
+        return CachedUser(*(getattr(row, field) for field in CachedUser._fields))
+
+    def invalidate(self, user_id=None, phone_number=None):
+        """Drop a user from this and (in shared mode) every other process's cache"""
+        if self._generations is None:
+            return
+        keys = [key for key in (('id', user_id), ('phone', phone_number)) if key[1] is not None]
+        with self._generation_lock:
+            for key in keys:
+                self._generations[self._slot(key)] += 1
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._counters['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['shared'] = self.shared
+        return stats
+
+
+user_cache = UserCache()
@@ -1,18 +1,79 @@
 from app.models import User
 from app.extensions import db
+from app.services.candidate_index import candidate_index
+from app.services.match_scorer import match_scorer
+from app.services.user_stats_service import UserStatsService
+from app.utils.serializers import user_load_options
+from app.services.user_cache import user_cache
+from app.utils.sql import upsert_insert
 from datetime import datetime
 
 class UserService:
+    @staticmethod
+    def profile_changed(user):
+        """Refresh derived state after a user row was created or updated"""
+        user_cache.invalidate(user.id, user.phone_number)
+        candidate_index.upsert(user)
+        match_scorer.upsert(user)
+
+    @staticmethod
+    def find_user(user_id=None, phone_number=None, fields=None):
+        """
+        Read-only CachedUser snapshot by id or phone number, or None.
+
+        Served from the user cache; use get_user/get_user_by_phone when an
+        ORM object is needed for writing. With fields, a cache miss loads
+        only those columns (and updated_at) without filling the cache, and
+        only those may be read from the result.
+        """
+        if fields is None:
+            return user_cache.get(user_id=user_id, phone_number=phone_number)
+        user = user_cache.peek(user_id=user_id, phone_number=phone_number)
+        if user is not None:
+            return user
+        fields = tuple(fields) + ('updated_at',)
+        if user_id is not None:
+            return UserService.get_user(user_id, fields)
+        return UserService.get_user_by_phone(phone_number, fields)
+
+    @staticmethod
+    def ids_by_phone(phone_numbers):
+        """Map phone numbers to user ids with a single IN query"""
+        phone_numbers = [phone for phone in phone_numbers if phone]
+        if not phone_numbers:
+            return {}
+        rows = db.session.query(User.phone_number, User.id).filter(User.phone_number.in_(phone_numbers))
+        return dict(rows.all())
+
+    @staticmethod
+    def insert_users(rows):
+        """
+        Insert users in one INSERT ... ON CONFLICT (phone_number) DO NOTHING
+        RETURNING statement and commit.
+
+        Returns the users actually created; rows whose phone number already
+        exists (including ones inserted concurrently) are skipped rather than
+        raising a unique-constraint error.
+        """
+        if not rows:
+            return []
+        statement = upsert_insert(User).on_conflict_do_nothing(
+            index_elements=['phone_number']
+        ).returning(User)
+        created = db.session.scalars(statement, rows).all()
+        UserStatsService.record(added=[UserStatsService.snapshot(user) for user in created])
+        db.session.commit()
+        for user in created:
+            UserService.profile_changed(user)
+        return created
+
     @staticmethod
     def create_user(data):
-        """Create a new user or return existing user if phone number exists"""
-        # Check if user with this phone number already exists
-        existing_user = UserService.get_user_by_phone(data['phone_number'])
-        if existing_user:
-            # User already exists, return the existing user
-            return existing_user
-            
-        new_user = User(
+        """
+        Create a new user, or return the existing one if the phone number is
+        already registered. Either way an ORM User is returned.
+        """
+        created = UserService.insert_users([dict(
             phone_number=data['phone_number'],
             username=data.get('username'),
             age=data.get('age'),
@@ -26,10 +87,9 @@ class UserService:
             ethnicity=data.get('ethnicity'),
             self_description=data.get('self_description'),
             registration_status='complete' if UserService._is_complete_profile(data) else 'incomplete'
-        )
-        db.session.add(new_user)
-        db.session.commit()
-        return new_user
+        )])
+        # An empty result means the phone was already registered
+        return created[0] if created else UserService.get_user_by_phone(data['phone_number'])
 
     @staticmethod
     def _is_complete_profile(data):
@@ -38,18 +98,25 @@ class UserService:
         return all(data.get(field) for field in required_fields)
 
     @staticmethod
-    def get_user(user_id):
-        return User.query.get(user_id)
+    def _query(fields=None):
+        """User query loading only the given fields (all of them when None)"""
+        return User.query.options(user_load_options(fields)) if fields else User.query
 
     @staticmethod
-    def get_user_by_phone(phone_number):
+    def get_user(user_id, fields=None):
+        return UserService._query(fields).filter_by(id=user_id).first()
+
+    @staticmethod
+    def get_user_by_phone(phone_number, fields=None):
         """Get user by phone number"""
-        return User.query.filter_by(phone_number=phone_number).first()
+        return UserService._query(fields).filter_by(phone_number=phone_number).first()
 
     @staticmethod
     def update_user(user_id, data):
         user = User.query.get(user_id)
         if user:
+            before = UserStatsService.snapshot(user)
+
             # Update basic fields
             user.username = data.get('username', user.username)
             user.age = data.get('age', user.age)
@@ -74,7 +141,9 @@ class UserService:
             if UserService._is_user_profile_complete(user):
                 user.registration_status = 'Complete'
             
+            UserStatsService.record(added=[UserStatsService.snapshot(user)], removed=[before])
             db.session.commit()
+            UserService.profile_changed(user)
             return user
         return None
 
@@ -95,9 +164,19 @@ class UserService:
         return User.query.filter(User.registration_status != 'Complete').all()
 
     @staticmethod
-    def search_users(criteria):
+    def search_users(criteria, fields=None):
         """Search users based on criteria"""
-        query = User.query.filter_by(registration_status='Complete')
+        query = UserService._query(fields).filter_by(registration_status='Complete')
+        
+        # Narrow to a few indexed candidates; the filters below still apply exactly
+        if candidate_index.enabled and criteria.get('gender') and criteria.get('town'):
+            candidate_ids = candidate_index.candidate_ids(
+                criteria['gender'], criteria['town'], criteria.get('age_min'), criteria.get('age_max')
+            )
+            if not candidate_ids:
+                return []
+            if len(candidate_ids) <= candidate_index.max_ids:
+                query = query.filter(User.id.in_(candidate_ids))
         
         if criteria.get('age_min'):
             query = query.filter(User.age >= criteria['age_min'])
@@ -120,14 +199,5 @@ class UserService:
 
     @staticmethod
     def get_user_stats():
-        """Get user statistics"""
-        total_users = User.query.count()
-        complete_profiles = User.query.filter_by(registration_status='Complete').count()
-        incomplete_profiles = total_users - complete_profiles
-        
-        return {
-            'total_users': total_users,
-            'complete_profiles': complete_profiles,
-            'incomplete_profiles': incomplete_profiles,
-            'completion_rate': (complete_profiles / total_users * 100) if total_users > 0 else 0
-        }
\ No newline at end of file
+        """Get user statistics, read from the incrementally maintained rollup"""
+        return UserStatsService.get_stats()
\ No newline at end of file
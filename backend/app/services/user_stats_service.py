@@ -0,0 +1,151 @@
+import random
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert
+
+from app.extensions import db
+from app.models.user import User
+from app.models.user_stats import UserStatsRollup
+from app.utils.sql import upsert_insert
+
+# Upper bounds (inclusive) of the age bands reported by the stats endpoint
+AGE_BANDS = ((17, 'under 18'), (24, '18-24'), (34, '25-34'), (44, '35-44'), (54, '45-54'))
+OLDEST_BAND = '55+'
+
+DIMENSIONS = ('gender', 'county', 'town', 'age_band')
+
+
+def age_band(age):
+    if age is None:
+        return 'unknown'
+    for upper, label in AGE_BANDS:
+        if age <= upper:
+            return label
+    return OLDEST_BAND
+
+
+def _segment(value):
+    return (value or '').strip().lower()[:50] or 'unknown'
+
+
+class UserStatsService:
+    """
+    Totals and per-segment histograms backed by user_stats_rollup.
+
+    Every user write adjusts the rollup rows of the segments the user left
+    and entered, with one upsert in the same transaction as the write. The
+    upsert goes to one randomly picked shard of USER_STATS_SHARDS, so
+    concurrent registrations do not all queue on the ('all', '') row;
+    get_stats() sums the shards. Reading the stats therefore never touches
+    the users table. rebuild() recomputes the rollup from scratch (`flask
+    rebuild-user-stats`) into shard 0.
+
+    A profile counts as complete when its registration_status is
+    'complete' in any case: create_user writes 'complete', update_user
+    'Complete'.
+    """
+
+    @staticmethod
+    def snapshot(user):
+        """The attributes the rollup depends on, taken before a change"""
+        return (user.gender, user.county, user.town, user.age, user.registration_status)
+
+    @staticmethod
+    def _contributions(snapshot):
+        gender, county, town, age, status = snapshot
+        complete = int((status or '').lower() == 'complete')
+        return complete, [
+            ('all', ''), ('gender', _segment(gender)), ('county', _segment(county)),
+            ('town', _segment(town)), ('age_band', age_band(age)),
+        ]
+
+    @staticmethod
+    def record(added=(), removed=(), session=None):
+        """
+        Add the users in added and subtract those in removed (snapshots)
+        from the rollup. Flushed with the caller's transaction; the caller
+        commits.
+        """
+        deltas = {}
+        for snapshots, sign in ((added, 1), (removed, -1)):
+            for snapshot in snapshots:
+                complete, keys = UserStatsService._contributions(snapshot)
+                for key in keys:
+                    total_delta, complete_delta = deltas.get(key, (0, 0))
+                    deltas[key] = (total_delta + sign, complete_delta + sign * complete)
+
+        # One shard per call, rows in key order: concurrent writers lock in the same order
+        shard = random.randrange(current_app.config.get('USER_STATS_SHARDS', 16))
+        rows = [
+            {'dimension': dimension, 'segment': segment, 'shard': shard, 'total': total, 'complete': complete}
+            for (dimension, segment), (total, complete) in sorted(deltas.items())
+            if total or complete
+        ]
+        if not rows:
+            return
+        session = session or db.session
+        statement = upsert_insert(UserStatsRollup).values(rows)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['dimension', 'segment', 'shard'],
+            set_={
+                'total': UserStatsRollup.total + statement.excluded.total,
+                'complete': UserStatsRollup.complete + statement.excluded.complete,
+            }
+        ))
+
+    @staticmethod
+    def rebuild(session=None):
+        """Recompute the whole rollup from the users table"""
+        session = session or db.session
+        grouped = session.query(
+            User.gender, User.county, User.town, User.age, User.registration_status, func.count()
+        ).group_by(User.gender, User.county, User.town, User.age, User.registration_status)
+
+        totals = {}
+        for *snapshot, count in grouped:
+            complete, keys = UserStatsService._contributions(snapshot)
+            for key in keys:
+                total, complete_total = totals.get(key, (0, 0))
+                totals[key] = (total + count, complete_total + count * complete)
+
+        session.execute(delete(UserStatsRollup))
+        if totals:
+            session.execute(insert(UserStatsRollup), [
+                {'dimension': dimension, 'segment': segment, 'shard': 0, 'total': total, 'complete': complete}
+                for (dimension, segment), (total, complete) in totals.items()
+            ])
+        session.commit()
+
+    @staticmethod
+    def get_stats():
+        """Totals, completion rate and per-dimension histograms"""
+        rows = db.session.query(
+            UserStatsRollup.dimension, UserStatsRollup.segment,
+            func.sum(UserStatsRollup.total).label('total'), func.sum(UserStatsRollup.complete).label('complete'),
+        ).group_by(UserStatsRollup.dimension, UserStatsRollup.segment).all()
+        overall = next((row for row in rows if row.dimension == 'all'), None)
+        total = overall.total if overall else 0
+        complete = overall.complete if overall else 0
+
+        histograms = {dimension: {} for dimension in DIMENSIONS}
+        for row in rows:
+            if row.dimension in histograms and row.total:
+                histograms[row.dimension][row.segment] = {'total': row.total, 'complete': row.complete}
+
+        return {
+            'total_users': total,
+            'complete_profiles': complete,
+            'incomplete_profiles': total - complete,
+            'completion_rate': (complete / total * 100) if total > 0 else 0,
+            'segments': histograms,
+        }
+
+
+@click.command('rebuild-user-stats')
+@with_appcontext
+def rebuild_user_stats_command():
+    """Recompute the user statistics rollup from the users table."""
+    UserStatsService.rebuild()
+    click.echo(f"Rebuilt user stats for {UserStatsService.get_stats()['total_users']} user(s).")
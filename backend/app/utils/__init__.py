@@ -1,2 +1,4 @@
 from .validation import validate_user_data, validate_match_data, validate_message_data
-from .helpers import is_valid_phone_number, format_response
\ No newline at end of file
+from .helpers import is_valid_phone_number, format_response, encode_cursor, decode_cursor, stream_json_array
+from .helpers import version_etag, is_not_modified, set_validators, not_modified, with_weak_etag
+from .serializers import USER_FIELDS, MATCH_FIELDS, parse_fields, user_load_options, serialize_user, json_response
\ No newline at end of file
@@ -1,4 +1,10 @@
+import base64
+import hashlib
+import json
 import re
+from datetime import datetime, timezone
+
+from flask import Response, request
 
 def is_valid_phone_number(phone_number):
     pattern = r'^\+?[1-9]\d{1,14}$'
@@ -8,4 +14,57 @@ def format_response(message, data=None):
     response = {'message': message}
     if data:
         response['data'] = data
-    return response
\ No newline at end of file
+    return response
+
+def encode_cursor(timestamp, row_id):
+    """Opaque keyset cursor for a (timestamp, id) sort key; a NULL timestamp encodes as empty"""
+    raw = f"{timestamp.isoformat() if timestamp is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def stream_json_array(items):
+    """Yield a JSON array chunk by chunk so it never sits in memory whole"""
+    yield '['
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item)
+    yield ']'
+
+def version_etag(*parts):
+    """Strong ETag derived from the values that identify a representation"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+def _http_date(timestamp):
+    # Stored timestamps are naive UTC; HTTP dates have one-second resolution
+    return timestamp.replace(tzinfo=timezone.utc, microsecond=0) if timestamp else None
+
+def is_not_modified(etag, last_modified=None):
+    """Whether the request's If-None-Match / If-Modified-Since already match"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return _http_date(last_modified) <= request.if_modified_since
+    return False
+
+def set_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified and require revalidation on every use"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _http_date(last_modified)
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag, last_modified=None):
+    return set_validators(Response(status=304), etag, last_modified)
+
+def with_weak_etag(response):
+    """Weak ETag over the body, answering 304 when the client already has it"""
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest()[:32], weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -0,0 +1,221 @@
+"""
+Compressed, memory-mappable segment files for archived log rows.
+
+Layout:
+
+    MAGIC | header length (u32) | JSON header
+    block 0 | block 1 | ...          zlib-compressed JSON arrays of rows
+    block index                      one INDEX_ENTRY per block
+    FOOTER
+
+The header names the columns, so a segment written before a column was
+added still reads correctly. Each index entry holds the block's offset,
+length, CRC32, row count and its id and timestamp ranges. A reader maps
+the file, reads the footer and index in place and only decompresses the
+blocks whose timestamp range overlaps the query.
+
+Timestamps are stored as naive UTC datetimes in ISO format inside blocks
+and as epoch microseconds in the index and footer.
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+MAGIC = b'SMSSEG1\n'
+VERSION = 1
+HEADER_LENGTH = struct.Struct('<I')
+# first_id, last_id, min_ts, max_ts, offset, length, rows, crc32
+INDEX_ENTRY = struct.Struct('<qqqqQIII')
+# index_offset, rows, blocks, version, min_ts, max_ts, magic
+FOOTER = struct.Struct('<QQIIqq8s')
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_TS = (2 ** 63 - 1, -2 ** 63)
+
+
+class SegmentError(Exception):
+    """A segment file is truncated, corrupt or of an unknown version"""
+
+
+def to_micros(value):
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_micros(value):
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class SegmentWriter:
+    """
+    Streams rows (tuples in header['columns'] order) into a segment file.
+
+    The file is written under a temporary name and linked into place by
+    close(), so a segment either exists complete or not at all. An existing
+    segment is never replaced: opening or closing a writer for a path that
+    exists raises SegmentError.
+    """
+
+    def __init__(self, path, columns, id_column='id', ts_column='sent_date', block_rows=4096, meta=None):
+        self.path = path
+        self.columns = list(columns)
+        self.block_rows = block_rows
+        self.rows = 0
+        self._id = self.columns.index(id_column)
+        self._ts = self.columns.index(ts_column)
+        self._block = []
+        self._index = []
+        self._span = _NO_TS
+        self._tmp = f'{path}.tmp'
+        if os.path.exists(path):
+            raise SegmentError(f'{path} already exists')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(self._tmp, 'wb')
+        header = json.dumps({
+            'version': VERSION, 'columns': self.columns, 'id_column': id_column, 'ts_column': ts_column,
+            'created_at': datetime.utcnow().isoformat(), **(meta or {}),
+        }).encode()
+        self._file.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+
+    def add(self, row):
+        self._block.append(row)
+        if len(self._block) >= self.block_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._block:
+            return
+        ids = [row[self._id] for row in self._block]
+        stamps = [to_micros(row[self._ts]) for row in self._block]
+        payload = zlib.compress(json.dumps([[_encode(value) for value in row] for row in self._block]).encode())
+        self._index.append(INDEX_ENTRY.pack(
+            min(ids), max(ids), min(stamps), max(stamps),
+            self._file.tell(), len(payload), len(self._block), zlib.crc32(payload),
+        ))
+        self._file.write(payload)
+        self._span = (min(self._span[0], min(stamps)), max(self._span[1], max(stamps)))
+        self.rows += len(self._block)
+        self._block = []
+
+    def close(self):
+        self._flush()
+        index_offset = self._file.tell()
+        self._file.write(b''.join(self._index))
+        span = self._span if self.rows else (0, 0)
+        self._file.write(FOOTER.pack(index_offset, self.rows, len(self._index), VERSION, span[0], span[1], MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        try:
+            # Unlike os.replace, fails if a segment appeared at path meanwhile
+            os.link(self._tmp, self.path)
+        except FileExistsError:
+            raise SegmentError(f'{self.path} already exists') from None
+        finally:
+            os.remove(self._tmp)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SegmentReader:
+    """
+    Memory-mapped read access to one segment file.
+
+        with SegmentReader(path) as segment:
+            for row in segment.scan(start, end):
+                ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except (struct.error, ValueError) as e:
+            self.close()
+            raise SegmentError(f'{path}: {e}') from e
+
+    def _parse(self):
+        if len(self._map) < len(MAGIC) + HEADER_LENGTH.size + FOOTER.size or self._map[:len(MAGIC)] != MAGIC:
+            raise SegmentError(f'{self.path}: not a segment file')
+        index_offset, self.rows, blocks, version, min_ts, max_ts, magic = FOOTER.unpack_from(
+            self._map, len(self._map) - FOOTER.size
+        )
+        if magic != MAGIC:
+            raise SegmentError(f'{self.path}: truncated segment')
+        if version != VERSION:
+            raise SegmentError(f'{self.path}: unsupported segment version {version}')
+        (length,) = HEADER_LENGTH.unpack_from(self._map, len(MAGIC))
+        start = len(MAGIC) + HEADER_LENGTH.size
+        self.header = json.loads(self._map[start:start + length])
+        self.columns = self.header['columns']
+        self.min_ts = from_micros(min_ts) if self.rows else None
+        self.max_ts = from_micros(max_ts) if self.rows else None
+        self._ts = self.columns.index(self.header['ts_column'])
+        self._index = list(INDEX_ENTRY.iter_unpack(
+            memoryview(self._map)[index_offset:index_offset + blocks * INDEX_ENTRY.size]
+        ))
+
+    def overlaps(self, start=None, end=None):
+        """Whether any row may fall in [start, end)"""
+        if not self.rows:
+            return False
+        return (start is None or self.max_ts >= start) and (end is None or self.min_ts < end)
+
+    def _block(self, entry):
+        offset, length, crc = entry[4], entry[5], entry[7]
+        payload = self._map[offset:offset + length]
+        if zlib.crc32(payload) != crc:
+            raise SegmentError(f'{self.path}: checksum mismatch in block at {offset}')
+        return json.loads(zlib.decompress(payload))
+
+    def scan(self, start=None, end=None, predicate=None):
+        """Yield rows as dicts with sent_date in [start, end), oldest blocks first"""
+        low = to_micros(start) if start is not None else None
+        high = to_micros(end) if end is not None else None
+        for entry in self._index:
+            if (low is not None and entry[3] < low) or (high is not None and entry[2] >= high):
+                continue
+            for values in self._block(entry):
+                row = dict(zip(self.columns, values))
+                stamp = row[self.columns[self._ts]] = datetime.fromisoformat(values[self._ts])
+                if (start is not None and stamp < start) or (end is not None and stamp >= end):
+                    continue
+                if predicate is None or predicate(row):
+                    yield row
+
+    def verify(self):
+        """Check every block checksum and row count; returns the number of rows"""
+        rows = sum(len(self._block(entry)) for entry in self._index)
+        if rows != self.rows or sum(entry[6] for entry in self._index) != rows:
+            raise SegmentError(f'{self.path}: row count mismatch')
+        return rows
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
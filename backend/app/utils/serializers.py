@@ -0,0 +1,51 @@
+import json
+
+from flask import Response
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import BadRequest
+
+from app.models.user import User
+
+# Every field a user payload can contain, in response order
+USER_FIELDS = (
+    'id', 'phone_number', 'username', 'age', 'gender', 'county', 'town',
+    'education_level', 'profession', 'marital_status', 'religion', 'ethnicity',
+    'self_description', 'registration_status',
+)
+
+# Fields returned by match listings unless ?fields= asks for others
+MATCH_FIELDS = (
+    'username', 'age', 'town', 'phone_number', 'education_level', 'profession',
+    'marital_status', 'religion', 'ethnicity', 'self_description',
+)
+
+
+def parse_fields(raw, default=USER_FIELDS):
+    """
+    Turn a comma-separated ?fields= value into a tuple of user fields.
+
+    Falls back to default when raw is empty; raises BadRequest on fields
+    that do not exist.
+    """
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in USER_FIELDS]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}. Must be from: {', '.join(USER_FIELDS)}")
+    return fields or default
+
+
+def user_load_options(fields):
+    """load_only option restricting a User query to the given fields"""
+    return load_only(*(getattr(User, field) for field in fields if field != 'id'))
+
+
+def serialize_user(user, fields=USER_FIELDS):
+    return {field: getattr(user, field) for field in fields}
+
+
+def json_response(payload, status=200):
+    """Compact JSON response without the key sorting jsonify does"""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    return Response(body, status=status, mimetype='application/json')
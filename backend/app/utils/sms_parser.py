@@ -73,6 +73,66 @@ class SMSParser:
         'religion': r'RELIGION[:\s]+([^,\n]+)',
     }
     
+    # Leading keyword of a message - every command pattern starts with one
+    _KEYWORD_RE = re.compile(r'[A-Z]+|\?')
+    
+    # Compiled dispatch tables, built lazily from the pattern dicts above
+    _dispatch = None
+    _registration_fields = None
+    _search_fields = None
+    
+    @classmethod
+    def _build_dispatch(cls) -> Dict[str, Tuple[str, "re.Pattern"]]:
+        """Map every command keyword to its command name and compiled pattern"""
+        dispatch = {}
+        for command_name, pattern in cls.COMMAND_PATTERNS.items():
+            compiled = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+            keywords = re.match(r'^\^\(([^)]*)\)', pattern).group(1)
+            for keyword in keywords.split('|'):
+                dispatch.setdefault(keyword.replace('\\', ''), (command_name, compiled))
+        return dispatch
+    
+    @staticmethod
+    def _build_field_regex(patterns: Dict[str, str]) -> Tuple["re.Pattern", Dict[str, int]]:
+        """
+        Combine field patterns into a single regex scanned once per message.
+        
+        Each field is wrapped in a named group inside a lookahead, so fields
+        whose values overlap (e.g. NAME:JOHN AGE 25) are still all found, just
+        like separate re.search calls would find them.
+        
+        Returns:
+            The combined pattern and a map of field name -> outer group index
+        """
+        alternatives = []
+        offsets = {}
+        group_index = 1
+        for field, pattern in patterns.items():
+            alternatives.append(f'(?P<{field}>{pattern})')
+            offsets[field] = group_index
+            group_index += 1 + re.compile(pattern).groups
+        combined = re.compile('(?=' + '|'.join(alternatives) + ')', re.IGNORECASE)
+        return combined, offsets
+    
+    @classmethod
+    def _compile(cls):
+        if cls._dispatch is None:
+            cls._registration_fields = cls._build_field_regex(cls.REGISTRATION_PATTERNS)
+            cls._search_fields = cls._build_field_regex(cls.SEARCH_PATTERNS)
+            cls._dispatch = cls._build_dispatch()
+        return cls._dispatch
+    
+    @staticmethod
+    def _scan_fields(compiled: Tuple["re.Pattern", Dict[str, int]], text: str) -> Dict[str, re.Match]:
+        """Return the first match of every field found in text, in pattern order"""
+        regex, offsets = compiled
+        found = {}
+        for match in regex.finditer(text):
+            found.setdefault(match.lastgroup, match)
+            if len(found) == len(offsets):
+                break
+        return {field: found[field] for field in offsets if field in found}
+    
     @classmethod
     def parse_sms(cls, message: str, sender_phone: str = "") -> SMSCommand:
         """
@@ -87,11 +147,15 @@ class SMSParser:
         """
         message = message.strip().upper()
         
-        # Try to match against known command patterns
-        for command_name, pattern in cls.COMMAND_PATTERNS.items():
-            match = re.match(pattern, message, re.IGNORECASE | re.MULTILINE)
-            if match:
-                return cls._parse_command(command_name, match, message, sender_phone)
+        # Look up the command by its leading keyword, then run only its pattern
+        keyword = cls._KEYWORD_RE.match(message)
+        if keyword:
+            entry = cls._compile().get(keyword.group())
+            if entry:
+                command_name, pattern = entry
+                match = pattern.match(message)
+                if match:
+                    return cls._parse_command(command_name, match, message, sender_phone)
         
         # If no pattern matches, treat as unknown command
         return SMSCommand(
@@ -136,15 +200,15 @@ class SMSParser:
         parameters = {}
         
         # Extract registration fields
-        for field, pattern in cls.REGISTRATION_PATTERNS.items():
-            field_match = re.search(pattern, registration_data, re.IGNORECASE)
-            if field_match:
-                value = field_match.group(1).strip()
-                if field == 'gender':
-                    value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
-                elif field == 'age':
-                    value = int(value)
-                parameters[field] = value
+        cls._compile()
+        offsets = cls._registration_fields[1]
+        for field, field_match in cls._scan_fields(cls._registration_fields, registration_data).items():
+            value = field_match.group(offsets[field] + 1).strip()
+            if field == 'gender':
+                value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
+            elif field == 'age':
+                value = int(value)
+            parameters[field] = value
         
         return SMSCommand(
             command="REGISTER",
@@ -160,15 +224,15 @@ class SMSParser:
         parameters = {}
         
         # Extract update fields (same as registration)
-        for field, pattern in cls.REGISTRATION_PATTERNS.items():
-            field_match = re.search(pattern, update_data, re.IGNORECASE)
-            if field_match:
-                value = field_match.group(1).strip()
-                if field == 'gender':
-                    value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
-                elif field == 'age':
-                    value = int(value)
-                parameters[field] = value
+        cls._compile()
+        offsets = cls._registration_fields[1]
+        for field, field_match in cls._scan_fields(cls._registration_fields, update_data).items():
+            value = field_match.group(offsets[field] + 1).strip()
+            if field == 'gender':
+                value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
+            elif field == 'age':
+                value = int(value)
+            parameters[field] = value
         
         return SMSCommand(
             command="UPDATE",
@@ -184,17 +248,18 @@ class SMSParser:
         parameters = {}
         
         # Extract search criteria
-        for field, pattern in cls.SEARCH_PATTERNS.items():
-            field_match = re.search(pattern, search_criteria, re.IGNORECASE)
-            if field_match:
-                if field == 'age_range':
-                    parameters['min_age'] = int(field_match.group(1))
-                    parameters['max_age'] = int(field_match.group(2))
-                else:
-                    value = field_match.group(1).strip()
-                    if field == 'gender':
-                        value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
-                    parameters[field] = value
+        cls._compile()
+        offsets = cls._search_fields[1]
+        for field, field_match in cls._scan_fields(cls._search_fields, search_criteria).items():
+            group = offsets[field]
+            if field == 'age_range':
+                parameters['min_age'] = int(field_match.group(group + 1))
+                parameters['max_age'] = int(field_match.group(group + 2))
+            else:
+                value = field_match.group(group + 1).strip()
+                if field == 'gender':
+                    value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
+                parameters[field] = value
         
         return SMSCommand(
             command="SEARCH",
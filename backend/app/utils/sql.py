@@ -0,0 +1,47 @@
+from sqlalchemy import or_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+
+
+def upsert_insert(model):
+    """
+    INSERT construct for the session's database that supports
+    on_conflict_do_nothing / on_conflict_do_update and RETURNING.
+
+    Postgres is the production database; SQLite (3.35+) is used in tests
+    and local runs and accepts the same ON CONFLICT ... RETURNING syntax.
+    Other databases raise RuntimeError.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    if dialect == 'sqlite':
+        return sqlite.insert(model)
+    raise RuntimeError(f'Upserts need a postgresql or sqlite database, not {dialect}')
+
+
+def keyset_order(column, id_column, descending=False):
+    """
+    ORDER BY for (timestamp, id) keyset pagination over a nullable
+    timestamp. NULLs sort as Postgres does by default (last ascending, first
+    descending) on every database, so keyset_after can page past them.
+    """
+    if descending:
+        return column.desc().nulls_first(), id_column.desc()
+    return column.nulls_last(), id_column
+
+
+def keyset_after(column, id_column, after, descending=False):
+    """
+    Filter for the rows that sort after the (timestamp, id) cursor after in
+    keyset_order; the timestamp is None for a row with a NULL one.
+    """
+    timestamp, row_id = after
+    if descending:
+        if timestamp is None:
+            return or_(column.is_(None) & (id_column < row_id), column.is_not(None))
+        return tuple_(column, id_column) < tuple_(timestamp, row_id)
+    if timestamp is None:
+        return column.is_(None) & (id_column > row_id)
+    return or_(tuple_(column, id_column) > tuple_(timestamp, row_id), column.is_(None))
@@ -0,0 +1,413 @@
+"""
+Load test: drive synthetic SMS and API traffic at target rates.
+
+Starts the app (run.py) on a free port, or uses the one at --url, and
+registers --members users with complete profiles through POST /users/,
+checking that MATCH and search then return candidates. It then sends an
+open-loop mix of requests at each --rates step for --duration seconds:
+
+    reg      POST /sms_log/        REG NAME:..., AGE:..., GENDER:..., COUNTY:..., TOWN:...
+    match    POST /sms_log/        MATCH
+    msg      POST /sms_log/        MSG <id> <text>
+    help     POST /sms_log/        HELP
+    yes, no  POST /matches/confirm, /matches/decline
+    search   GET  /matches/?age_min=&age_max=&gender=&town=
+    profile  GET  /users/phone/<phone>
+    signup   POST /users/
+
+The SMS texts follow the grammar of SMSParser.get_help_text() and are
+checked against SMSParser before the run. Requests go out on schedule
+whether or not earlier ones have finished, and latency is measured from
+the scheduled send time, so queueing in an overloaded server shows up in
+the percentiles instead of lowering the offered rate.
+
+Prints throughput, errors and p50/p95/p99 latency per request kind and
+step, and saves them as JSON (default: benchmarks/results/) for
+comparison with --compare.
+
+Usage (from backend/):
+    python -m benchmarks.load_test [--rates 25,50,100,200] [--duration 20]
+    SERVER_MODE=production python -m benchmarks.load_test    # gunicorn workers
+    python -m benchmarks.load_test --url http://localhost:5000 --compare benchmarks/results/<previous>.json
+
+Without DATABASE_URL the started app uses a throwaway SQLite file. With
+--url the server and its database are yours: users are added, not cleaned
+up. The per-sender SMS rate limit applies, so give --members enough users
+for the rates tried (each sends well under SMS_RATE_PER_MINUTE).
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.utils.sms_parser import SMSParser
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND, 'benchmarks', 'results')
+
+DEFAULT_MIX = 'reg=10,match=25,msg=10,help=5,yes=10,no=10,search=10,profile=15,signup=5'
+COUNTIES = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika']
+NAMES = ['Amina', 'Brian', 'Cynthia', 'Dennis', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James']
+MESSAGES = ['Hello there!', 'Hi, how are you?', 'Would love to chat', 'Are you free this weekend?']
+
+KINDS = ('reg', 'match', 'msg', 'help', 'yes', 'no', 'search', 'profile', 'signup')
+
+# Command SMSParser must return for each generated SMS kind
+SMS_COMMANDS = {'reg': 'REGISTER', 'match': 'MATCH', 'msg': 'MESSAGE', 'help': 'HELP'}
+
+
+class Workload:
+    """Builds requests for each kind; registered phones are shared across kinds"""
+
+    def __init__(self, mix, seed=7, phone_prefix='0799'):
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.random = random.Random(seed)
+        self.phone_prefix = phone_prefix
+        self.members = []
+        self._phones = itertools.count()
+        self._messages = itertools.count()
+
+    def new_phone(self):
+        return f'{self.phone_prefix}{next(self._phones):06d}'
+
+    def registration(self, phone):
+        # SMSParser reads each field up to the next comma
+        county = self.random.choice(COUNTIES)
+        return (f'REG NAME:{self.random.choice(NAMES)}, AGE:{self.random.randint(18, 60)}, '
+                f'GENDER:{self.random.choice("MF")}, COUNTY:{county}, TOWN:{county}')
+
+    def profile(self, phone):
+        """POST /users/ body of a complete profile, so it is searchable and scored"""
+        county = self.random.choice(COUNTIES)
+        return {
+            'phone_number': phone, 'username': f'{self.random.choice(NAMES)}_{phone}',
+            'age': self.random.randint(18, 60), 'gender': self.random.choice(['male', 'female']),
+            'county': county.lower(), 'town': county,
+        }
+
+    def sms(self, sender, message):
+        # A fresh message_id so the gateway dedup does not replay earlier responses
+        return {'sender': sender, 'message': message, 'message_id': f'load-{next(self._messages)}'}
+
+    def seed_profiles(self, count):
+        """POST /users/ bodies registering count members"""
+        profiles = [self.profile(self.new_phone()) for _ in range(count)]
+        self.members.extend(profile['phone_number'] for profile in profiles)
+        return profiles
+
+    def next_request(self):
+        """(kind, method, path, body) of the next request in the mix"""
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        member = self.random.choice(self.members)
+        if kind == 'reg':
+            phone = self.new_phone()
+            self.members.append(phone)
+            return kind, 'POST', '/sms_log/', self.sms(phone, self.registration(phone))
+        if kind in ('match', 'msg', 'help'):
+            text = self.sms_text(kind)
+            return kind, 'POST', '/sms_log/', self.sms(member, text)
+        if kind in ('yes', 'no'):
+            path = '/matches/confirm' if kind == 'yes' else '/matches/decline'
+            return kind, 'POST', path, {'from_user': member, 'to_user': self.random.choice(self.members)}
+        if kind == 'search':
+            low = self.random.randint(18, 50)
+            gender = self.random.choice(['male', 'female'])
+            town = self.random.choice(COUNTIES)
+            return kind, 'GET', f'/matches/?age_min={low}&age_max={low + 10}&gender={gender}&town={town}', None
+        if kind == 'profile':
+            return kind, 'GET', f'/users/phone/{member}', None
+        if kind == 'signup':
+            phone = self.new_phone()
+            self.members.append(phone)
+            return kind, 'POST', '/users/', self.profile(phone)
+        raise ValueError(f'Unknown request kind: {kind}')
+
+    def sms_text(self, kind):
+        if kind == 'match':
+            return 'MATCH'
+        if kind == 'msg':
+            return f'MSG {self.random.randint(1, max(1, len(self.members)))} {self.random.choice(MESSAGES)}'
+        return 'HELP'
+
+    def check_grammar(self):
+        """Fail early if SMSParser no longer reads a generated SMS as intended"""
+        for kind, expected in SMS_COMMANDS.items():
+            text = self.registration('0') if kind == 'reg' else self.sms_text(kind)
+            parsed = SMSParser.parse_sms(text, '0')
+            if parsed.command != expected:
+                raise SystemExit(f'{kind}: {text!r} parses as {parsed.command}, expected {expected}; '
+                                 f'update the generator to match SMSParser.get_help_text()')
+            # A field that swallowed the next one means the separators are off
+            if any(':' in str(value) for value in parsed.parameters.values()):
+                raise SystemExit(f'{kind}: {text!r} parses into {parsed.parameters}; '
+                                 f'update the generator to match SMSParser.get_help_text()')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind.strip()!r}; choose from {', '.join(KINDS)}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def fetch(base_url, method, path, body, timeout):
+    """(status, raw body) of one request; status 0 when it got no response (timeout, refused)"""
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return 0, b''
+
+
+def send(base_url, method, path, body, timeout):
+    """Status code of one request; 0 when it got no response"""
+    return fetch(base_url, method, path, body, timeout)[0]
+
+
+def seed(base_url, workload, count, concurrency, timeout):
+    """Register count members and check the hot paths see them as candidates"""
+    profiles = workload.seed_profiles(count)
+    with ThreadPoolExecutor(concurrency) as pool:
+        statuses = list(pool.map(lambda profile: send(base_url, 'POST', '/users/', profile, timeout), profiles))
+    failed = [status for status in statuses if status != 201]
+    if failed:
+        raise SystemExit(f'Seeding members failed: {len(failed)} request(s), statuses {sorted(set(failed))}')
+
+    # Both genders in every town, so any member has candidates
+    profile = profiles[0]
+    status, body = fetch(base_url, 'POST', '/sms_log/', workload.sms(profile['phone_number'], 'MATCH'), timeout)
+    if status != 200 or not json.loads(body).get('matches'):
+        raise SystemExit(f'MATCH for a seeded member returned no candidates ({status}: {body[:200]!r})')
+    query = f"age_min=18&age_max=60&gender={profile['gender']}&town={profile['town']}"
+    status, body = fetch(base_url, 'GET', f'/matches/?{query}', None, timeout)
+    if status != 200 or not json.loads(body):
+        raise SystemExit(f'Search in {profile["town"]} returned no candidates ({status}: {body[:200]!r})')
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples, seconds):
+    """Per kind (and 'all'): requests, errors (5xx or no response), status counts, rate and latency"""
+    groups = {}
+    for kind, status, latency in samples:
+        groups.setdefault(kind, []).append((status, latency))
+        groups.setdefault('all', []).append((status, latency))
+    summary = {}
+    for kind, entries in sorted(groups.items()):
+        latencies = sorted(latency for _, latency in entries)
+        statuses = {}
+        for status, _ in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary[kind] = {
+            'requests': len(entries),
+            'errors': sum(1 for status, _ in entries if status == 0 or status >= 500),
+            'statuses': statuses,
+            'rps': len(entries) / seconds,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': latencies[-1],
+        }
+    return summary
+
+
+def run_step(base_url, workload, rate, duration, concurrency, timeout):
+    """Offer rate requests/s for duration seconds; returns the step summary"""
+    samples = []
+    lock = threading.Lock()
+
+    def fire(kind, method, path, body, scheduled):
+        # Past the step's end plus one timeout the server is hopelessly behind;
+        # count the rest as failed rather than draining the backlog
+        status = send(base_url, method, path, body, timeout) if time.perf_counter() < deadline else 0
+        latency = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            samples.append((kind, status, latency))
+
+    total = int(rate * duration)
+    started = time.perf_counter()
+    deadline = started + duration + timeout
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index in range(total):
+            scheduled = started + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, *workload.next_request(), scheduled)
+    elapsed = time.perf_counter() - started
+    summary = summarize(samples, elapsed)
+    return {'target_rps': rate, 'seconds': elapsed, 'endpoints': summary}
+
+
+def saturated(step, max_error_rate, max_p99_ms):
+    overall = step['endpoints']['all']
+    return (overall['rps'] < 0.95 * step['target_rps']
+            or overall['errors'] > max_error_rate * overall['requests']
+            or overall['p99_ms'] > max_p99_ms)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(port, startup_timeout=60):
+    """run.py in a subprocess, with the schema created on start; SERVER_MODE passes through"""
+    env = dict(os.environ, PORT=str(port), SCHEMA_AUTO_CREATE='true')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load_test.db'))
+    server = subprocess.Popen([sys.executable, 'run.py'], cwd=BACKEND, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'The app exited during startup with status {server.returncode}')
+        if send(f'http://127.0.0.1:{port}', 'GET', '/users/stats', None, timeout=1):
+            return server, env['DATABASE_URL']
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('The app did not start in time')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _ms(value):
+    return f'{value:8.1f}' if value is not None else '       -'
+
+
+def print_step(step):
+    print(f"\ntarget {step['target_rps']:g} req/s for {step['seconds']:.1f}s")
+    print(f"  {'kind':<8} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for kind, row in step['endpoints'].items():
+        statuses = ' '.join(f'{status}:{count}' for status, count in sorted(row['statuses'].items()))
+        print(f"  {kind:<8} {row['requests']:>8} {row['rps']:>8.1f} {row['errors']:>7} "
+              f"{_ms(row['p50_ms'])} {_ms(row['p95_ms'])} {_ms(row['p99_ms'])}  {statuses}")
+
+
+def compare(previous, current):
+    """Print req/s and p95 changes per step and kind against an earlier result file"""
+    print(f"\ncompared with {previous['commit']} ({previous['started_at']}):")
+    old_steps = {step['target_rps']: step for step in previous['steps']}
+    for step in current['steps']:
+        old = old_steps.get(step['target_rps'])
+        if old is None:
+            continue
+        print(f"  target {step['target_rps']:g} req/s")
+        for kind, row in step['endpoints'].items():
+            before = old['endpoints'].get(kind)
+            if before is None or not before['p95_ms']:
+                continue
+            change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            print(f"    {kind:<8} req/s {before['rps']:8.1f} -> {row['rps']:8.1f}   "
+                  f"p95 {before['p95_ms']:8.1f} -> {row['p95_ms']:8.1f} ms ({change:+.0f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='app to test (default: start run.py on a free port)')
+    parser.add_argument('--rates', default='25,50,100', help='offered req/s per step, comma separated')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per step')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds at the first rate, not recorded')
+    parser.add_argument('--members', type=int, default=2000, help='users registered before the run')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='request kinds and weights')
+    parser.add_argument('--concurrency', type=int, default=64, help='requests in flight at most')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds before a request counts as failed')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--max-p99-ms', type=float, default=1000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/load_test-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    args = parser.parse_args(argv)
+
+    rates = [float(rate) for rate in args.rates.split(',')]
+    # Distinct phone prefixes per run, so repeated runs against --url register new members
+    workload = Workload(args.mix, seed=args.seed, phone_prefix=f'07{int(time.time()) % 100:02d}')
+    workload.check_grammar()
+
+    server, database = None, os.environ.get('DATABASE_URL', '(the server\'s)')
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        port = free_port()
+        server, database = start_server(port)
+        base_url = f'http://127.0.0.1:{port}'
+
+    try:
+        started = time.perf_counter()
+        seed(base_url, workload, args.members, args.concurrency, args.timeout)
+        print(f'{args.members} members registered in {time.perf_counter() - started:.1f}s')
+
+        if args.warmup:
+            run_step(base_url, workload, rates[0], args.warmup, args.concurrency, args.timeout)
+
+        result = {
+            'commit': git_commit(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'url': args.url or 'run.py',
+            'server_mode': os.environ.get('SERVER_MODE', 'development') if not args.url else None,
+            'database': database.split('@')[-1],
+            'members': args.members,
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'steps': [],
+            'saturation_rps': None,
+        }
+        for rate in rates:
+            step = run_step(base_url, workload, rate, args.duration, args.concurrency, args.timeout)
+            result['steps'].append(step)
+            print_step(step)
+            if saturated(step, args.max_error_rate, args.max_p99_ms):
+                result['saturation_rps'] = rate
+                print(f'\nsaturated at {rate:g} req/s (achieved {step["endpoints"]["all"]["rps"]:.1f} req/s); '
+                      f'stopping')
+                break
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_test-{result['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as target:
+        json.dump(result, target, indent=2)
+    print(f'\nresults saved to {output}')
+
+    if args.compare:
+        with open(args.compare) as source:
+            compare(json.load(source), result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Match scoring benchmark.
+
+Loads a synthetic population into MatchScorer, checks its top-k against a
+full sort of the same scores, and times top_matches() for random
+requesters next to a per-row Python scorer (timed on a sample and scaled
+up to the full population).
+
+Usage (from backend/):
+    python -m benchmarks.match_scoring_bench [--users 1000000] [--requests 200] [--k 3]
+
+No database is needed.
+"""
+import argparse
+import random
+import statistics
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from app.services.match_scorer import MatchScorer, _gender_code
+
+Profile = namedtuple('Profile', 'id age gender registration_status county town religion education_level marital_status')
+
+COUNTIES = [f'county{i}' for i in range(47)]
+RELIGIONS = ['christian', 'muslim', 'hindu', 'other', None]
+EDUCATION = ['primary', 'secondary', 'diploma', 'degree', 'masters', None]
+MARITAL = ['single', 'divorced', 'widowed', None]
+
+
+def population(size, seed=1):
+    rng = random.Random(seed)
+    # A few big towns hold most people, as in production
+    town_weights = [1 / (rank + 1) for rank in range(400)]
+    town_picks = rng.choices(range(400), weights=town_weights, k=size)
+    for user_id, town in enumerate(town_picks, start=1):
+        yield Profile(
+            user_id, rng.randint(18, 70), rng.choice('MF'), 'complete',
+            COUNTIES[town % len(COUNTIES)], f'town{town}', rng.choice(RELIGIONS),
+            rng.choice(EDUCATION), rng.choice(MARITAL),
+        )
+
+
+def python_score(scorer, requester, profiles):
+    """Reference per-row scorer, the way it would be written without arrays"""
+    weights = scorer.weights
+    pairs = (('county', 'county'), ('town', 'town'), ('religion', 'religion'),
+             ('education', 'education_level'), ('marital', 'marital_status'))
+    gender = _gender_code(requester.gender)
+    results = []
+    for profile in profiles:
+        if profile.id == requester.id or _gender_code(profile.gender) == gender:
+            continue
+        score = sum(weights[name] for name, field in pairs
+                    if getattr(requester, field) and getattr(profile, field) == getattr(requester, field))
+        score += weights['age'] * max(0, 1 - abs(profile.age - requester.age) / scorer.age_span)
+        results.append((-score, profile.id))
+    results.sort()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--sample', type=int, default=50_000, help='rows scored by the per-row baseline')
+    args = parser.parse_args(argv)
+
+    scorer = MatchScorer()
+    scorer.enabled = True
+    started = time.perf_counter()
+    profiles = list(population(args.users))
+    scorer.load(profiles)
+    load_seconds = time.perf_counter() - started
+    # Synthetic data is complete; never try to refresh it from a database
+    scorer._synced_at = datetime.utcnow()
+    scorer.refresh_interval = float('inf')
+
+    rng = random.Random(2)
+    requesters = [profiles[rng.randrange(len(profiles))] for _ in range(args.requests)]
+
+    for requester in requesters[:20]:
+        expected_scores, columns = scorer.score(requester)
+        order = np.lexsort((columns['id'], -expected_scores))[:args.k]
+        expected = [int(columns['id'][i]) for i in order if np.isfinite(expected_scores[i])]
+        got = [user_id for user_id, _ in scorer.top_matches(requester, k=args.k)]
+        assert got == expected, (requester.id, got, expected)
+
+    sample = profiles[:args.sample]
+    sample_scorer = _sample_scorer(scorer, sample)
+    for requester in requesters[:5]:
+        baseline = [user_id for _, user_id in python_score(scorer, requester, sample)[:args.k]]
+        got = [user_id for user_id, _ in sample_scorer.top_matches(requester, k=args.k)]
+        assert got == baseline, (requester.id, got, baseline)
+
+    timings = []
+    for requester in requesters:
+        started = time.perf_counter()
+        scorer.top_matches(requester, k=args.k)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    started = time.perf_counter()
+    for requester in requesters[:3]:
+        python_score(scorer, requester, sample)
+    python_ms = (time.perf_counter() - started) * 1000 / 3 * len(profiles) / len(sample)
+
+    print(f'population:        {len(profiles):,} profiles, loaded in {load_seconds:.1f}s')
+    print(f'vectorized top-{args.k}:   p50 {statistics.median(timings):.1f} ms, '
+          f'p99 {timings[int(len(timings) * 0.99) - 1]:.1f} ms over {len(timings)} requests')
+    print(f'per-row python:    ~{python_ms:,.0f} ms per request (scaled from {len(sample):,} rows)')
+    print(f'speedup:           ~{python_ms / statistics.median(timings):.0f}x')
+
+
+def _sample_scorer(scorer, sample):
+    sampled = MatchScorer()
+    sampled.enabled = True
+    sampled.weights, sampled.age_span = scorer.weights, scorer.age_span
+    sampled.load(sample)
+    sampled._synced_at = datetime.utcnow()
+    sampled.refresh_interval = float('inf')
+    return sampled
+
+
+if __name__ == '__main__':
+    main()
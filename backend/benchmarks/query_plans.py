@@ -0,0 +1,149 @@
+"""
+Query-plan regression check for the hot read paths.
+
+Seeds a database, applies the migrations and runs EXPLAIN on each service
+query. Exits non-zero if any of them reads a table with a sequential scan
+instead of an index. On Postgres, enable_seqscan is switched off so the
+check fails only when no usable index exists, not because a small seeded
+table happens to be cheaper to scan.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans [--users N]
+
+Without DATABASE_URL a throwaway SQLite file is used.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.migrations import init_db  # noqa: E402
+from app.models import User, Match, Message, Notification, SMSLog  # noqa: E402
+from app.routes.match_routes import _search_query  # noqa: E402
+from app.services import MatchService, MessageService  # noqa: E402
+from app.services.candidate_index import candidate_index  # noqa: E402
+
+TOWNS = ['Nairobi', 'Kisumu', 'Mombasa', 'Nakuru', 'Eldoret', 'Thika']
+
+
+def seed(users):
+    """Insert a synthetic population if the users table is empty"""
+    if db.session.query(User.id).first() is not None:
+        return
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    phones = [f'07{index:08d}' for index in range(users)]
+    db.session.execute(insert(User), [{
+        'phone_number': phone,
+        'username': f'user{index}',
+        'age': rng.randint(18, 70),
+        'gender': rng.choice(['male', 'female', 'Female', 'Male']),
+        'county': 'nairobi',
+        'town': rng.choice(TOWNS),
+        'registration_status': rng.choice(['complete', 'Complete', 'incomplete']),
+    } for index, phone in enumerate(phones)])
+    db.session.execute(insert(Message), [{
+        'sender_phone': rng.choice(phones),
+        'receiver_phone': rng.choice(phones),
+        'message_text': 'hello',
+        'sent_at': now - timedelta(minutes=index),
+    } for index in range(users * 5)])
+    pairs = {(rng.randint(1, users), rng.randint(1, users)) for _ in range(users * 2)}
+    db.session.execute(insert(Match), [{
+        'user_id': user_id, 'matched_user_id': matched_id, 'match_date': now, 'status': 'pending'
+    } for user_id, matched_id in pairs if user_id != matched_id])
+    db.session.execute(insert(Notification), [{
+        'requester_phone': rng.choice(phones), 'requested_phone': rng.choice(phones), 'created_at': now
+    } for _ in range(users * 2)])
+    db.session.execute(insert(SMSLog), [{
+        'from_number': rng.choice(phones), 'to_number': 'PENZI', 'message_type': 'INCOMING',
+        'message_content': 'MATCH', 'sent_date': now - timedelta(minutes=index),
+    } for index in range(users * 5)])
+    db.session.commit()
+
+
+def hot_queries():
+    """Name -> ORM query for every hot read path"""
+    now = datetime.utcnow()
+    # The candidate index only adds a primary-key IN filter; check the base plan
+    candidate_index.enabled = False
+    return {
+        'messages by phone': MessageService.messages_query('0700000001').limit(50),
+        'messages by phone after cursor': MessageService.messages_query('0700000001', after=(now, 10)).limit(50),
+        'matches by user': MatchService.matches_query(1).limit(50),
+        'match search': _search_query(20, 30, 'Nairobi', 'female'),
+        'user by phone': User.query.filter_by(phone_number='0700000001'),
+        'latest notification': Notification.query.filter_by(
+            requested_phone='0700000001').order_by(Notification.created_at.desc()).limit(1),
+        'sms_log time range': SMSLog.query.filter(
+            SMSLog.sent_date >= now - timedelta(hours=1), SMSLog.sent_date < now),
+    }
+
+
+def _compile(query, dialect):
+    compiled = query.statement.compile(dialect=dialect)
+    if compiled.positional:
+        return compiled.string, tuple(compiled.params[name] for name in compiled.positiontup)
+    return compiled.string, compiled.params
+
+
+def sequential_scans(query):
+    """Tables the query plan reads with a full scan"""
+    connection = db.session.connection()
+    sql, params = _compile(query, connection.dialect)
+
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET enable_seqscan = off')
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql, params).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        scans = []
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan':
+                scans.append(node.get('Relation Name'))
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return scans
+
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    return [
+        match.group(1) for match in
+        (re.match(r'SCAN (\w+)$', row[-1]) for row in rows) if match
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000, help='users to seed into an empty database')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    failures = 0
+    with app.app_context():
+        init_db(echo=lambda message: None)
+        seed(args.users)
+        for name, query in hot_queries().items():
+            scans = sequential_scans(query)
+            status = 'FAIL' if scans else 'ok'
+            detail = f" (sequential scan on {', '.join(scans)})" if scans else ''
+            print(f'{status:>4}  {name}{detail}')
+            failures += bool(scans)
+        db.session.rollback()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Microbenchmark and equivalence check for SMSParser.parse_sms.
+
+Runs every message in the corpus through both the keyword dispatcher and the
+original sequential parser (kept below as the reference), fails loudly on
+the first divergence, then times both.
+
+Usage (from backend/):
+    python -m benchmarks.sms_parser_bench [--iterations N]
+"""
+import argparse
+import random
+import re
+import sys
+import timeit
+
+from app.utils.sms_parser import SMSCommand, SMSParser
+
+
+def legacy_parse_sms(message, sender_phone=""):
+    """The pre-dispatcher parser: try every command pattern, then every field pattern"""
+    message = message.strip().upper()
+    for command_name, pattern in SMSParser.COMMAND_PATTERNS.items():
+        match = re.match(pattern, message, re.IGNORECASE | re.MULTILINE)
+        if match:
+            break
+    else:
+        return SMSCommand(
+            command="UNKNOWN",
+            raw_message=message,
+            sender_phone=sender_phone,
+            parameters={"error": "Unknown command format"}
+        )
+
+    parameters = {}
+    if command_name in ("REGISTER", "UPDATE"):
+        for field, pattern in SMSParser.REGISTRATION_PATTERNS.items():
+            field_match = re.search(pattern, match.group(2), re.IGNORECASE)
+            if field_match:
+                value = field_match.group(1).strip()
+                if field == 'gender':
+                    value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
+                elif field == 'age':
+                    value = int(value)
+                parameters[field] = value
+    elif command_name == "SEARCH":
+        for field, pattern in SMSParser.SEARCH_PATTERNS.items():
+            field_match = re.search(pattern, match.group(2), re.IGNORECASE)
+            if field_match:
+                if field == 'age_range':
+                    parameters['min_age'] = int(field_match.group(1))
+                    parameters['max_age'] = int(field_match.group(2))
+                else:
+                    value = field_match.group(1).strip()
+                    if field == 'gender':
+                        value = 'M' if value.upper() in ['M', 'MALE'] else 'F'
+                    parameters[field] = value
+    elif command_name == "MESSAGE":
+        parameters = {"recipient_id": int(match.group(2)), "message_text": match.group(3)}
+    elif command_name == "REPLY":
+        parameters = {"message_id": int(match.group(2)), "reply_text": match.group(3)}
+    elif command_name in ("ACCEPT", "REJECT"):
+        parameters = {"match_id": int(match.group(2))}
+    elif command_name == "PROFILE" and match.group(2):
+        parameters = {"user_id": int(match.group(2))}
+    elif command_name == "MATCH" and match.group(2):
+        parameters = {"target_user_id": int(match.group(2))}
+
+    return SMSCommand(
+        command=command_name,
+        parameters=parameters,
+        raw_message=message,
+        sender_phone=sender_phone
+    )
+
+
+# Hand-written cases covering every command, its aliases and the odd corners
+# of the original patterns (no-space numeric suffixes, multi-line bodies,
+# overlapping field values, near-miss keywords).
+CORPUS = [
+    "REG NAME:John AGE:25 GENDER:M COUNTY:Nairobi TOWN:Westlands",
+    "register name: Mary Wanjiku, age: 31, gender: female, county: Kisumu, town: Kondele",
+    "reg NAME:Ann, AGE:22, GENDER:FEMALE, EDUCATION:Diploma, PROFESSION:Nurse, RELIGION:Christian, MARITAL:Single",
+    "REG NAME: JOHN AGE 25, GENDER MALE",
+    "REG NAME:TOWNSEND TOWN:THIKA",
+    "REG AGE:abc NAME:X",
+    "REG\nNAME:John\nAGE:25",
+    "REG",
+    "REGISTER",
+    "REGISTERX NAME:John",
+    "UPDATE AGE:30 TOWN:Ruiru",
+    "edit marital: divorced, religion: muslim",
+    "PROFILE",
+    "profile 123",
+    "PROF42",
+    "PROFILE abc",
+    "SEARCH AGE:20-30 GENDER:F COUNTY:Nairobi",
+    "find age 18-99, town: Nakuru, education: degree",
+    "SEARCH GENDER:MALE AGE:25",
+    "MATCH",
+    "m",
+    "M 77",
+    "MATCH123",
+    "MATCHES",
+    "ACCEPT 456",
+    "yes 1",
+    "Y 9",
+    "YES",
+    "REJECT 456",
+    "no 2",
+    "N 3",
+    "MSG 123 Hello there!",
+    "message 5 how are you?",
+    "MSG 123",
+    "MSG5 hi",
+    "REPLY 789 Thanks for the message",
+    "r 1 ok",
+    "HELP",
+    "h",
+    "?",
+    "??",
+    "HELP ME",
+    "HELP\nMORE",
+    "STOP",
+    "quit",
+    "EXIT",
+    "STATUS",
+    "stat",
+    "MENU",
+    "main",
+    "BACK",
+    "b",
+    "   match   4   ",
+    "",
+    "   ",
+    "hello penzi",
+    "1234",
+    "#start",
+    "start#Mary#24#female#Nairobi#CBD#0712345678",
+]
+
+_TOKENS = [
+    "REG", "REGISTER", "UPDATE", "EDIT", "PROFILE", "PROF", "SEARCH", "FIND", "MATCH",
+    "M", "ACCEPT", "YES", "Y", "REJECT", "NO", "N", "MSG", "MESSAGE", "REPLY", "R",
+    "HELP", "H", "?", "STOP", "QUIT", "EXIT", "STATUS", "STAT", "MENU", "MAIN", "BACK",
+    "B", "NAME:", "AGE:", "GENDER:", "COUNTY", "TOWN:", "EDUCATION", "PROFESSION:",
+    "RELIGION", "MARITAL:", "MALE", "F", "25", "20-30", "Nairobi", ",", "\n", "x", "12",
+]
+
+
+def fuzz_corpus(count, seed=1234):
+    """Random token soups seeded for reproducibility"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        tokens = rng.choices(_TOKENS, k=rng.randint(1, 10))
+        separators = rng.choices(["", " ", "  ", "\t"], k=len(tokens))
+        messages.append("".join(t + s for t, s in zip(tokens, separators)))
+    return messages
+
+
+def _signature(command):
+    return (command.command, list(command.parameters.items()), command.raw_message, command.sender_phone)
+
+
+def check_equivalence(messages):
+    """Return the first message the two parsers disagree on, or None"""
+    for message in messages:
+        if _signature(SMSParser.parse_sms(message, "0712345678")) != _signature(legacy_parse_sms(message, "0712345678")):
+            return message
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20, help='passes over the corpus per timing run')
+    parser.add_argument('--fuzz', type=int, default=5000, help='number of random messages to add')
+    args = parser.parse_args(argv)
+
+    messages = CORPUS + fuzz_corpus(args.fuzz)
+    mismatch = check_equivalence(messages)
+    if mismatch is not None:
+        print(f"MISMATCH for {mismatch!r}")
+        print(f"  dispatcher: {SMSParser.parse_sms(mismatch, '0712345678')}")
+        print(f"  legacy:     {legacy_parse_sms(mismatch, '0712345678')}")
+        return 1
+    print(f"equivalent on {len(messages)} messages")
+
+    for name, fn in (("legacy", legacy_parse_sms), ("dispatcher", SMSParser.parse_sms)):
+        elapsed = min(timeit.repeat(lambda: [fn(m) for m in messages], number=args.iterations, repeat=3))
+        per_message = elapsed / (args.iterations * len(messages)) * 1e6
+        print(f"{name:>10}: {per_message:.2f} us/message")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreter processes, how long it takes to import the
+app package, build an app with create_app(), run the guarded schema check
+(which creates the schema on an empty database) and serve the first
+request.
+
+Usage (from backend/):
+    python -m benchmarks.startup_bench [--runs N]
+
+Without DATABASE_URL an in-memory SQLite database is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r'''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app_instance = app.create_app()
+created = time.perf_counter()
+with app_instance.app_context():
+    from app.migrations import ensure_schema
+    ensure_schema(echo=lambda message: None)
+schema_ready = time.perf_counter()
+response = app_instance.test_client().post('/sms_log/', json={'sender': '0700000000', 'message': 'HELP'})
+first_request = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'schema_check_ms': (schema_ready - created) * 1000,
+    'first_request_ms': (first_request - schema_ready) * 1000,
+}))
+'''
+
+
+def measure(runs):
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes to measure')
+    args = parser.parse_args(argv)
+
+    samples = measure(args.runs)
+    for key in ('import_ms', 'create_app_ms', 'schema_check_ms', 'first_request_ms'):
+        values = [sample[key] for sample in samples]
+        print(f'{key:>17}: median {statistics.median(values):8.2f}  min {min(values):8.2f}  max {max(values):8.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Bulk user import/export throughput benchmark.
+
+Writes a synthetic member list to a CSV file and times
+UserBulkService.import_records() loading it into an empty database, a
+second pass that updates every row, and a full export. For comparison it
+registers a sample of members one by one through POST /users/ and scales
+that rate up to the whole list.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python -m benchmarks.user_import_bench [--users 500000]
+
+Without DATABASE_URL a throwaway SQLite file is used (executemany path
+instead of COPY). Run it against an empty database: rows are not cleaned up.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'user_import.db')
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.migrations import init_db  # noqa: E402
+from app.services.user_bulk_service import UserBulkService, read_records  # noqa: E402
+
+COUNTIES = ['nairobi', 'mombasa', 'kisumu', 'nakuru', 'eldoret', 'thika']
+RELIGIONS = ['christian', 'muslim', 'hindu', 'none', '']
+DESCRIPTION = 'Easy going, enjoys long walks, football on weekends and good books.'
+
+
+def members(count, offset=0, seed=3):
+    rng = random.Random(seed)
+    for index in range(offset, offset + count):
+        county = rng.choice(COUNTIES)
+        yield {
+            'phone_number': f'07{index:08d}',
+            'username': f'member_{index}',
+            'age': rng.randint(18, 70),
+            'gender': rng.choice(['male', 'female']),
+            'county': county,
+            'town': county.title(),
+            'religion': rng.choice(RELIGIONS),
+            'self_description': DESCRIPTION,
+        }
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as target:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(target, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def timed_import(path, chunk_size):
+    started = time.perf_counter()
+    with open(path, newline='', encoding='utf-8') as source:
+        counts = UserBulkService.import_records(read_records(source, 'csv'), chunk_size=chunk_size)
+    return counts, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--sample', type=int, default=500, help='members registered through the HTTP API')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    path = os.path.join(tempfile.mkdtemp(), 'members.csv')
+    write_csv(path, members(args.users))
+
+    with app.app_context():
+        init_db(echo=lambda message: None)
+        created, create_seconds = timed_import(path, args.chunk_size)
+        updated, update_seconds = timed_import(path, args.chunk_size)
+        assert created['created'] == args.users, created
+        assert updated['updated'] == args.users, updated
+
+        started = time.perf_counter()
+        exported = UserBulkService.export(io.StringIO(), 'csv', args.chunk_size)
+        export_seconds = time.perf_counter() - started
+        db.session.rollback()
+
+    client = app.test_client()
+    started = time.perf_counter()
+    for member in members(args.sample, offset=args.users):
+        response = client.post('/users/', json=member)
+        assert response.status_code < 300, response.get_json()
+    api_rate = args.sample / (time.perf_counter() - started)
+
+    dialect = 'COPY' if os.environ['DATABASE_URL'].startswith('postgresql') else 'executemany'
+    print(f'members:          {args.users:,} ({dialect}, chunks of {args.chunk_size:,})')
+    print(f'import (insert):  {create_seconds:.1f}s, {args.users / create_seconds:,.0f} rows/s')
+    print(f'import (update):  {update_seconds:.1f}s, {args.users / update_seconds:,.0f} rows/s')
+    print(f'export:           {export_seconds:.1f}s, {exported / export_seconds:,.0f} rows/s')
+    print(f'POST /users/:     {api_rate:,.0f} rows/s, ~{args.users / api_rate / 60:,.1f} min for the same list '
+          f'(scaled from {args.sample:,})')
+    print(f'speedup:          ~{args.users / create_seconds / api_rate:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
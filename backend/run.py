@@ -1,11 +1,89 @@
 
 from app import create_app
+from app.extensions import db
+from app.services.sms_log_writer import sms_log_writer
+from app.services.sms_dispatcher import sms_dispatcher
+from app.services.sms_traffic import sms_traffic
+from app.services.candidate_index import candidate_index
+from app.services.match_scorer import match_scorer
+from app.services.exclusion_store import exclusion_store
+import multiprocessing
 import os
 
 app = create_app()
 
+
+def _post_fork(server, worker):
+    # Connections inherited from the master must not be shared; give each
+    # worker its own pool without closing the parent's sockets
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def _worker_exit(server, worker):
+    sms_dispatcher.stop()
+    sms_traffic.stop()
+    sms_log_writer.stop()
+
+
+def serve_production(host, port):
+    """
+    Serve with a preforking gunicorn master.
+
+    The app is built once in the master and inherited by every worker. Tuned
+    through environment variables:
+        WEB_CONCURRENCY          worker processes (default: CPU count * 2 + 1)
+        WEB_THREADS              threads per worker (default: 4)
+        WEB_MAX_REQUESTS         recycle a worker after this many requests (default: 5000)
+        WEB_MAX_REQUESTS_JITTER  random spread so workers don't recycle together (default: 500)
+        WEB_GRACEFUL_TIMEOUT     seconds to finish in-flight requests on SIGTERM (default: 30)
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class PenziApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f'{host}:{port}',
+                'workers': int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)),
+                'threads': int(os.environ.get('WEB_THREADS', 4)),
+                'worker_class': 'gthread',
+                'max_requests': int(os.environ.get('WEB_MAX_REQUESTS', 5000)),
+                'max_requests_jitter': int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 500)),
+                'graceful_timeout': int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30)),
+                'preload_app': True,
+                'post_fork': _post_fork,
+                'worker_exit': _worker_exit,
+                'accesslog': '-',
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    # Warm the match index, scorer and exclusions once so workers inherit
+    # them, and don't hand them connections opened while doing so
+    with app.app_context():
+        if candidate_index.enabled:
+            candidate_index.build()
+        if match_scorer.enabled:
+            match_scorer.build()
+        if exclusion_store.enabled:
+            exclusion_store.build()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    PenziApplication().run()
+
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False)
+    host = '0.0.0.0'
+    port = int(os.environ.get('PORT', 5000))
+    if os.environ.get('SERVER_MODE', 'development') == 'production':
+        serve_production(host, port)
+    else:
+        app.run(host=host, port=port, debug=False)
 
 
 
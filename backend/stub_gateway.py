@@ -0,0 +1,131 @@
+"""
+Local stand-in for the SMS provider's batch send API.
+
+Accepts POST /send in the format SMSGatewayClient speaks, records every
+message it "delivers" and can inject latency and failures, so the
+outbound dispatcher can be exercised without a real provider.
+
+Usage (from backend/):
+    python stub_gateway.py [--port 9090] [--latency-ms 0] [--fail-rate 0.0]
+
+GET /messages lists what was delivered; DELETE /messages clears it.
+Point the app at it with SMS_GATEWAY_URL=http://localhost:9090.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGateway:
+    """The stub server, startable in a background thread: with StubGateway() as gateway: ..."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, fail_rate=0.0, seed=None):
+        self.latency = latency_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.delivered = []
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections alive between batches
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path != '/send':
+                    return self._reply(404, {'error': 'Not found'})
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    messages = json.loads(self.rfile.read(length))['messages']
+                except (ValueError, KeyError):
+                    return self._reply(400, {'error': 'Expected {"messages": [...]}'})
+                if gateway.latency:
+                    time.sleep(gateway.latency)
+                self._reply(200, {'results': gateway.deliver(messages)})
+
+            def do_GET(self):
+                if self.path != '/messages':
+                    return self._reply(404, {'error': 'Not found'})
+                with gateway._lock:
+                    self._reply(200, {'calls': gateway.calls, 'messages': list(gateway.delivered)})
+
+            def do_DELETE(self):
+                with gateway._lock:
+                    gateway.delivered.clear()
+                    gateway.calls = 0
+                self._reply(200, {'message': 'Cleared'})
+
+        return Handler
+
+    def deliver(self, messages):
+        results = []
+        with self._lock:
+            self.calls += 1
+            for message in messages:
+                if self._random.random() < self.fail_rate:
+                    results.append({'id': message.get('id'), 'status': 'failed', 'error': 'Injected failure'})
+                    continue
+                self.delivered.append(message)
+                results.append({'id': message.get('id'), 'status': 'sent', 'provider_message_id': uuid.uuid4().hex})
+        return results
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='stub-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    gateway = StubGateway(args.host, args.port, args.latency_ms, args.fail_rate)
+    print(f'Stub SMS gateway listening on {gateway.url}')
+    try:
+        gateway.server.serve_forever()
+    except KeyboardInterrupt:
+        gateway.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Match search sessions must be readable from any worker process.
+
+Each step runs in its own interpreter against a shared SQLite file, the
+way prefork workers share the production database.
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP = '''
+from app import create_app
+from app.migrations import init_db
+app = create_app()
+with app.app_context():
+    init_db(echo=lambda message: None)
+client = app.test_client()
+for index in range(7):
+    client.post('/users/', json={
+        'phone_number': f'07110000{index:02d}', 'username': f'member{index}', 'age': 20 + index,
+        'gender': 'female', 'county': 'nairobi', 'town': 'Nairobi', 'self_description': 'x' * 60,
+    })
+'''
+
+START = '''
+from app import create_app
+response = create_app().test_client().get('/matches/session?town=Nairobi&gender=female&page_size=3')
+print(response.get_data(as_text=True))
+'''
+
+NEXT = '''
+import sys
+from app import create_app
+response = create_app().test_client().get(f'/matches/session/{sys.argv[1]}/next?page_size=3')
+print(json.dumps({'status': response.status_code, 'body': response.get_json()}))
+'''
+
+
+def run(code, database, *args):
+    result = subprocess.run(
+        [sys.executable, '-c', 'import json\n' + code, *args], cwd=BACKEND, check=True, capture_output=True,
+        text=True, env=dict(os.environ, DATABASE_URL=f'sqlite:///{database}', PYTHONPATH=BACKEND),
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_session_pages_are_served_by_another_process(tmp_path):
+    database = tmp_path / 'sessions.db'
+    subprocess.run([sys.executable, '-c', SETUP], cwd=BACKEND, check=True,
+                   env=dict(os.environ, DATABASE_URL=f'sqlite:///{database}', PYTHONPATH=BACKEND))
+
+    first = run(START, database)
+    assert first['total'] == 7 and first['remaining'] == 4
+
+    second = run(NEXT, database, first['session_id'])
+    third = run(NEXT, database, first['session_id'])
+    assert second['status'] == 200 and second['body']['remaining'] == 1
+    assert third['status'] == 200 and third['body']['remaining'] == 0
+
+    phones = [match['phone_number'] for page in (first, second['body'], third['body']) for match in page['matches']]
+    assert sorted(phones) == [f'07110000{index:02d}' for index in range(7)]
+
+    assert run(NEXT, database, 'no-such-session')['status'] == 404
@@ -0,0 +1,124 @@
+"""
+Outbound SMS delivery through the dispatcher against the stub gateway.
+
+Each scenario runs in its own interpreter, so the app is configured from
+the environment the way a deployed worker is. It queues one SMS and runs
+one dispatch round per entry of a fail-rate plan, reporting the row after
+every round.
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Max attempts and base backoff (seconds) the scenarios run with
+MAX_ATTEMPTS = 3
+BACKOFF = 10
+
+SCENARIO = '''
+import json
+import os
+import sys
+from datetime import datetime
+
+from stub_gateway import StubGateway
+
+with StubGateway() as gateway:
+    os.environ['SMS_GATEWAY_URL'] = gateway.url
+    from app import create_app
+    from app.extensions import db
+    from app.migrations import init_db
+    from app.models import OutboundSMS, SMSLog
+    from app.services.sms_dispatcher import sms_dispatcher
+    from app.services.sms_log_writer import sms_log_writer
+
+    app = create_app()
+    with app.app_context():
+        init_db(echo=lambda message: None)
+        sms_dispatcher.enqueue('0711000001', 'Hello from Penzi')
+
+        rounds = []
+        for fail_rate in json.loads(sys.argv[1]):
+            gateway.fail_rate = fail_rate
+            # Make a retry due now instead of waiting out its backoff
+            db.session.query(OutboundSMS).filter_by(status='pending').update({'next_attempt_at': datetime.utcnow()})
+            db.session.commit()
+            claimed = sms_dispatcher.dispatch_once()
+            # The dispatcher writes through its own connections
+            db.session.expire_all()
+            row = db.session.query(OutboundSMS).one()
+            rounds.append({
+                'claimed': claimed,
+                'status': row.status,
+                'attempts': row.attempts,
+                'delay': (row.next_attempt_at - datetime.utcnow()).total_seconds(),
+                'last_error': row.last_error,
+                'provider_message_id': row.provider_message_id,
+            })
+
+        sms_log_writer.stop()
+        outgoing = db.session.query(SMSLog).filter_by(message_type='OUTGOING').all()
+        print(json.dumps({
+            'rounds': rounds,
+            'delivered': gateway.delivered,
+            'outgoing': [[log.from_number, log.to_number, log.message_content] for log in outgoing],
+            'stats': {key: value for key, value in sms_dispatcher.stats().items() if key != 'queue'},
+        }))
+'''
+
+
+def dispatch(tmp_path, plan):
+    result = subprocess.run(
+        [sys.executable, '-c', SCENARIO, json.dumps(plan)], cwd=tmp_path, check=True, capture_output=True,
+        text=True, env=dict(
+            os.environ, PYTHONPATH=BACKEND, DATABASE_URL=f"sqlite:///{tmp_path / 'dispatch.db'}",
+            SMS_DISPATCH_ENABLED='true', SMS_DISPATCH_IN_PROCESS='false',
+            SMS_DISPATCH_MAX_ATTEMPTS=str(MAX_ATTEMPTS), SMS_DISPATCH_BACKOFF_SECONDS=str(BACKOFF),
+        ),
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_queued_sms_is_sent_and_logged(tmp_path):
+    result = dispatch(tmp_path, [0.0])
+
+    [sent] = result['rounds']
+    assert sent['claimed'] == 1 and sent['status'] == 'sent' and sent['attempts'] == 1
+    assert sent['provider_message_id'] and sent['last_error'] is None
+    assert [(message['to'], message['text']) for message in result['delivered']] == [
+        ('0711000001', 'Hello from Penzi')
+    ]
+    assert result['outgoing'] == [['PENZI', '0711000001', 'Hello from Penzi']]
+    assert result['stats']['sent'] == 1 and result['stats']['failed'] == 0
+
+
+def test_transient_failure_is_retried_with_backoff(tmp_path):
+    result = dispatch(tmp_path, [1.0, 1.0, 0.0])
+
+    first, second, third = result['rounds']
+    assert first['status'] == 'pending' and first['attempts'] == 1
+    assert first['last_error'] == 'Injected failure'
+    # BACKOFF * 2^(attempts - 1), with +-20% jitter
+    assert 0.8 * BACKOFF - 1 <= first['delay'] <= 1.2 * BACKOFF
+    assert second['status'] == 'pending' and second['attempts'] == 2
+    assert 0.8 * 2 * BACKOFF - 1 <= second['delay'] <= 1.2 * 2 * BACKOFF
+    assert third['status'] == 'sent' and third['attempts'] == 3 and third['last_error'] is None
+
+    assert len(result['delivered']) == 1
+    assert result['outgoing'] == [['PENZI', '0711000001', 'Hello from Penzi']]
+    assert result['stats']['retried'] == 2 and result['stats']['sent'] == 1
+
+
+def test_exhausted_retries_mark_the_sms_failed(tmp_path):
+    result = dispatch(tmp_path, [1.0] * (MAX_ATTEMPTS + 1))
+
+    rounds = result['rounds']
+    assert [entry['attempts'] for entry in rounds] == [1, 2, 3, 3]
+    assert [entry['status'] for entry in rounds] == ['pending', 'pending', 'failed', 'failed']
+    # A failed row is never claimed again
+    assert rounds[-1]['claimed'] == 0 and rounds[-1]['last_error'] == 'Injected failure'
+
+    assert result['delivered'] == [] and result['outgoing'] == []
+    assert result['stats']['failed'] == 1 and result['stats']['sent'] == 0
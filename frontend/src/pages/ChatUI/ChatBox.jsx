@@ -11,8 +11,7 @@ const ChatBox = () => {
   const [step, setStep] = useState('welcome');
   const [isTyping, setIsTyping] = useState(false);
   const [userData, setUserData] = useState({});
-  const [matches, setMatches] = useState([]);
-  const [matchIndex, setMatchIndex] = useState(0);
+  const [matchSession, setMatchSession] = useState(null);
   const messagesEndRef = useRef(null);
 
   const educationLevels = ['Primary', 'Secondary', 'Diploma', 'Graduate', 'Masters'];
@@ -241,24 +240,22 @@ const ChatBox = () => {
                 town,
                 gender: userData.gender === 'male' ? 'female' : 'male'
               };
-              console.log('Sending to DB (GET /matches):', JSON.stringify(matchCriteria));
+              console.log('Sending to DB (GET /matches/session):', JSON.stringify(matchCriteria));
               const matchRes = await fetch(
-                `http://52.48.121.185:8000/matches/?age_min=${minAge}&age_max=${maxAge}&town=${town}&gender=${matchCriteria.gender}`,
+                `http://52.48.121.185:8000/matches/session?age_min=${minAge}&age_max=${maxAge}&town=${town}&gender=${matchCriteria.gender}&page_size=3&requester=${userData.phone_number}`,
                 { headers: { 'Accept': 'application/json' } }
               );
               if (!matchRes.ok) throw new Error(`HTTP error! Status: ${matchRes.status}`);
               const matchesData = await matchRes.json();
-              console.log('DB Response (GET /matches):', matchesData);
-              setMatches(matchesData.data || matchesData);
-              setMatchIndex(0);
+              console.log('DB Response (GET /matches/session):', matchesData);
+              setMatchSession({ id: matchesData.session_id, remaining: matchesData.remaining });
 
-              if ((matchesData.data?.length || matchesData.length) > 0) {
-                const matchesArray = matchesData.data || matchesData;
-                const batch = matchesArray.slice(0, 3);
+              if (matchesData.total > 0) {
+                const batch = matchesData.matches;
                 const matchDescriptions = batch.map(match =>
                   `${match.username} aged ${match.age}, ${match.phone_number}.`
                 ).join('\n');
-                reply = `🎯 We have ${matchesArray.length} ${userData.gender === 'male' ? 'ladies' : 'gentlemen'} who match your choice!\n\nHere are ${Math.min(3, matchesArray.length)} of them:\n${matchDescriptions}\n\nTo know more about any of them, type: DESCRIBE <phone_number>\nTo see more matches, type: NEXT`;
+                reply = `🎯 We have ${matchesData.total} ${userData.gender === 'male' ? 'ladies' : 'gentlemen'} who match your choice!\n\nHere are ${batch.length} of them:\n${matchDescriptions}\n\nTo know more about any of them, type: DESCRIBE <phone_number>\nTo see more matches, type: NEXT`;
               } else {
                 reply = '😔 No matches found. Try a different age range or town.\n\nExample: match#20-30#Nairobi';
               }
@@ -266,9 +263,16 @@ const ChatBox = () => {
           } else {
             reply = '❌ Wrong format!\n\nCorrect format: match#ageRange#town\nExample: match#23-25#Kisumu';
           }
-        } else if (cleanInput === 'next' && step === 'match' && matches.length > matchIndex + 3) {
-          const batch = matches.slice(matchIndex + 3, matchIndex + 6);
-          setMatchIndex(prev => prev + 3);
+        } else if (cleanInput === 'next' && step === 'match' && matchSession?.remaining > 0) {
+          const nextRes = await fetch(
+            `http://52.48.121.185:8000/matches/session/${matchSession.id}/next?page_size=3`,
+            { headers: { 'Accept': 'application/json' } }
+          );
+          if (!nextRes.ok) throw new Error(`HTTP error! Status: ${nextRes.status}`);
+          const nextData = await nextRes.json();
+          console.log('DB Response (GET /matches/session/next):', nextData);
+          setMatchSession({ id: nextData.session_id, remaining: nextData.remaining });
+          const batch = nextData.matches;
           const matchDescriptions = batch.map(match =>
             `${match.username} aged ${match.age}, ${match.phone_number}.`
           ).join('\n');